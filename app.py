@@ -1,192 +1,520 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Request, Response, abort, g, request, jsonify, send_from_directory
 from flask_cors import CORS
 import os
-import cv2
-import numpy as np
-import torch
-from ultralytics import YOLO
 import requests
-import base64
-import io
-from PIL import Image
-from PIL.ExifTags import TAGS
+from werkzeug.exceptions import HTTPException
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.utils import secure_filename
+import contextlib
+import contextvars
 import datetime
+import ipaddress
+import logging
+import math
+import socket
+import time
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+from medibot.batching import BatchScheduler
+from medibot.budget import BudgetExceededError, MemoryBudget
+from medibot.loader import BackgroundLoader
+from medibot.detection import load_detector, result_to_detections
+from medibot.image import DecodedImage
+from medibot.imagestore import ImageStore
+from medibot.jobs import PRIORITIES, JobQueue, QueueFullError
+from medibot.metrics import SIZE_BUCKETS, Registry
+from medibot.cache import LRUCache, SingleFlight, SQLiteStore, TieredCache, content_key
+from medibot.compression import ResponseCompressor
+from medibot.fastjson import FastJSONProvider
+from medibot.pipeline import iter_completed, run_stages
+from medibot.prompts import PromptRegistry
+from medibot.ratelimit import ConcurrencyLimiter, MemoryBuckets, OverloadedError, RateLimiter, SQLiteBuckets
+from medibot.openrouter import StreamError, client_from_env, iter_stream_deltas
+from medibot.sessions import SessionStore
+from medibot.sse import sse_event, sse_response, wants_stream
+from medibot.uploads import iter_uploaded_files, map_upload, sniff_image_type, spool_stream
+
+# LOG_LEVEL=DEBUG logs per-request details; LOG_LEVEL=OFF silences the app's logging
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+logger = logging.getLogger('medibot')
+if LOG_LEVEL == 'OFF':
+    logger.disabled = True
+else:
+    logger.setLevel(LOG_LEVEL)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s [%(process)d] %(message)s'))
+        logger.addHandler(handler)
+        logger.propagate = False
+
+# Prometheus-style metrics served on /metrics. Each observation is a lock and
+# a bisect, cheap enough to leave on; values are per process.
+metrics = Registry('medibot')
+REQUESTS = metrics.counter('requests', 'HTTP requests by endpoint and status code', ('endpoint', 'status'))
+REQUEST_SECONDS = metrics.histogram('request_seconds', 'Time in request handlers (to first byte for streams)', ('endpoint',))
+STAGE_SECONDS = metrics.histogram('stage_seconds', 'Time per processing stage', ('stage',))
+PAYLOAD_BYTES = metrics.histogram('payload_bytes', 'Upload, LLM image and response body sizes', ('kind',), SIZE_BUCKETS)
+LLM_ERRORS = metrics.counter('llm_errors', 'LLM calls that ended in an error response', ('reason',))
+
+class TimedJSONProvider(FastJSONProvider):
+    """orjson-backed JSON provider with serialization time recorded as a stage"""
+    
+    def dumps(self, obj, **kwargs):
+        with STAGE_SECONDS.time(stage='serialize'):
+            return super().dumps(obj, **kwargs)
+    
+    def encode(self, obj):
+        with STAGE_SECONDS.time(stage='serialize'):
+            return super().encode(obj)
+
+# Upload bodies above UPLOAD_SPOOL_KB go to a temp file while they are
+# received and are memory-mapped from there instead of read into memory
+UPLOAD_SPOOL_BYTES = int(os.environ.get('UPLOAD_SPOOL_KB', 512)) * 1024
+
+class SpooledRequest(Request):
+    @property
+    def max_content_length(self):
+        # /upload/batch carries a whole study; every other route keeps the
+        # 16MB MAX_CONTENT_LENGTH. Werkzeug enforces this while the body is
+        # read, so it also holds for chunked uploads without a Content-Length
+        if self.endpoint == 'upload_batch':
+            return BATCH_MAX_CONTENT_MB * 1024 * 1024
+        return super().max_content_length
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return spool_stream(total_content_length, UPLOAD_SPOOL_BYTES)
 
 app = Flask(__name__)
+app.request_class = SpooledRequest
+app.json = TimedJSONProvider(app)
 CORS(app, origins=['*'], methods=['GET', 'POST', 'OPTIONS'], allow_headers=['Content-Type', 'Authorization'])
 app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+# Behind a load balancer, PROXY_FIX_HOPS=1 makes request.remote_addr the
+# client's address from X-Forwarded-For (rate limits are keyed by it)
+if int(os.environ.get('PROXY_FIX_HOPS', 0)):
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=int(os.environ['PROXY_FIX_HOPS']))
+UPLOAD_MAX_BYTES = 16 * 1024 * 1024  # 16MB max file size
+# /upload/batch carries a whole study, so its request limit is larger
+# (see SpooledRequest.max_content_length)
+BATCH_MAX_CONTENT_MB = int(os.environ.get('BATCH_MAX_CONTENT_MB', 256))
+app.config['MAX_CONTENT_LENGTH'] = UPLOAD_MAX_BYTES
+
+YOLO_WEIGHTS = 'yolov8n.pt'
+
+# torch/ultralytics take seconds to import and the weights take more to load,
+# so by default the model loads on a background thread and /query, /test and
+# cached uploads are served immediately. MODEL_LOAD_MODE: background | eager | lazy
+MODEL_LOAD_MODE = os.environ.get('MODEL_LOAD_MODE', 'background')
+MODEL_WARMUP = os.environ.get('MODEL_WARMUP', '1') == '1'
+
+# Inference backend for YOLO on CPU-only nodes: torch | onnx | onnx-int8 | openvino.
+# Non-torch backends export the weights next to YOLO_WEIGHTS on first start.
+# DETECTION_BACKEND=none skips detection and never imports torch or ultralytics
+# (the lightweight deployment in backend-deploy/ runs this app that way).
+DETECTION_BACKEND = os.environ.get('DETECTION_BACKEND', 'torch')
+DETECTION_ENABLED = DETECTION_BACKEND != 'none'
+
+def load_model():
+    """Load the YOLO detector on the configured backend and run a warm-up inference"""
+    detector = load_detector(YOLO_WEIGHTS, DETECTION_BACKEND)
+    if MODEL_WARMUP:
+        warm_up_model(detector)
+    return detector
 
-# Load YOLO model with safe globals
-torch.serialization.add_safe_globals(['ultralytics.nn.tasks.DetectionModel'])
-model = YOLO('yolov8n.pt')
+def warm_up_model(detector=None):
+    """Run one dummy inference so the first real upload doesn't pay for setup"""
+    if not DETECTION_ENABLED:
+        return
+    import numpy as np
+    
+    detector = detector or get_model()
+    detector.predict([np.zeros((640, 640, 3), dtype=np.uint8)])
+
+model_loader = BackgroundLoader(load_model, name='yolo-loader')
+if MODEL_LOAD_MODE == 'eager':
+    model_loader.get()
+elif MODEL_LOAD_MODE == 'background':
+    model_loader.start()
+
+def get_model():
+    """The loaded YOLO model, waiting for the loader if needed"""
+    return model_loader.get()
+
+# DETECTION_TILING=1: images with a long edge of DETECTION_TILE_MIN_EDGE or
+# more are also detected on up to DETECTION_MAX_TILES overlapping tiles at
+# model resolution, so small findings in large scans aren't lost to the
+# downscale. The tiles go through the scheduler below in shared batches.
+tiled_detection = None
+if DETECTION_ENABLED and os.environ.get('DETECTION_TILING') == '1':
+    # numpy comes with the detection backends, not with backend-deploy
+    from medibot.tiling import TiledDetection
+    
+    tiled_detection = TiledDetection(
+        max_tiles=int(os.environ.get('DETECTION_MAX_TILES', 12)),
+        min_edge=int(os.environ.get('DETECTION_TILE_MIN_EDGE', 1280))
+    )
+
+# Concurrent uploads share one batched YOLO forward pass instead of queueing
+# behind each other. Tune the window/batch size per node with env vars. With
+# tiling, the default batch fits a tiled image's full pass and all its tiles.
+detection_scheduler = BatchScheduler(
+    lambda images: get_model().predict(images),
+    window_ms=float(os.environ.get('DETECTION_BATCH_WINDOW_MS', 10)),
+    max_batch=int(os.environ.get('DETECTION_MAX_BATCH',
+                                 max(8, tiled_detection.max_tiles + 1) if tiled_detection is not None else 8))
+)
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp'}
+# What the file's magic bytes must say, whatever its extension
+ALLOWED_FORMATS = {'PNG', 'JPEG', 'GIF', 'BMP'}
+
+# Worker processes sharing this instance's memory (gunicorn.conf.py exports
+# its worker count; the dev server is one process)
+WEB_CONCURRENCY = max(1, int(os.environ.get('WEB_CONCURRENCY', 1)))
+
+# Estimated bytes (encoded upload + decoded pixels) of the uploads being
+# analyzed at once. UPLOAD_MEMORY_BUDGET_MB is for the whole instance and is
+# split evenly between the worker processes, each of which enforces its
+# share. Uploads over the budget wait for up to UPLOAD_QUEUE_TIMEOUT seconds,
+# then get a 503. UPLOAD_MEMORY_BUDGET_MB=0 disables it.
+UPLOAD_QUEUE_TIMEOUT = float(os.environ.get('UPLOAD_QUEUE_TIMEOUT', 30))
+upload_budget = MemoryBudget(int(os.environ.get('UPLOAD_MEMORY_BUDGET_MB', 256)) * 1024 * 1024 // WEB_CONCURRENCY,
+                             timeout=UPLOAD_QUEUE_TIMEOUT)
+
+# Per-client token buckets for the expensive endpoints: a client may send a
+# burst, then the per-minute rate. Buckets are per process by default;
+# RATE_LIMIT_BACKEND=sqlite shares them between gunicorn workers.
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+rate_limiter = RateLimiter(
+    {
+        'upload': (float(os.environ.get('RATE_LIMIT_UPLOADS_PER_MIN', 20)),
+                   int(os.environ.get('RATE_LIMIT_UPLOAD_BURST', 5))),
+        'query': (float(os.environ.get('RATE_LIMIT_QUERIES_PER_MIN', 60)),
+                  int(os.environ.get('RATE_LIMIT_QUERY_BURST', 10)))
+    },
+    SQLiteBuckets(os.path.join(app.config['UPLOAD_FOLDER'], 'ratelimit.sqlite'))
+    if RATE_LIMIT_BACKEND == 'sqlite' else MemoryBuckets()
+)
+
+# Detection and LLM calls running at once per process, budgeted separately
+# for the CPU and the upstream: each call holds its kind's slot only while it
+# runs (see work_slot), whether it serves a request, a batch item or a job.
+# By default detection gets enough calls to fill a forward pass and the LLM
+# as many as the OpenRouter client's connections. Once as many calls again
+# are waiting, requests needing that kind get 503; 0 disables a limit.
+admission = ConcurrencyLimiter({
+    'detection': int(os.environ.get('MAX_DETECTION_CALLS', detection_scheduler.max_batch)),
+    'llm': int(os.environ.get('MAX_LLM_CALLS', os.environ.get('OPENROUTER_MAX_CONCURRENCY', 16)))
+}, timeout=float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 30)))
+ADMISSION_RETRY_AFTER = int(os.environ.get('ADMISSION_RETRY_AFTER', 2))
+# Set for work a request was already admitted for (batch images) or that has
+# no client to retry (jobs): its calls wait for slots instead of being shed
+background_work = contextvars.ContextVar('background_work', default=False)
+UPLOAD_WORK = ('detection', 'llm') if DETECTION_ENABLED else ('llm',)
+# endpoint -> (rate limit, kinds of work it needs)
+ENDPOINT_COSTS = {
+    'upload_file': ('upload', UPLOAD_WORK),
+    'upload_batch': ('upload', UPLOAD_WORK),
+    'handle_query': ('query', ('llm',))
+}
+
+# Request threads per worker process (gunicorn.conf.py exports its setting)
+REQUEST_THREADS = int(os.environ.get('GUNICORN_THREADS', 16))
+
+# Upload stages (YOLO, metadata, LLM) run concurrently: YOLO on the request
+# thread, the other two on this pool, so each request needs at most two of
+# its threads and never waits behind batch or job work (see
+# background_stage_executor). The CPU stages spend their time in torch/PIL
+# code that releases the GIL, so threads overlap them with the
+# network-bound LLM call without pickling the image.
+stage_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('UPLOAD_STAGE_WORKERS', 2 * REQUEST_THREADS)),
+    thread_name_prefix='upload-stage'
+)
+UPLOAD_PIPELINE = os.environ.get('UPLOAD_PIPELINE', '1') == '1'
+UPLOAD_DEBUG_TIMINGS = os.environ.get('UPLOAD_DEBUG_TIMINGS') == '1'
+
+# /upload/batch analyses a study's images on their own pool (its items wait
+# on upload stages, so they can't share stage_executor). Detection calls from
+# concurrent items are grouped into batched forward passes by the scheduler.
+BATCH_MAX_IMAGES = int(os.environ.get('BATCH_MAX_IMAGES', 32))
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 8))
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix='batch-item')
+
+# One keep-alive session for every LLM call, with retries and a circuit breaker
+openrouter_client = client_from_env()
+
+VISION_MODEL = "google/gemini-2.5-flash"
+TEXT_MODEL = "openai/gpt-3.5-turbo"
+
+# Prompts live in templates/prompts/, are parsed once and hot-reloaded when
+# the files change
+prompts = PromptRegistry(reload_interval=float(os.environ.get('PROMPT_RELOAD_INTERVAL', 2)))
+
+# The vision model gets a downscaled, re-encoded copy instead of the raw
+# upload. LLM_IMAGE_MAX_EDGE=0 sends the original bytes.
+LLM_IMAGE_MAX_EDGE = int(os.environ.get('LLM_IMAGE_MAX_EDGE', 1536))
+LLM_IMAGE_QUALITY = int(os.environ.get('LLM_IMAGE_QUALITY', 85))
+LLM_IMAGE_FORMAT = os.environ.get('LLM_IMAGE_FORMAT', 'JPEG').upper()
+
+# Bump when detection/metadata output changes so stale cache entries are ignored
+ANALYSIS_VERSION = '1'
+
+# Upload analyses are keyed by image hash + prompt/model version. The disk
+# tier is opt-in (RESULT_CACHE_DISK=1) and lives under UPLOAD_FOLDER.
+result_cache = TieredCache(
+    LRUCache(
+        max_entries=int(os.environ.get('RESULT_CACHE_SIZE', 128)),
+        ttl=float(os.environ.get('RESULT_CACHE_TTL', 24 * 3600))
+    ),
+    SQLiteStore(
+        os.path.join(app.config['UPLOAD_FOLDER'], 'result_cache.sqlite'),
+        ttl=float(os.environ.get('RESULT_CACHE_TTL', 24 * 3600))
+    ) if os.environ.get('RESULT_CACHE_DISK') == '1' else None
+)
+
+# /query answers keyed by normalized prompt + image hash + model. Identical
+# questions arriving together share one upstream call (single-flight).
+query_cache = TieredCache(LRUCache(
+    max_entries=int(os.environ.get('QUERY_CACHE_SIZE', 512)),
+    ttl=float(os.environ.get('QUERY_CACHE_TTL', 3600))
+))
+query_flight = SingleFlight()
+
+# Conversations: /upload and /query return a session_id, and follow-ups that
+# pass it send only the new question plus a history trimmed to
+# SESSION_HISTORY_TOKENS. Kept in sqlite so every worker process shares them.
+sessions = SessionStore(
+    SQLiteStore(
+        os.path.join(app.config['UPLOAD_FOLDER'], 'sessions.sqlite'),
+        ttl=float(os.environ.get('SESSION_TTL', 6 * 3600)),
+        max_entries=int(os.environ.get('SESSION_MAX', 10000))
+    ),
+    history_tokens=int(os.environ.get('SESSION_HISTORY_TOKENS', 1500))
+)
+
+# Uploads are kept server-side and referenced by a short ID, so responses
+# don't echo the image and follow-up queries send only text
+image_store = ImageStore(
+    os.path.join(app.config['UPLOAD_FOLDER'], 'images'),
+    max_memory_bytes=int(os.environ.get('IMAGE_STORE_MEMORY_MB', 64)) * 1024 * 1024,
+    ttl=float(os.environ.get('IMAGE_STORE_TTL', 6 * 3600))
+)
+# Re-encoded vision-model payloads for stored images, reused by follow-ups
+llm_image_cache = LRUCache(max_entries=32, ttl=float(os.environ.get('IMAGE_STORE_TTL', 6 * 3600)))
+# Set UPLOAD_ECHO_IMAGE=1 (or pass ?include_image=1) for clients that still
+# expect the base64 image_data field in /upload responses
+UPLOAD_ECHO_IMAGE = os.environ.get('UPLOAD_ECHO_IMAGE') == '1'
+
+# Compact analysis results for slow links (?compact=1, or COMPACT_RESPONSES=1
+# for every request): rounded detection floats, none of the metadata fields
+# derived from width, height and file_size_bytes, and never image_data
+COMPACT_RESPONSES = os.environ.get('COMPACT_RESPONSES') == '1'
+DERIVED_SIZE_FIELDS = ('size', 'total_pixels', 'megapixels', 'file_size_mb')
+
+# JSON responses are gzip/brotli-compressed as the client's Accept-Encoding allows
+compressor = ResponseCompressor(min_size=int(os.environ.get('RESPONSE_COMPRESSION_MIN_BYTES', 1024)))
+RESPONSE_COMPRESSION = os.environ.get('RESPONSE_COMPRESSION', '1') == '1'
+
+# Async uploads (/upload?async=1) run on a bounded pool of job workers. Jobs
+# live in sqlite so queued work survives a restart; past JOB_MAX_PENDING
+# waiting jobs new ones are rejected with 429.
+JOB_CALLBACK_RETRIES = int(os.environ.get('JOB_CALLBACK_RETRIES', 2))
+JOB_CALLBACK_HOSTS = {h.strip() for h in os.environ.get('JOB_CALLBACK_HOSTS', '').split(',') if h.strip()}
+JOB_RETRY_AFTER = int(os.environ.get('JOB_RETRY_AFTER', 5))
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+
+# Upload stages of batch items and background jobs, kept off the request
+# threads' pool; sized for every batch item and job worker at once
+background_stage_executor = ThreadPoolExecutor(
+    max_workers=2 * (BATCH_WORKERS + JOB_WORKERS),
+    thread_name_prefix='background-stage'
+)
+
+# query_openrouter reports failures as text; don't cache those as analyses
+ERROR_RESPONSE_PREFIXES = (
+    'API Error:',
+    'Network error:',
+    'Error processing request:',
+    "Hello! I'm MediBot AI. I'm currently having trouble"
+)
+
+def is_error_response(text):
+    return not text or text.startswith(ERROR_RESPONSE_PREFIXES)
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def analyze_image_from_bytes(image_bytes):
-    """Analyze image from bytes using YOLO and return detection results"""
-    # Convert bytes to PIL Image
-    image = Image.open(io.BytesIO(image_bytes))
-    
-    # Convert to RGB if necessary
-    if image.mode != 'RGB':
-        image = image.convert('RGB')
-    
-    # Convert PIL image to OpenCV format
-    cv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-    
-    # Run YOLO detection
-    results = model(cv_image)
-    detections = []
-    
-    for result in results:
-        boxes = result.boxes
-        if boxes is not None:
-            for box in boxes:
-                x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                conf = box.conf[0].cpu().numpy()
-                cls = int(box.cls[0].cpu().numpy())
-                class_name = model.names[cls]
-                
-                if conf > 0.5:  # Filter low confidence detections
-                    detections.append({
-                        'class': class_name,
-                        'confidence': float(conf),
-                        'bbox': [float(x1), float(y1), float(x2), float(y2)]
-                    })
-    
-    return detections
-
-def extract_metadata(image_bytes):
-    """Extract comprehensive metadata from image bytes"""
+def is_supported_image(data):
+    """Check the magic bytes before anything tries to decode the upload"""
+    return sniff_image_type(data) in ALLOWED_FORMATS
+
+def work_slot(kind):
+    """A ``kind`` ('detection' or 'llm') slot to hold for one call; raises
+    OverloadedError when that kind is saturated, except in background jobs"""
+    return admission.acquire(kind, wait=background_work.get())
+
+@contextlib.contextmanager
+def waiting_for_slots():
+    """Make work_slot calls in this block (and stages it starts) wait"""
+    token = background_work.set(True)
+    try:
+        yield
+    finally:
+        background_work.reset(token)
+
+def analyze_image_from_bytes(image):
+    """Analyze image (bytes or DecodedImage) using YOLO and return detection results"""
+    if not DETECTION_ENABLED:
+        # Nothing to detect, so the pixels aren't decoded for it either
+        return []
+    
+    # Pixels are decoded once and shared with metadata extraction. YOLO takes
+    # the RGB PIL image directly, so there is no extra numpy/BGR copy here.
+    decoded = DecodedImage.wrap(image)
+    
+    with work_slot('detection'):
+        with STAGE_SECONDS.time(stage='decode'):
+            pixels = decoded.rgb
+        
+        # Run YOLO detection (batched with any other pending uploads)
+        with STAGE_SECONDS.time(stage='detection'):
+            if tiled_detection is not None:
+                return tiled_detection.detect(pixels, detection_scheduler.submit, get_model().names)
+            result = detection_scheduler(pixels)
+            return result_to_detections(result, get_model().names)
+
+@STAGE_SECONDS.time(stage='metadata')
+def extract_metadata(image):
+    """Extract comprehensive metadata from image bytes or a DecodedImage"""
+    image = DecodedImage.wrap(image)
     try:
-        image = Image.open(io.BytesIO(image_bytes))
-        
-        # Get basic image info
-        metadata = {
-            'filename': 'uploaded_image',
-            'format': image.format or 'Unknown',
-            'mode': image.mode or 'Unknown',
-            'size': f"{image.size[0]} x {image.size[1]}",
-            'width': image.size[0],
-            'height': image.size[1],
-            'total_pixels': image.size[0] * image.size[1],
-            'megapixels': round((image.size[0] * image.size[1]) / 1000000, 2),
-            'aspect_ratio': round(image.size[0] / image.size[1], 2),
-            'file_size_bytes': len(image_bytes),
-            'file_size_mb': round(len(image_bytes) / (1024 * 1024), 2)
+        # JPEG/PNG headers and EXIF are parsed from the bytes and never raise;
+        # other formats go through PIL, which rejects files it can't identify
+        header = image.header
+    except (OSError, ValueError) as e:
+        return {
+            'error': f'Could not extract metadata: {str(e)}',
+            'format': 'Unknown',
+            'size': 'Unknown',
+            'has_exif': False
         }
+    
+    width, height = header.size
+    
+    # Get basic image info (header only, no pixel decode)
+    metadata = {
+        'filename': 'uploaded_image',
+        'format': header.format or 'Unknown',
+        'mode': header.mode or 'Unknown',
+        'size': f"{width} x {height}",
+        'width': width,
+        'height': height,
+        'total_pixels': width * height,
+        'megapixels': round((width * height) / 1000000, 2),
+        'aspect_ratio': round(width / height, 2) if height else 0,
+        'file_size_bytes': image.nbytes,
+        'file_size_mb': round(image.nbytes / (1024 * 1024), 2)
+    }
+    
+    # Only the EXIF tags reported below are read, already keyed by name
+    exif_data = header.exif or {}
+    
+    # Process comprehensive EXIF fields
+    processed_exif = {}
+    if exif_data:
+        # Camera and Device Info
+        processed_exif['camera_make'] = exif_data.get('Make', 'Unknown')
+        processed_exif['camera_model'] = exif_data.get('Model', 'Unknown')
+        processed_exif['software'] = exif_data.get('Software', 'Unknown')
+        processed_exif['lens_make'] = exif_data.get('LensMake', 'Unknown')
+        processed_exif['lens_model'] = exif_data.get('LensModel', 'Unknown')
         
-        # Extract EXIF data if available
-        exif_data = {}
-        if hasattr(image, '_getexif') and image._getexif() is not None:
-            exif = image._getexif()
-            for tag_id, value in exif.items():
-                tag = TAGS.get(tag_id, tag_id)
-                exif_data[tag] = value
-        
-        # Process comprehensive EXIF fields
-        processed_exif = {}
-        if exif_data:
-            # Camera and Device Info
-            processed_exif['camera_make'] = exif_data.get('Make', 'Unknown')
-            processed_exif['camera_model'] = exif_data.get('Model', 'Unknown')
-            processed_exif['software'] = exif_data.get('Software', 'Unknown')
-            processed_exif['lens_make'] = exif_data.get('LensMake', 'Unknown')
-            processed_exif['lens_model'] = exif_data.get('LensModel', 'Unknown')
-            
-            # Date and Time
-            processed_exif['date_taken'] = exif_data.get('DateTime', 'Unknown')
-            processed_exif['date_original'] = exif_data.get('DateTimeOriginal', 'Unknown')
-            processed_exif['date_digitized'] = exif_data.get('DateTimeDigitized', 'Unknown')
-            
-            # Camera Settings
-            if 'FNumber' in exif_data:
-                processed_exif['aperture'] = f"f/{exif_data['FNumber']}"
-            if 'ExposureTime' in exif_data:
-                exp_time = exif_data['ExposureTime']
-                if exp_time > 0 and exp_time < 1:
-                    processed_exif['shutter_speed'] = f"1/{int(1/exp_time)}s"
-                else:
-                    processed_exif['shutter_speed'] = f"{exp_time}s"
-            processed_exif['iso'] = exif_data.get('ISOSpeedRatings', 'Unknown')
-            if 'FocalLength' in exif_data:
-                processed_exif['focal_length'] = f"{exif_data['FocalLength']}mm"
-            processed_exif['focal_length_35mm'] = exif_data.get('FocalLengthIn35mmFilm', 'Unknown')
-            
-            # Flash and Exposure
-            processed_exif['flash'] = exif_data.get('Flash', 'Unknown')
-            processed_exif['exposure_mode'] = exif_data.get('ExposureMode', 'Unknown')
-            processed_exif['exposure_program'] = exif_data.get('ExposureProgram', 'Unknown')
-            processed_exif['metering_mode'] = exif_data.get('MeteringMode', 'Unknown')
-            processed_exif['white_balance'] = exif_data.get('WhiteBalance', 'Unknown')
+        # Date and Time
+        processed_exif['date_taken'] = exif_data.get('DateTime', 'Unknown')
+        processed_exif['date_original'] = exif_data.get('DateTimeOriginal', 'Unknown')
+        processed_exif['date_digitized'] = exif_data.get('DateTimeDigitized', 'Unknown')
+        
+        # Camera Settings
+        if 'FNumber' in exif_data:
+            processed_exif['aperture'] = f"f/{exif_data['FNumber']}"
+        if 'ExposureTime' in exif_data:
+            exp_time = exif_data['ExposureTime']
+            if exp_time > 0 and exp_time < 1:
+                processed_exif['shutter_speed'] = f"1/{int(1/exp_time)}s"
+            else:
+                processed_exif['shutter_speed'] = f"{exp_time}s"
+        processed_exif['iso'] = exif_data.get('ISOSpeedRatings', 'Unknown')
+        if 'FocalLength' in exif_data:
+            processed_exif['focal_length'] = f"{exif_data['FocalLength']}mm"
+        processed_exif['focal_length_35mm'] = exif_data.get('FocalLengthIn35mmFilm', 'Unknown')
+        
+        # Flash and Exposure
+        processed_exif['flash'] = exif_data.get('Flash', 'Unknown')
+        processed_exif['exposure_mode'] = exif_data.get('ExposureMode', 'Unknown')
+        processed_exif['exposure_program'] = exif_data.get('ExposureProgram', 'Unknown')
+        processed_exif['metering_mode'] = exif_data.get('MeteringMode', 'Unknown')
+        processed_exif['white_balance'] = exif_data.get('WhiteBalance', 'Unknown')
+        
+        # Image Quality
+        processed_exif['color_space'] = exif_data.get('ColorSpace', 'Unknown')
+        processed_exif['resolution_unit'] = exif_data.get('ResolutionUnit', 'Unknown')
+        processed_exif['x_resolution'] = exif_data.get('XResolution', 'Unknown')
+        processed_exif['y_resolution'] = exif_data.get('YResolution', 'Unknown')
+        processed_exif['compression'] = exif_data.get('Compression', 'Unknown')
+        
+        # GPS Information
+        gps_info = exif_data.get('GPSInfo', {})
+        if gps_info:
+            processed_exif['gps_available'] = True
             
-            # Image Quality
-            processed_exif['color_space'] = exif_data.get('ColorSpace', 'Unknown')
-            processed_exif['resolution_unit'] = exif_data.get('ResolutionUnit', 'Unknown')
-            processed_exif['x_resolution'] = exif_data.get('XResolution', 'Unknown')
-            processed_exif['y_resolution'] = exif_data.get('YResolution', 'Unknown')
-            processed_exif['compression'] = exif_data.get('Compression', 'Unknown')
+            # Extract GPS coordinates
+            def convert_to_degrees(value):
+                d, m, s = value
+                return d + (m / 60.0) + (s / 3600.0)
             
-            # GPS Information
-            gps_info = exif_data.get('GPSInfo', {})
-            if gps_info:
-                processed_exif['gps_available'] = True
-                
-                # Extract GPS coordinates
-                def convert_to_degrees(value):
-                    d, m, s = value
-                    return d + (m / 60.0) + (s / 3600.0)
-                
-                if 'GPSLatitude' in gps_info and 'GPSLatitudeRef' in gps_info:
-                    lat = convert_to_degrees(gps_info['GPSLatitude'])
-                    if gps_info['GPSLatitudeRef'] == 'S':
-                        lat = -lat
-                    processed_exif['latitude'] = round(lat, 6)
-                
-                if 'GPSLongitude' in gps_info and 'GPSLongitudeRef' in gps_info:
-                    lon = convert_to_degrees(gps_info['GPSLongitude'])
-                    if gps_info['GPSLongitudeRef'] == 'W':
-                        lon = -lon
-                    processed_exif['longitude'] = round(lon, 6)
-                
-                processed_exif['gps_altitude'] = gps_info.get('GPSAltitude', 'Unknown')
-                processed_exif['gps_timestamp'] = gps_info.get('GPSTimeStamp', 'Unknown')
-                processed_exif['gps_datestamp'] = gps_info.get('GPSDateStamp', 'Unknown')
-            else:
-                processed_exif['gps_available'] = False
+            if 'GPSLatitude' in gps_info and 'GPSLatitudeRef' in gps_info:
+                lat = convert_to_degrees(gps_info['GPSLatitude'])
+                if gps_info['GPSLatitudeRef'] == 'S':
+                    lat = -lat
+                processed_exif['latitude'] = round(lat, 6)
             
-            # Additional Technical Data
-            processed_exif['orientation'] = exif_data.get('Orientation', 'Unknown')
-            processed_exif['scene_type'] = exif_data.get('SceneType', 'Unknown')
-            processed_exif['scene_capture_type'] = exif_data.get('SceneCaptureType', 'Unknown')
-            processed_exif['digital_zoom_ratio'] = exif_data.get('DigitalZoomRatio', 'Unknown')
-            processed_exif['contrast'] = exif_data.get('Contrast', 'Unknown')
-            processed_exif['saturation'] = exif_data.get('Saturation', 'Unknown')
-            processed_exif['sharpness'] = exif_data.get('Sharpness', 'Unknown')
+            if 'GPSLongitude' in gps_info and 'GPSLongitudeRef' in gps_info:
+                lon = convert_to_degrees(gps_info['GPSLongitude'])
+                if gps_info['GPSLongitudeRef'] == 'W':
+                    lon = -lon
+                processed_exif['longitude'] = round(lon, 6)
             
-            # Remove 'Unknown' values for cleaner display
-            processed_exif = {k: v for k, v in processed_exif.items() if v != 'Unknown'}
-        
-        metadata['exif'] = processed_exif
-        metadata['has_exif'] = len(processed_exif) > 0
+            processed_exif['gps_altitude'] = gps_info.get('GPSAltitude', 'Unknown')
+            processed_exif['gps_timestamp'] = gps_info.get('GPSTimeStamp', 'Unknown')
+            processed_exif['gps_datestamp'] = gps_info.get('GPSDateStamp', 'Unknown')
+        else:
+            processed_exif['gps_available'] = False
         
-        return metadata
+        # Additional Technical Data
+        processed_exif['orientation'] = exif_data.get('Orientation', 'Unknown')
+        processed_exif['scene_type'] = exif_data.get('SceneType', 'Unknown')
+        processed_exif['scene_capture_type'] = exif_data.get('SceneCaptureType', 'Unknown')
+        processed_exif['digital_zoom_ratio'] = exif_data.get('DigitalZoomRatio', 'Unknown')
+        processed_exif['contrast'] = exif_data.get('Contrast', 'Unknown')
+        processed_exif['saturation'] = exif_data.get('Saturation', 'Unknown')
+        processed_exif['sharpness'] = exif_data.get('Sharpness', 'Unknown')
         
-    except Exception as e:
-        return {
-            'error': f'Could not extract metadata: {str(e)}',
-            'format': 'Unknown',
-            'size': 'Unknown',
-            'has_exif': False
-        }
+        # Remove 'Unknown' values for cleaner display
+        processed_exif = {k: v for k, v in processed_exif.items() if v != 'Unknown'}
+    
+    metadata['exif'] = processed_exif
+    metadata['has_exif'] = len(processed_exif) > 0
+    
+    return metadata
 
-def query_openrouter(prompt, image_data=None):
-    """Send query to OpenRouter API with image analysis capabilities"""
+def build_openrouter_request(prompt, image_data=None, mime_type='image/jpeg', history=None):
+    """Build headers and chat-completions payload for a prompt (and optional image).
+    
+    ``image_data`` may also be a list of ``(base64, mime_type)`` pairs to send
+    several images in one prompt. ``history`` messages (see session_history)
+    go between the system prompt and the new question.
+    """
     api_key = os.environ.get('OPENROUTER_API_KEY', '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')
     
     headers = {
@@ -197,56 +525,643 @@ def query_openrouter(prompt, image_data=None):
     }
     
     # Medical system prompt for better context
-    system_prompt = "You are MediBot AI, a professional medical imaging assistant. You specialize in analyzing medical images and providing clinical insights. Always maintain professional medical terminology, focus on anatomical findings, and include appropriate medical disclaimers. Respond concisely and structure your analysis clearly."
+    system_prompt = prompts.text('system')
     
     if image_data:
+        images = image_data if isinstance(image_data, list) else [(image_data, mime_type)]
         messages = [
             {"role": "system", "content": system_prompt},
+            *(history or []),
             {
                 "role": "user",
-                "content": [
-                    {"type": "text", "text": prompt},
-                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_data}"}}
+                "content": [{"type": "text", "text": prompt}] + [
+                    {"type": "image_url", "image_url": {"url": f"data:{image_mime};base64,{image_b64}"}}
+                    for image_b64, image_mime in images
                 ]
             }
         ]
-        model_name = "google/gemini-2.5-flash"
+        for image_b64, _ in images:
+            PAYLOAD_BYTES.observe(len(image_b64), kind='llm_image')
+        model_name = VISION_MODEL
     else:
         messages = [
             {"role": "system", "content": system_prompt},
+            *(history or []),
             {"role": "user", "content": prompt}
         ]
-        model_name = "openai/gpt-3.5-turbo"
+        model_name = TEXT_MODEL
     
     data = {
         "model": model_name,
         "messages": messages,
         "max_tokens": 800
     }
+    return headers, data
+
+def network_error_message(e):
+    """Text returned to the user when the upstream can't be reached"""
+    # Fallback response when API is unavailable
+    if "Failed to resolve" in str(e) or "Max retries exceeded" in str(e):
+        return "Hello! I'm MediBot AI. I'm currently having trouble connecting to my medical AI services. Please check your internet connection or try again. Note: I can still perform basic image analysis offline."
+    return f"Network error: {str(e)}"
+
+@STAGE_SECONDS.time(stage='llm')
+def query_openrouter(prompt, image_data=None, mime_type='image/jpeg', history=None):
+    """Send query to OpenRouter API with image analysis capabilities"""
+    headers, data = build_openrouter_request(prompt, image_data, mime_type, history)
     
+    with work_slot('llm'):
+        return post_completion(headers, data)
+
+def post_completion(headers, data):
     try:
-        response = requests.post("https://openrouter.ai/api/v1/chat/completions", 
-                               headers=headers, json=data, timeout=30)
+        response = openrouter_client.post("chat/completions", headers=headers, json=data)
         response.raise_for_status()
         result = response.json()
         
         if 'choices' in result and len(result['choices']) > 0:
             return result['choices'][0]['message']['content']
         else:
+            LLM_ERRORS.inc(reason='api')
             return f"API Error: {result.get('error', {}).get('message', 'Unknown error')}"
             
     except requests.exceptions.RequestException as e:
-        # Fallback response when API is unavailable
-        if "Failed to resolve" in str(e) or "Max retries exceeded" in str(e):
-            return "Hello! I'm MediBot AI. I'm currently having trouble connecting to my medical AI services. Please check your internet connection or try again. Note: I can still perform basic image analysis offline."
-        return f"Network error: {str(e)}"
+        LLM_ERRORS.inc(reason='network')
+        return network_error_message(e)
     except Exception as e:
+        LLM_ERRORS.inc(reason='other')
         return f"Error processing request: {str(e)}"
 
+def open_openrouter_stream(prompt, image_data=None, mime_type='image/jpeg', history=None, slot=None):
+    """Start a streaming completion and return its CompletionStream.
+    
+    The upstream request is sent before this returns, so callers can start it
+    on a worker thread while other stages run. ``slot`` is an LLM slot the
+    caller already took (see stream_query_response); otherwise one is taken
+    here.
+    """
+    headers, data = build_openrouter_request(prompt, image_data, mime_type, history)
+    data["stream"] = True
+    started = time.perf_counter()
+    
+    try:
+        # Held until the stream is exhausted or closed, see CompletionStream
+        if slot is None:
+            slot = work_slot('llm')
+        response = openrouter_client.post("chat/completions", headers=headers, json=data, stream=True)
+        if response.status_code >= 400:
+            # Closing returns the connection and the client's concurrency slot
+            response.close()
+            response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        slot.release()
+        LLM_ERRORS.inc(reason='network')
+        return CompletionStream(error=network_error_message(e))
+    except OverloadedError as e:
+        # Not an upstream failure; requests take their slot before streaming
+        return CompletionStream(error=str(e))
+    except Exception as e:
+        if slot is not None:
+            slot.release()
+        LLM_ERRORS.inc(reason='other')
+        return CompletionStream(error=f"Error processing request: {str(e)}")
+    return CompletionStream(response, started, slot)
+
+class CompletionStream:
+    """Text deltas of a streaming completion.
+    
+    A failure, before or partway through the stream, arrives as a last delta
+    with the same error text query_openrouter returns and sets ``failed``:
+    the joined text may then start with a partial answer, which
+    is_error_response can't tell from a good one, and must not be cached or
+    recorded.
+    """
+    
+    def __init__(self, response=None, started=None, slot=None, error=None):
+        self.failed = error is not None
+        self._deltas = iter([error]) if self.failed else self._guarded(response, started, slot)
+    
+    def __iter__(self):
+        return self._deltas
+    
+    def _guarded(self, response, started, slot):
+        try:
+            yield from iter_stream_deltas(response)
+        except StreamError as e:
+            self.failed = True
+            LLM_ERRORS.inc(reason='api')
+            yield f"API Error: {e}"
+        except requests.exceptions.RequestException as e:
+            self.failed = True
+            LLM_ERRORS.inc(reason='network')
+            yield network_error_message(e)
+        except Exception as e:
+            self.failed = True
+            LLM_ERRORS.inc(reason='other')
+            yield f"Error processing request: {str(e)}"
+        finally:
+            slot.release()
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage='llm_stream')
+
+def encode_llm_image(image):
+    """Downscaled, re-encoded base64 copy of an upload for the vision model"""
+    with STAGE_SECONDS.time(stage='base64'):
+        return image.llm_image(LLM_IMAGE_MAX_EDGE, LLM_IMAGE_QUALITY, LLM_IMAGE_FORMAT)
+
+def analyze_with_llm(image):
+    """Vision LLM stage: send a downscaled, re-encoded copy of the upload"""
+    payload, mime_type, info = encode_llm_image(image)
+    return query_openrouter(prompts.text('analysis'), payload, mime_type), info
+
+def build_study_prompt(count):
+    """The analysis prompt for several views of one study sent together"""
+    return prompts.render('study', count=count) + prompts.text('analysis')
+
+def open_analysis_stream(image, slot=None):
+    """Streaming variant of analyze_with_llm"""
+    payload, mime_type, _ = encode_llm_image(image)
+    return open_openrouter_stream(prompts.text('analysis'), payload, mime_type, slot=slot)
+
+def stored_llm_image(image_id):
+    """(base64, mime_type) vision payload for a stored image, or None if expired"""
+    cached = llm_image_cache.get(image_id)
+    if cached is None:
+        stored = image_store.get(image_id)
+        if stored is None:
+            return None
+        payload, mime_type, _ = encode_llm_image(DecodedImage(stored[0]))
+        cached = (payload, mime_type)
+        llm_image_cache.set(image_id, cached)
+    return cached
+
+def image_reference(image_id, image):
+    """Fields identifying the stored upload in /upload responses"""
+    fields = {'image_id': image_id, 'image_url': f'/images/{image_id}'}
+    if UPLOAD_ECHO_IMAGE or request.args.get('include_image') == '1':
+        fields['image_data'] = image.base64
+    return fields
+
+def wants_compact():
+    value = request.values.get('compact')
+    return COMPACT_RESPONSES if value is None else value == '1'
+
+def compact_result(result):
+    """An analysis result with rounded detections and no derived size fields"""
+    result = {key: value for key, value in result.items() if key != 'image_data'}
+    if result.get('detections'):
+        result['detections'] = [{
+            'class': detection['class'],
+            'confidence': round(detection['confidence'], 3),
+            'bbox': [round(v, 1) for v in detection['bbox']]
+        } for detection in result['detections']]
+    if isinstance(result.get('metadata'), dict):
+        result['metadata'] = {key: value for key, value in result['metadata'].items()
+                              if key not in DERIVED_SIZE_FIELDS}
+    return result
+
+def shape_result(result):
+    """``result`` as this request asked for it (see wants_compact)"""
+    return compact_result(result) if wants_compact() else result
+
+def upload_cache_key(image_bytes):
+    """Result cache key: image hash plus everything that shapes the analysis"""
+    return content_key(image_bytes, ANALYSIS_VERSION, YOLO_WEIGHTS, DETECTION_BACKEND,
+                       tiled_detection and tiled_detection.settings, VISION_MODEL, prompts.text('analysis'),
+                       LLM_IMAGE_MAX_EDGE, LLM_IMAGE_QUALITY, LLM_IMAGE_FORMAT)
+
+def run_upload_analysis(image, image_id, cache_key, executor=stage_executor):
+    """Run detection, metadata and the LLM call for an uncached upload.
+    
+    Returns (analysis, timings, llm_image_info) and caches successful analyses.
+    """
+    # YOLO, metadata and the LLM call don't depend on each other, so they
+    # overlap and the request takes as long as the slowest stage. YOLO runs
+    # on the calling thread, the other two on ``executor``.
+    results, timings = run_stages(executor, {
+        'detection': (analyze_image_from_bytes, image),
+        'llm': (analyze_with_llm, image),
+        'metadata': (extract_metadata, image)
+    }, parallel=UPLOAD_PIPELINE)
+    detections = results['detection']
+    metadata = results['metadata']
+    ai_analysis, llm_image_info = results['llm']
+    logger.debug("Found %d detections", len(detections))
+    logger.debug("Extracted metadata: %s format", metadata.get('format', 'Unknown'))
+    
+    analysis = {
+        'detections': detections,
+        'metadata': metadata,
+        'ai_analysis': ai_analysis
+    }
+    if not is_error_response(ai_analysis):
+        result_cache.set(cache_key, analysis)
+    llm_image_cache.set(image_id, image.llm_image(LLM_IMAGE_MAX_EDGE, LLM_IMAGE_QUALITY, LLM_IMAGE_FORMAT)[:2])
+    return analysis, timings, llm_image_info
+
+def upload_session(image_id, ai_analysis, failed=False):
+    """Start a conversation about an analyzed upload; returns its session_id"""
+    context = None if failed or is_error_response(ai_analysis) else ai_analysis
+    return sessions.create(image_id, context)['session_id']
+
+def process_upload_job(image_bytes, options):
+    """Job queue worker: the same analysis as a synchronous /upload"""
+    image = DecodedImage(image_bytes)
+    # Background jobs wait for memory and detection/LLM slots as long as it takes
+    with upload_budget.reserve(image.footprint(LLM_IMAGE_MAX_EDGE), timeout=None), waiting_for_slots(), image:
+        image_id = image_store.put(image_bytes, image.mime_type)
+        image_ref = {'image_id': image_id, 'image_url': f'/images/{image_id}'}
+        cache_key = upload_cache_key(image_bytes)
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            session_id = upload_session(image_id, cached['ai_analysis'])
+            return {'success': True, **image_ref, 'session_id': session_id, 'cached': True, **cached}
+        analysis, _, _ = run_upload_analysis(image, image_id, cache_key, background_stage_executor)
+        session_id = upload_session(image_id, analysis['ai_analysis'])
+        return {'success': True, **image_ref, 'session_id': session_id, **analysis}
+
+def send_job_callback(callback_url, job):
+    """POST a finished job to the client's webhook, retrying briefly"""
+    for attempt in range(JOB_CALLBACK_RETRIES + 1):
+        # Checked again at delivery: the host's DNS may have changed since
+        # submission. Redirects aren't followed, for the same reason.
+        if not valid_callback_url(callback_url):
+            raise RuntimeError(f'callback to {callback_url} not allowed')
+        try:
+            response = requests.post(callback_url, json=job, timeout=10, allow_redirects=False)
+            if response.status_code < 500:
+                return
+        except requests.exceptions.RequestException as e:
+            logger.warning("Job callback error: %s", e)
+        if attempt < JOB_CALLBACK_RETRIES:
+            time.sleep(2 ** attempt)
+    raise RuntimeError(f'callback to {callback_url} failed')
+
+def is_public_host(hostname):
+    """Whether every address the host resolves to is publicly routable"""
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(hostname, None)}
+    except (socket.gaierror, UnicodeError):
+        return False
+    # Drop IPv6 zone ids ("fe80::1%eth0") before parsing
+    return bool(addresses) and all(ipaddress.ip_address(address.split('%')[0]).is_global for address in addresses)
+
+def valid_callback_url(url):
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        return False
+    if JOB_CALLBACK_HOSTS:
+        return parsed.hostname in JOB_CALLBACK_HOSTS
+    # Without an allowlist, results only go to public addresses: never to
+    # loopback, private networks or link-local (cloud metadata) endpoints
+    return is_public_host(parsed.hostname)
+
+def wants_async():
+    """Whether /upload should queue the analysis and return a job ID"""
+    if request.args.get('async') == '1' or request.form.get('async') == '1':
+        return True
+    return 'respond-async' in request.headers.get('Prefer', '')
+
+job_queue = JobQueue(
+    process_upload_job,
+    os.path.join(app.config['UPLOAD_FOLDER'], 'jobs.sqlite'),
+    workers=JOB_WORKERS,
+    max_pending=int(os.environ.get('JOB_MAX_PENDING', 64)),
+    ttl=float(os.environ.get('JOB_TTL', 24 * 3600)),
+    notify=send_job_callback
+)
+
+# Component counters (cache hits, upstream failures, queue depths, ...) are
+# read from their stats() at scrape time
+metrics.collect('detection_batching', detection_scheduler.stats)
+if tiled_detection is not None:
+    metrics.collect('detection_tiling', tiled_detection.stats)
+metrics.collect('result_cache', result_cache.stats)
+metrics.collect('query_cache', query_cache.stats)
+metrics.collect('query_coalescing', query_flight.stats)
+metrics.collect('openrouter', openrouter_client.stats)
+metrics.collect('image_store', image_store.stats)
+metrics.collect('jobs', job_queue.stats)
+metrics.collect('upload_budget', upload_budget.stats)
+metrics.collect('sessions', sessions.stats)
+metrics.collect('response_compression', compressor.stats)
+metrics.collect('rate_limits', rate_limiter.stats)
+metrics.collect('admission', admission.stats)
+metrics.collect('model_loader', model_loader.stats)
+
+def batch_items(files, client):
+    """(index, filename, bytes, error) for each image of a batch upload, read lazily"""
+    for index, (filename, data, error) in enumerate(iter_uploaded_files(files, UPLOAD_MAX_BYTES)):
+        if index >= BATCH_MAX_IMAGES:
+            yield index, filename, None, f'Batch limit of {BATCH_MAX_IMAGES} images reached, remaining files skipped'
+            return
+        # The request paid for its first image; the others count as uploads too
+        if index and rate_limiter.check('upload', client):
+            yield index, filename, None, 'Upload rate limit reached, remaining files skipped'
+            return
+        if error is None and not allowed_file(filename):
+            error = 'Invalid file type'
+        elif error is None and not is_supported_image(data):
+            error = 'File is not a supported image'
+        yield index, filename, data, error
+
+def analyze_batch_item(item, combined):
+    """Analyze one image of a batch; returns (result, cache_key, llm_image)"""
+    index, filename, image_bytes, error = item
+    if error is not None:
+        raise ValueError(error)
+    
+    image = DecodedImage(image_bytes)
+    # The batch was admitted as a whole, so its images queue for slots
+    with upload_budget.reserve(image.footprint(LLM_IMAGE_MAX_EDGE)), waiting_for_slots(), image:
+        image_id = image_store.put(image_bytes, image.mime_type)
+        cache_key = upload_cache_key(image_bytes)
+        result = {'index': index, 'filename': filename, 'image_id': image_id, 'image_url': f'/images/{image_id}'}
+        
+        if combined:
+            # The vision model sees the whole study in one prompt afterwards
+            result['detections'] = analyze_image_from_bytes(image)
+            result['metadata'] = extract_metadata(image)
+            return result, cache_key, encode_llm_image(image)[:2]
+        
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            return {**result, 'cached': True, **cached}, cache_key, None
+        analysis, _, _ = run_upload_analysis(image, image_id, cache_key, background_stage_executor)
+        return {**result, **analysis}, cache_key, None
+
+def stream_study_analysis(study):
+    """SSE events for one combined LLM analysis of a batch's images"""
+    order = sorted(study)
+    image_ids = [study[index][0] for index in order]
+    study_key = content_key(' '.join(study[index][1] for index in order).encode(), 'study', VISION_MODEL)
+    cached = result_cache.get(study_key)
+    if cached is not None:
+        yield sse_event('delta', {'text': cached['ai_analysis']})
+        yield sse_event('study', {'cached': True, 'image_ids': image_ids, **cached})
+        return
+    
+    parts = []
+    with waiting_for_slots():
+        deltas = open_openrouter_stream(build_study_prompt(len(order)), [study[index][2] for index in order])
+    for delta in deltas:
+        parts.append(delta)
+        yield sse_event('delta', {'text': delta})
+    ai_analysis = ''.join(parts)
+    if not deltas.failed and not is_error_response(ai_analysis):
+        result_cache.set(study_key, {'ai_analysis': ai_analysis})
+    yield sse_event('study', {'image_ids': image_ids, 'ai_analysis': ai_analysis})
+
+def stream_batch_analysis(files, combined, client):
+    """SSE events for /upload/batch: each image's result as soon as it finishes,
+    then the combined study analysis if requested"""
+    processed = 0
+    errors = 0
+    study = {}
+    try:
+        # Bounded read-ahead: only a few images are in memory at any time
+        finished = iter_completed(batch_executor, lambda item: analyze_batch_item(item, combined),
+                                  batch_items(files, client), max_in_flight=BATCH_WORKERS * 2)
+        for item, future in finished:
+            index, filename = item[0], item[1]
+            try:
+                result, cache_key, llm_image = future.result()
+            except Exception as e:
+                errors += 1
+                yield sse_event('image_error', {'index': index, 'filename': filename, 'error': str(e)})
+                continue
+            processed += 1
+            if combined:
+                study[index] = (result['image_id'], cache_key, llm_image)
+            yield sse_event('image_result', shape_result(result))
+        
+        if combined and study:
+            yield from stream_study_analysis(study)
+        yield sse_event('done', {'success': True, 'images': processed, 'errors': errors})
+    except Exception as e:
+        logger.exception("Batch upload error: %s", e)
+        yield sse_event('error', {'success': False, 'error': str(e)})
+
+def build_medical_query(query, has_image):
+    """Wrap a user question in the medical answer instructions"""
+    return prompts.render('query_image' if has_image else 'query_text', query=query)
+
+def query_cache_key(medical_query, image_data=None, mime_type='image/jpeg'):
+    """Cache key for a /query prompt: case and whitespace don't change the answer"""
+    normalized = ' '.join(medical_query.split()).casefold()
+    image_hash = content_key(image_data.encode(), mime_type) if image_data else ''
+    return content_key(normalized.encode(), image_hash, VISION_MODEL if image_data else TEXT_MODEL)
+
+def session_history(session):
+    """Chat messages replaying a session before its next question"""
+    notes = []
+    if session['context']:
+        notes.append(prompts.render('session_context', analysis=session['context']))
+    if session['earlier']:
+        notes.append(prompts.render('session_earlier', questions='\n'.join(f'- {q}' for q in session['earlier'])))
+    messages = [{'role': 'system', 'content': '\n\n'.join(notes)}] if notes else []
+    for question, answer in session['turns']:
+        messages.append({'role': 'user', 'content': question})
+        messages.append({'role': 'assistant', 'content': answer})
+    return messages
+
+def record_turn(session, question, answer, failed=False):
+    if session is not None and not failed and not is_error_response(answer):
+        sessions.add_turn(session, question, answer)
+
+def cached_query(medical_query, image_data=None, mime_type='image/jpeg'):
+    """query_openrouter through the response cache and single-flight coalescing"""
+    cache_key = query_cache_key(medical_query, image_data, mime_type)
+    cached = query_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    def fetch():
+        response = query_openrouter(medical_query, image_data, mime_type)
+        if not is_error_response(response):
+            query_cache.set(cache_key, response)
+        return response
+    return query_flight.do(cache_key, fetch)
+
+def stream_query_response(medical_query, image_data=None, mime_type='image/jpeg', session=None, question=None):
+    """SSE events for /query: text deltas, then the full response.
+    
+    With a ``session`` the answer is recorded as its next turn; answers that
+    depend on earlier turns bypass the query cache. Unless the answer is
+    cached, the LLM slot is taken before the events start, so a saturated
+    upstream raises OverloadedError (a 503) instead of failing inside a 200
+    stream.
+    """
+    history = session_history(session) if session is not None else []
+    session_fields = {'session_id': session['session_id']} if session is not None else {}
+    cache_key = query_cache_key(medical_query, image_data, mime_type)
+    cached = None if history else query_cache.get(cache_key)
+    if cached is not None:
+        record_turn(session, question, cached)
+        return iter([sse_event('delta', {'text': cached}),
+                     sse_event('done', {'response': cached, 'cached': True, **session_fields})])
+    return stream_query_deltas(work_slot('llm'), medical_query, image_data, mime_type, history,
+                               session, question, cache_key)
+
+def stream_query_deltas(slot, medical_query, image_data, mime_type, history, session, question, cache_key):
+    session_fields = {'session_id': session['session_id']} if session is not None else {}
+    parts = []
+    deltas = open_openrouter_stream(medical_query, image_data, mime_type, history, slot)
+    for delta in deltas:
+        parts.append(delta)
+        yield sse_event('delta', {'text': delta})
+    response = ''.join(parts)
+    if not deltas.failed and not is_error_response(response) and not history:
+        query_cache.set(cache_key, response)
+    record_turn(session, question, response, deltas.failed)
+    yield sse_event('done', {'response': response, **session_fields})
+
+def stream_upload_analysis(image, image_ref, cache_key, cached=None, slot=None):
+    """SSE events for /upload: detections and metadata first, then LLM text
+    deltas from a stream holding ``slot`` (see stream_query_response)"""
+    yield sse_event('image', image_ref)
+    if cached is not None:
+        yield sse_event('detections', shape_result({'detections': cached['detections']}))
+        yield sse_event('metadata', shape_result({'metadata': cached['metadata']}))
+        yield sse_event('delta', {'text': cached['ai_analysis']})
+        session_id = upload_session(image_ref['image_id'], cached['ai_analysis'])
+        yield sse_event('done', {'success': True, 'cached': True, 'session_id': session_id,
+                                 'ai_analysis': cached['ai_analysis']})
+        return
+    
+    try:
+        # Start the LLM request first; detection (on this thread) and
+        # metadata overlap with it
+        llm_stream = stage_executor.submit(open_analysis_stream, image, slot)
+        metadata_future = stage_executor.submit(extract_metadata, image)
+        
+        detections = analyze_image_from_bytes(image)
+        yield sse_event('detections', shape_result({'detections': detections}))
+        
+        metadata = metadata_future.result()
+        yield sse_event('metadata', shape_result({'metadata': metadata}))
+        
+        parts = []
+        deltas = llm_stream.result()
+        for delta in deltas:
+            parts.append(delta)
+            yield sse_event('delta', {'text': delta})
+        ai_analysis = ''.join(parts)
+        
+        if not deltas.failed and not is_error_response(ai_analysis):
+            result_cache.set(cache_key, {
+                'detections': detections,
+                'metadata': metadata,
+                'ai_analysis': ai_analysis
+            })
+        session_id = upload_session(image_ref['image_id'], ai_analysis, deltas.failed)
+        yield sse_event('done', {'success': True, 'session_id': session_id, 'ai_analysis': ai_analysis})
+    except Exception as e:
+        logger.exception("Upload stream error: %s", e)
+        yield sse_event('error', {'success': False, 'error': str(e)})
+    finally:
+        # Before hold_until_done releases the upload's reservation
+        image.release()
+
 # Test route
 @app.route('/test')
 def test_backend():
-    return jsonify({'status': 'Backend is working!', 'yolo_loaded': model is not None})
+    # Liveness: this handler answers as soon as the process is up. Readiness
+    # (model loaded and warmed up) is reported separately, see also /ready.
+    return jsonify({
+        'status': 'Backend is working!',
+        'alive': True,
+        'ready': model_loader.ready,
+        'yolo_loaded': DETECTION_ENABLED and model_loader.ready,
+        'model_loader': model_loader.stats(),
+        'detection_backend': DETECTION_BACKEND,
+        'detection_batching': detection_scheduler.stats(),
+        'detection_tiling': tiled_detection.stats() if tiled_detection is not None else None,
+        'result_cache': result_cache.stats(),
+        'query_cache': query_cache.stats(),
+        'query_coalescing': query_flight.stats(),
+        'openrouter': openrouter_client.stats(),
+        'image_store': image_store.stats(),
+        'upload_budget': upload_budget.stats(),
+        'sessions': sessions.stats(),
+        'response_compression': compressor.stats(),
+        'rate_limits': rate_limiter.stats(),
+        'admission': admission.stats(),
+        'jobs': job_queue.stats()
+    })
+
+@app.route('/ready')
+def readiness():
+    if model_loader.ready:
+        return jsonify({'ready': True, 'model_loader': model_loader.stats()})
+    return jsonify({'ready': False, 'model_loader': model_loader.stats()}), 503
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.endpoint or 'unmatched'
+    REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    started = g.get('request_started')
+    if started is not None:
+        REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+    if not response.is_streamed and response.content_length is not None:
+        PAYLOAD_BYTES.observe(response.content_length, kind='response')
+    return response
+
+# Registered after record_request_metrics, so it runs first and the metrics
+# see the bytes actually sent
+@app.after_request
+def compress_response(response):
+    if not RESPONSE_COMPRESSION:
+        return response
+    with STAGE_SECONDS.time(stage='compress'):
+        return compressor(response, request.headers.get('Accept-Encoding', ''))
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.before_request
+def limit_request_size():
+    # Refuse a declared oversized body before admission control counts it;
+    # bodies without a Content-Length are capped while they are read
+    if (request.content_length or 0) > request.max_content_length:
+        abort(413)
+
+def client_key():
+    """Who a request counts against for rate limiting"""
+    return request.remote_addr or 'unknown'
+
+def shed_response(status, error, retry_after):
+    return jsonify({'success': False, 'error': error}), status, {'Retry-After': str(retry_after)}
+
+@app.before_request
+def admit_request():
+    """Shed uploads and queries over the concurrency or rate limits before
+    their bodies are read or anything is decoded"""
+    costs = ENDPOINT_COSTS.get(request.endpoint)
+    if costs is None or request.method == 'OPTIONS':
+        return None
+    limit, kinds = costs
+    # Slots are taken per call (work_slot); this only turns requests away
+    # early when a kind they need already has a full queue
+    full = admission.saturated(kinds)
+    if full is not None:
+        logger.info("Shed %s: %s concurrency limit reached", request.endpoint, full)
+        return shed_response(503, 'Server busy, please retry later', ADMISSION_RETRY_AFTER)
+    wait = rate_limiter.check(limit, client_key())
+    if wait:
+        logger.info("Rate limited %s from %s", request.endpoint, client_key())
+        return shed_response(429, 'Too many requests, please slow down', math.ceil(wait))
+    return None
+
+@app.errorhandler(OverloadedError)
+def overloaded(e):
+    # A detection or LLM call found its kind saturated after admission
+    logger.info("Shed %s: %s", request.endpoint, e)
+    return shed_response(503, str(e), ADMISSION_RETRY_AFTER)
 
 # Serve React build files
 @app.route('/', defaults={'path': ''})
@@ -257,6 +1172,14 @@ def serve_react_app(path):
     else:
         return send_from_directory('frontend/build', 'index.html')
 
+@app.route('/images/<image_id>')
+def get_image(image_id):
+    stored = image_store.get(image_id)
+    if stored is None:
+        return jsonify({'error': 'Image not found or expired'}), 404
+    data, mime_type = stored
+    return Response(data, mimetype=mime_type, headers={'Cache-Control': 'private, max-age=3600'})
+
 @app.route('/upload', methods=['POST', 'OPTIONS'])
 def upload_file():
     # Handle preflight requests
@@ -264,140 +1187,202 @@ def upload_file():
         return jsonify({'success': True})
         
     try:
-        print("Upload request received")
-        print(f"Request files: {list(request.files.keys())}")
-        print(f"Request form: {dict(request.form)}")
+        logger.debug("Upload request received")
+        logger.debug("Request files: %s", list(request.files.keys()))
+        logger.debug("Request form: %s", dict(request.form))
         
         if 'file' not in request.files:
-            print("No file in request")
+            logger.info("Upload rejected: no file in request")
             return jsonify({'success': False, 'error': 'No file uploaded'})
         
         file = request.files['file']
         if file.filename == '':
-            print("Empty filename")
+            logger.info("Upload rejected: empty filename")
             return jsonify({'success': False, 'error': 'No file selected'})
         
         if not allowed_file(file.filename):
             return jsonify({'success': False, 'error': 'Invalid file type'})
         
-        print(f"Processing file: {file.filename}")
+        logger.debug("Processing file: %s", file.filename)
         
-        # Read image bytes
-        image_bytes = file.read()
-        print(f"Image size: {len(image_bytes)} bytes")
+        # Large uploads are mapped from their spool file, not copied into memory
+        image_bytes = map_upload(file)
+        PAYLOAD_BYTES.observe(len(image_bytes), kind='upload')
+        logger.debug("Image size: %d bytes", len(image_bytes))
+        if not is_supported_image(image_bytes):
+            return jsonify({'success': False, 'error': 'File is not a supported image'})
         
-        # Analyze image with YOLO
-        detections = analyze_image_from_bytes(image_bytes)
-        print(f"Found {len(detections)} detections")
+        # Bursts of uploads are queued instead of holding a worker each; the
+        # client polls /jobs/<id> or gets a webhook when the analysis is done
+        if wants_async():
+            return submit_upload_job(image_bytes)
         
-        # Extract metadata
-        metadata = extract_metadata(image_bytes)
-        print(f"Extracted metadata: {metadata.get('format', 'Unknown')} format")
-        
-        # Convert image to base64 for frontend
-        img_base64 = base64.b64encode(image_bytes).decode()
-        
-        # Load response template
-        template_path = 'templates/response_template.txt'
+        # Only the header has been read so far. Nothing is hashed or decoded
+        # until the upload fits in the memory budget.
+        image = DecodedImage(image_bytes)
         try:
-            with open(template_path, 'r') as f:
-                response_template = f.read()
-        except:
-            # Medical analysis template - simplified
-            response_template = """Medical imaging analysis template - respond in structured format with clear sections and bullet points."""
-        
-        analysis_prompt = f"""Analyze this medical image as a radiologist would. Provide a professional medical assessment.
-
-Format your response as:
-
-IMAGING MODALITY:
-• Identify the type of medical imaging
-
-ANATOMICAL STRUCTURES:
-• List visible anatomical structures
-• Note bone, soft tissue, or organ visibility
-
-RADIOLOGICAL FINDINGS:
-• Describe any notable findings
-• Comment on symmetry, alignment, density
-• Identify any abnormalities or pathology
-
-CLINICAL IMPRESSION:
-• Provide clinical assessment
-• Suggest differential diagnoses if applicable
-• Recommend further imaging if needed
-
-MEDICAL DISCLAIMER:
-• This is an AI-assisted analysis for educational purposes
-• Clinical correlation and professional medical evaluation required
-• Not intended for diagnostic or treatment decisions
-
-Use medical terminology appropriately. Focus on anatomical and pathological observations only. Use bullet points (•) exclusively - no asterisks or bold formatting."""
+            reservation = upload_budget.reserve(image.footprint(LLM_IMAGE_MAX_EDGE))
+        except BudgetExceededError:
+            logger.warning("Upload rejected: memory budget exhausted")
+            response = jsonify({'success': False, 'error': 'Server busy, please retry later'})
+            return response, 503, {'Retry-After': str(JOB_RETRY_AFTER)}
         
-        ai_analysis = query_openrouter(analysis_prompt, img_base64)
+        with reservation:
+            # Identical uploads skip detection, metadata and the LLM call
+            cache_key = upload_cache_key(image_bytes)
+            image_id = image_store.put(image_bytes, image.mime_type)
+            image_ref = image_reference(image_id, image)
+            cached = result_cache.get(cache_key)
+            
+            # SSE clients get detections and metadata before the LLM text
+            if wants_stream():
+                # Taken before the 200 starts, see stream_query_response
+                slot = work_slot('llm') if cached is None else None
+                events = stream_upload_analysis(image, image_ref, cache_key, cached, slot)
+                return sse_response(reservation.hold_until_done(events))
+            
+            if cached is not None:
+                logger.debug("Upload served from result cache")
+                session_id = upload_session(image_id, cached['ai_analysis'])
+                return jsonify(shape_result({'success': True, **image_ref, 'session_id': session_id,
+                                             'cached': True, **cached}))
+            
+            # The pixels are freed before the reservation makes room for the next upload
+            with image:
+                analysis, timings, llm_image_info = run_upload_analysis(image, image_id, cache_key)
         
-        print("Upload successful")
-        return jsonify({
+        logger.info("Upload analyzed: %d bytes, %d detections", len(image_bytes), len(analysis['detections']))
+        response = {
             'success': True,
-            'image_data': img_base64,
-            'detections': detections,
-            'metadata': metadata,
-            'ai_analysis': ai_analysis
-        })
+            **image_ref,
+            'session_id': upload_session(image_id, analysis['ai_analysis']),
+            **analysis
+        }
+        if UPLOAD_DEBUG_TIMINGS or request.args.get('debug') == '1':
+            response['timings_ms'] = timings
+            response['llm_image'] = llm_image_info
+        return jsonify(shape_result(response))
         
+    except (HTTPException, OverloadedError):
+        # e.g. 413 from a chunked body that went over the size limit
+        raise
     except Exception as e:
-        print(f"Upload error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Upload error: %s", e)
         return jsonify({'success': False, 'error': str(e)})
 
+def submit_upload_job(image_bytes):
+    """Queue an upload for background analysis and answer 202 with its job ID"""
+    priority = request.form.get('priority') or request.args.get('priority') or 'interactive'
+    if priority not in PRIORITIES:
+        return jsonify({'success': False, 'error': f"priority must be one of {', '.join(PRIORITIES)}"}), 400
+    callback_url = request.form.get('callback_url') or request.args.get('callback_url')
+    if callback_url and not valid_callback_url(callback_url):
+        return jsonify({'success': False, 'error': 'Invalid callback_url'}), 400
+    
+    try:
+        job = job_queue.submit(image_bytes, priority, {'callback_url': callback_url})
+    except QueueFullError:
+        response = jsonify({'success': False, 'error': 'Too many queued uploads, please retry later'})
+        return response, 429, {'Retry-After': str(JOB_RETRY_AFTER)}
+    
+    logger.info("Upload queued as job %s", job['job_id'])
+    status_url = f"/jobs/{job['job_id']}"
+    return jsonify({'success': True, **job, 'status_url': status_url}), 202, {'Location': status_url}
+
+@app.route('/upload/batch', methods=['POST', 'OPTIONS'])
+def upload_batch():
+    # Handle preflight requests
+    if request.method == 'OPTIONS':
+        return jsonify({'success': True})
+    
+    # Several `files` fields and/or zip archives; werkzeug spools them to disk
+    files = request.files.getlist('files') + request.files.getlist('file')
+    files = [f for f in files if f.filename]
+    if not files:
+        return jsonify({'success': False, 'error': 'No files uploaded'}), 400
+    
+    combined = (request.form.get('combined') or request.args.get('combined')) == '1'
+    logger.info("Batch upload received: %d file(s), combined=%s", len(files), combined)
+    return sse_response(stream_batch_analysis(files, combined, client_key()))
+
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    job_queue.start()
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    if job.get('result'):
+        job['result'] = shape_result(job['result'])
+    return jsonify(job)
+
 @app.route('/query', methods=['POST'])
 def handle_query():
     try:
         data = request.json
         query = data.get('query', '')
         image_data = data.get('image_data', '')
+        image_id = data.get('image_id', '')
+        session_id = data.get('session_id', '')
+        mime_type = 'image/jpeg'
         
         if not query:
             return jsonify({'error': 'No query provided'})
         
-        print(f"Query received: {query}")
+        logger.debug("Query received: %s", query)
         
-        # Enhanced medical query handling
-        if image_data:
-            medical_query = f"""Based on the medical image provided, please answer this question: {query}
-            
-Provide a professional medical response using:
-            • Clear medical explanations
-            • Relevant anatomical context
-            • Clinical significance if applicable
-            • Appropriate medical disclaimers
-            
-Use bullet points (•) for structure. Maintain professional medical tone."""
+        # Follow-ups in a session send only the new question; the image is
+        # sent on the session's first question, later turns see the answers
+        if session_id:
+            session = sessions.get(session_id)
+            if session is None:
+                return jsonify({'error': 'Session not found or expired, please start a new one'}), 404
+            if not image_id and not image_data and session['image_id'] and not (session['context'] or session['turns']):
+                image_id = session['image_id']
+        elif data.get('new_session'):
+            # Conversations start with an upload, or when the client asks;
+            # one-off questions stay stateless and write nothing
+            session = sessions.create(image_id or None)
         else:
-            medical_query = f"""As MediBot AI, please answer this medical question: {query}
-            
-Provide:
-            • Professional medical information
-            • Educational context
-            • Appropriate medical disclaimers
-            • Recommendation to consult healthcare professionals
-            
-Use bullet points (•) for clear structure."""
+            session = None
+        
+        # Follow-ups reference the stored upload instead of re-sending it
+        if image_id:
+            stored = stored_llm_image(image_id)
+            if stored is None:
+                return jsonify({'error': 'Image not found or expired, please upload it again'}), 404
+            image_data, mime_type = stored
         
-        response = query_openrouter(medical_query, image_data)
-        return jsonify({'response': response})
+        medical_query = build_medical_query(query, bool(image_data))
+        
+        if data.get('stream') or wants_stream():
+            return sse_response(stream_query_response(medical_query, image_data, mime_type, session, query))
+        
+        history = session_history(session) if session is not None else []
+        if history:
+            # The answer depends on the conversation so far; not cacheable
+            response = query_openrouter(medical_query, image_data, mime_type, history)
+        else:
+            response = cached_query(medical_query, image_data, mime_type)
+        record_turn(session, query, response)
+        if session is None:
+            return jsonify({'response': response})
+        return jsonify({'response': response, 'session_id': session['session_id']})
         
+    except (HTTPException, OverloadedError):
+        raise
     except Exception as e:
-        print(f"Query error: {str(e)}")
+        logger.exception("Query error: %s", e)
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
 if __name__ == '__main__':
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    # Pick up jobs left queued by a previous run
+    job_queue.start()
     port = int(os.environ.get('PORT', 5001))
     # host='0.0.0.0' allows connections from mobile devices on same network
     print(f"\n🏥 MediBot AI Backend starting...")
     print(f"📱 Mobile app can connect to: http://[YOUR_MACBOOK_IP]:{port}")
     print(f"🌐 Web app available at: http://localhost:{port}")
     print(f"💡 To find your MacBook IP: ifconfig | grep 'inet ' | grep -v 127.0.0.1\n")
-    app.run(debug=True, port=port, host='0.0.0.0')
\ No newline at end of file
+    # Development server only; production runs under gunicorn (see gunicorn.conf.py)
+    app.run(debug=os.environ.get('FLASK_DEBUG') == '1', port=port, host='0.0.0.0')
\ No newline at end of file
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Cold-start timings for app.py under each MODEL_LOAD_MODE.
+
+Each mode runs in a fresh interpreter and reports how long `import app` takes
+(time until the server could accept requests), how long until the model is
+loaded and warmed up, the first /test and /query latencies and the peak RSS.
+/query runs against the local fake OpenRouter server.
+
+--detection-backends compares DETECTION_BACKEND values, e.g. `torch,none`
+for the full backend against the lightweight deployment.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r'''
+import json, resource, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {root!r})
+from benchmarks.fake_openrouter import start_fake_server
+import os
+os.environ['OPENROUTER_BASE_URL'] = start_fake_server().base_url
+import_started = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.app.test_client()
+t = time.perf_counter(); client.get('/test'); test_ms = (time.perf_counter() - t) * 1000
+t = time.perf_counter(); client.post('/query', json={{'query': 'hello'}}); query_ms = (time.perf_counter() - t) * 1000
+try:
+    app.get_model()
+    ready = time.perf_counter() - import_started
+except Exception as e:
+    ready = None
+print(json.dumps({{
+    'import_s': round(imported - import_started, 3),
+    'ready_s': round(ready, 3) if ready is not None else None,
+    'first_test_ms': round(test_ms, 1),
+    'first_query_ms': round(query_ms, 1),
+    'heavy_modules_at_import': [m for m in ('torch', 'ultralytics', 'cv2') if m in sys.modules],
+    'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+}}))
+'''
+
+
+def run_mode(mode, warmup, backend):
+    env = dict(os.environ, MODEL_LOAD_MODE=mode, MODEL_WARMUP='1' if warmup else '0', DETECTION_BACKEND=backend)
+    result = subprocess.run([sys.executable, '-c', PROBE.format(root=ROOT)], cwd=ROOT, env=env,
+                            capture_output=True, text=True)
+    lines = [line for line in result.stdout.splitlines() if line.startswith('{')]
+    if result.returncode != 0 or not lines:
+        return {'error': (result.stderr.strip().splitlines() or ['unknown error'])[-1]}
+    return json.loads(lines[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--modes', default='eager,background,lazy')
+    parser.add_argument('--no-warmup', action='store_true')
+    parser.add_argument('--detection-backends', default=os.environ.get('DETECTION_BACKEND', 'torch'))
+    args = parser.parse_args()
+
+    for backend in args.detection_backends.split(','):
+        for mode in args.modes.split(','):
+            print(f"{backend:>9} {mode:>10}: {run_mode(mode, not args.no_warmup, backend)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Peak memory and CPU of the upload decode path: per-stage decoding vs DecodedImage.
+
+The "before" path mirrors the original app.py: PIL decode + np.array + RGB->BGR
+copy for YOLO, a second PIL open (and two _getexif calls) for metadata, and a
+base64 copy of the upload.
+
+Peak memory comes from tracemalloc, which sees Python and numpy allocations
+but not PIL's own pixel buffers, so both columns undercount by one decoded
+image; the difference between them is what the shared decode saves.
+"""
+
+import argparse
+import base64
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import Image
+
+from medibot.image import DecodedImage
+
+
+def make_upload(width, height, quality=92):
+    """A noisy JPEG close to the 16MB upload limit at large sizes"""
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, 'JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+def before(image_bytes):
+    import cv2
+
+    image = Image.open(io.BytesIO(image_bytes))
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    cv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+
+    meta_image = Image.open(io.BytesIO(image_bytes))
+    if meta_image._getexif() is not None:
+        meta_image._getexif()
+    size = meta_image.size
+
+    img_base64 = base64.b64encode(image_bytes).decode()
+    return cv_image, size, img_base64
+
+
+def after(image_bytes):
+    image = DecodedImage(image_bytes)
+    yolo_input = image.rgb
+    size = image.size
+    image.exif
+    return yolo_input, size, image.base64
+
+
+def measure(fn, image_bytes, repeats):
+    tracemalloc.start()
+    fn(image_bytes)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    for _ in range(repeats):
+        fn(image_bytes)
+    cpu_ms = (time.perf_counter() - started) * 1000 / repeats
+    return peak, cpu_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='1024x768,2048x1536,4000x3000')
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'image':>12} {'upload MB':>10} {'before peak MB':>15} {'after peak MB':>14} "
+          f"{'before ms':>10} {'after ms':>9}")
+    for size in args.sizes.split(','):
+        width, height = (int(v) for v in size.split('x'))
+        image_bytes = make_upload(width, height)
+        before_peak, before_ms = measure(before, image_bytes, args.repeats)
+        after_peak, after_ms = measure(after, image_bytes, args.repeats)
+        print(f"{size:>12} {len(image_bytes) / 2**20:>10.2f} {before_peak / 2**20:>15.1f} "
+              f"{after_peak / 2**20:>14.1f} {before_ms:>10.1f} {after_ms:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Latency and throughput of the detection backends across batch sizes and thread counts.
+
+Times the raw forward pass on letterboxed 640x640 input so runtimes can be
+given an explicit thread count: torch via torch.set_num_threads, ONNX Runtime
+via intra_op_num_threads and OpenVINO via INFERENCE_NUM_THREADS. The end-to-end
+column runs Detector.predict (pre/post-processing included) at default threads.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+from medibot.detection import export_weights, load_detector
+
+
+def torch_runner(weights, threads):
+    import torch
+
+    torch.set_num_threads(threads)
+    model = load_detector(weights, 'torch').model.model.eval()
+
+    def run(batch):
+        with torch.inference_mode():
+            model(torch.from_numpy(batch))
+    return run
+
+
+def onnx_runner(weights, threads, backend):
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = threads
+    options.inter_op_num_threads = 1
+    session = onnxruntime.InferenceSession(export_weights(weights, backend), options,
+                                           providers=['CPUExecutionProvider'])
+    input_name = session.get_inputs()[0].name
+    return lambda batch: session.run(None, {input_name: batch})
+
+
+def openvino_runner(weights, threads):
+    from openvino.runtime import Core
+
+    directory = export_weights(weights, 'openvino')
+    xml = next(os.path.join(directory, f) for f in os.listdir(directory) if f.endswith('.xml'))
+    compiled = Core().compile_model(xml, 'CPU', {'INFERENCE_NUM_THREADS': threads})
+
+    def run(batch):
+        # The IR has a static batch of one
+        for image in batch:
+            compiled([image[None]])
+    return run
+
+
+def make_runner(backend, weights, threads):
+    if backend == 'torch':
+        return torch_runner(weights, threads)
+    if backend in ('onnx', 'onnx-int8'):
+        return onnx_runner(weights, threads, backend)
+    if backend == 'openvino':
+        return openvino_runner(weights, threads)
+    raise ValueError(backend)
+
+
+def time_it(fn, repeats):
+    fn()
+    started = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - started) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--weights', default=os.path.join(ROOT, 'yolov8n.pt'))
+    parser.add_argument('--backends', default='torch,onnx,onnx-int8,openvino')
+    parser.add_argument('--batch-sizes', default='1,4,8')
+    parser.add_argument('--threads', default=f"1,{max(1, os.cpu_count() // 2)},{os.cpu_count()}")
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    batch_sizes = [int(v) for v in args.batch_sizes.split(',')]
+    thread_counts = sorted({int(v) for v in args.threads.split(',')})
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 255, (480, 640, 3), dtype=np.uint8) for _ in range(max(batch_sizes))]
+
+    print(f"{'backend':>10} {'threads':>7} {'batch':>5} {'ms/batch':>9} {'img/s':>7} {'e2e ms/batch':>13}")
+    for backend in args.backends.split(','):
+        try:
+            detector = load_detector(args.weights, backend)
+        except Exception as e:
+            print(f"{backend:>10}: skipped ({e})")
+            continue
+        for threads in thread_counts:
+            try:
+                run = make_runner(backend, args.weights, threads)
+            except Exception as e:
+                print(f"{backend:>10}: skipped ({e})")
+                break
+            for batch_size in batch_sizes:
+                batch = rng.random((batch_size, 3, 640, 640), dtype=np.float32)
+                seconds = time_it(lambda: run(batch), args.repeats)
+                e2e = time_it(lambda: detector.predict(frames[:batch_size]), args.repeats)
+                print(f"{backend:>10} {threads:>7} {batch_size:>5} {seconds * 1000:>9.1f} "
+                      f"{batch_size / seconds:>7.1f} {e2e * 1000:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Bytes sent to the vision model and upstream time: raw upload vs downscaled re-encode.
+
+Upstream time is measured against the local fake OpenRouter server (so it is
+mostly JSON encoding and transfer) and estimated for a real uplink with
+--uplink-mbps. "encode ms" includes the pixel decode, which /upload shares
+with YOLO.
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import Image
+
+from benchmarks.fake_openrouter import start_fake_server
+from medibot.image import DecodedImage
+from medibot.openrouter import OpenRouterClient
+
+
+def make_scan(width, height, fmt):
+    """Smooth gradient plus mild noise, closer to a radiograph than pure noise"""
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width]
+    base = (128 + 100 * np.sin(x / width * 6) * np.cos(y / height * 4)).astype(np.int16)
+    pixels = np.clip(base[..., None] + rng.integers(-12, 12, (height, width, 1)), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(np.repeat(pixels, 3, axis=2)).save(buffer, fmt, **({'quality': 95} if fmt == 'JPEG' else {}))
+    return buffer.getvalue()
+
+
+def post_image(client, payload, mime_type):
+    body = {'model': 'fake', 'messages': [{'role': 'user', 'content': [
+        {'type': 'text', 'text': 'Analyze'},
+        {'type': 'image_url', 'image_url': {'url': f"data:{mime_type};base64,{payload}"}}
+    ]}]}
+    started = time.perf_counter()
+    client.post('chat/completions', json=body).json()
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='1024x768,2048x1536,4000x3000')
+    parser.add_argument('--formats', default='JPEG,PNG')
+    parser.add_argument('--max-edge', type=int, default=1536)
+    parser.add_argument('--quality', type=int, default=85)
+    parser.add_argument('--uplink-mbps', type=float, default=20.0)
+    args = parser.parse_args()
+
+    server = start_fake_server()
+    client = OpenRouterClient(base_url=server.base_url)
+
+    print(f"{'image':>16} {'raw KB':>9} {'sent KB':>9} {'saved':>6} {'encode ms':>10} "
+          f"{'raw post ms':>12} {'sent post ms':>13} {'raw uplink ms':>14} {'sent uplink ms':>15}")
+    for fmt in args.formats.split(','):
+        for size in args.sizes.split(','):
+            width, height = (int(v) for v in size.split('x'))
+            data = make_scan(width, height, fmt)
+            image = DecodedImage(data)
+            payload, mime_type, info = image.llm_image(args.max_edge, args.quality)
+
+            raw_ms = post_image(client, image.base64, Image.MIME[fmt])
+            sent_ms = post_image(client, payload, mime_type)
+            raw_b64 = len(image.base64)
+            uplink = args.uplink_mbps * 1e6 / 8 / 1000  # bytes per ms
+
+            print(f"{fmt + ' ' + size:>16} {info['original_bytes'] / 1024:>9.0f} {info['sent_bytes'] / 1024:>9.0f} "
+                  f"{info['saved_bytes'] / max(1, info['original_bytes']):>6.0%} {info['encode_ms']:>10.1f} "
+                  f"{raw_ms:>12.1f} {sent_ms:>13.1f} {raw_b64 / uplink:>14.0f} {len(payload) / uplink:>15.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""Metadata extraction time on large JPEGs: PIL _getexif vs the header parser.
+
+The "before" path mirrors the original extract_metadata: PIL header open,
+_getexif() twice and a name -> value dict of every tag. The "after" path is
+medibot.exif.read_header as used by DecodedImage: a marker scan over the
+bytes that reads only the reported tags. Neither decodes pixels.
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import Image
+from PIL.ExifTags import TAGS
+from PIL.TiffImagePlugin import IFDRational
+
+from medibot.exif import read_header
+
+
+def camera_exif():
+    """EXIF as a phone or DSLR writes it: camera, exposure, lens and GPS tags"""
+    exif = Image.Exif()
+    exif[0x010F] = 'Canon'
+    exif[0x0110] = 'Canon EOS 5D Mark IV'
+    exif[0x0131] = 'Firmware 1.2.0'
+    exif[0x0132] = '2024:03:14 09:26:53'
+    exif[0x011A] = IFDRational(300, 1)
+    exif[0x011B] = IFDRational(300, 1)
+    exif[0x0128] = 2
+    exif[0x0112] = 1
+    details = exif.get_ifd(0x8769)
+    details[0x829A] = IFDRational(1, 250)
+    details[0x829D] = IFDRational(28, 10)
+    details[0x8827] = 400
+    details[0x9003] = '2024:03:14 09:26:53'
+    details[0x9004] = '2024:03:14 09:26:53'
+    details[0x9209] = 16
+    details[0x920A] = IFDRational(50, 1)
+    details[0xA001] = 1
+    details[0xA301] = b'\x01'
+    details[0xA405] = 50
+    details[0xA434] = 'EF50mm f/1.8 STM'
+    # A MakerNote blob, as real cameras write; PIL parses past it, we skip it
+    details[0x927C] = bytes(range(256)) * 16
+    gps = exif.get_ifd(0x8825)
+    gps[0x01] = 'N'
+    gps[0x02] = (IFDRational(52, 1), IFDRational(31, 1), IFDRational(1234, 100))
+    gps[0x03] = 'W'
+    gps[0x04] = (IFDRational(1, 1), IFDRational(54, 1), IFDRational(4321, 100))
+    gps[0x06] = IFDRational(1205, 10)
+    gps[0x1D] = '2024:03:14'
+    return exif
+
+
+def make_photo(width, height, quality=92, exif=True):
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    options = {'exif': camera_exif()} if exif else {}
+    Image.fromarray(pixels).save(buffer, 'JPEG', quality=quality, **options)
+    return buffer.getvalue()
+
+
+def before(data):
+    image = Image.open(io.BytesIO(data))
+    exif_data = {}
+    if image._getexif() is not None:
+        for tag_id, value in image._getexif().items():
+            exif_data[TAGS.get(tag_id, tag_id)] = value
+    return image.format, image.mode, image.size, exif_data
+
+
+def after(data):
+    return read_header(data)
+
+
+def measure(fn, data, repeat):
+    fn(data)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(data)
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1920x1080,4000x3000,6000x4000')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'image':<18} {'MB':>6} {'PIL ms':>8} {'header ms':>10} {'speedup':>8}")
+    for size in args.sizes.split(','):
+        width, height = (int(v) for v in size.split('x'))
+        for exif in (True, False):
+            data = make_photo(width, height, exif=exif)
+            old = measure(before, data, args.repeat)
+            new = measure(after, data, args.repeat)
+            label = f"{size}{'' if exif else ' no-exif'}"
+            print(f"{label:<18} {len(data) / 1024 / 1024:>6.1f} {old:>8.3f} {new:>10.3f} {old / new:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Per-call cost of the /metrics instrumentation and of a disabled log call.
+
+Times Histogram.observe, the Histogram.time() context manager, Counter.inc
+and a logger.debug call that is filtered out, from one and several threads.
+"""
+
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from medibot.metrics import Registry
+
+
+def per_call_ns(fn, calls, threads):
+    def worker():
+        for _ in range(calls):
+            fn()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return (time.perf_counter() - started) / (calls * threads) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--calls', type=int, default=200000)
+    parser.add_argument('--threads', default='1,8')
+    args = parser.parse_args()
+
+    registry = Registry('bench')
+    histogram = registry.histogram('stage_seconds', 'bench', ('stage',))
+    counter = registry.counter('requests', 'bench', ('endpoint', 'status'))
+    logger = logging.getLogger('bench')
+    logger.setLevel(logging.INFO)
+
+    def timed():
+        with histogram.time(stage='detection'):
+            pass
+
+    cases = {
+        'baseline (empty call)': lambda: None,
+        'Histogram.observe': lambda: histogram.observe(0.012, stage='detection'),
+        'Histogram.time()': timed,
+        'Counter.inc': lambda: counter.inc(endpoint='upload_file', status=200),
+        'logger.debug (filtered)': lambda: logger.debug("Image size: %d bytes", 12345),
+    }
+    for threads in (int(v) for v in args.threads.split(',')):
+        print(f"{threads} thread(s):")
+        for name, fn in cases.items():
+            print(f"  {name:<26} {per_call_ns(fn, args.calls // threads, threads):8.0f} ns/call")
+    print(f"render with {len(registry.render().splitlines())} lines: "
+          f"{per_call_ns(registry.render, 200, 1) / 1000:.0f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Per-box vs vectorized conversion of YOLO results into detection dicts.
+
+Builds ultralytics Results with many synthetic boxes (half above the 0.5
+threshold) and times the old box-by-box loop against result_to_detections.
+Needs ultralytics / torch.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+from medibot.detection import class_lookup, result_to_detections
+
+
+def per_box_detections(result, names, threshold=0.5):
+    """The original loop: three device transfers and a Python threshold check per box"""
+    detections = []
+    boxes = result.boxes
+    if boxes is not None:
+        for box in boxes:
+            x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
+            conf = box.conf[0].cpu().numpy()
+            cls = int(box.cls[0].cpu().numpy())
+            class_name = names[cls]
+
+            if conf > threshold:
+                detections.append({
+                    'class': class_name,
+                    'confidence': float(conf),
+                    'bbox': [float(x1), float(y1), float(x2), float(y2)]
+                })
+    return detections
+
+
+def make_result(count, names, rng):
+    import torch
+    from ultralytics.engine.results import Results
+
+    xy = rng.random((count, 2)) * 600
+    wh = rng.random((count, 2)) * 40 + 1
+    conf = rng.random((count, 1))
+    cls = rng.integers(0, len(names), (count, 1))
+    data = np.hstack([xy, xy + wh, conf, cls]).astype(np.float32)
+    image = np.zeros((640, 640, 3), dtype=np.uint8)
+    return Results(image, path='synthetic.jpg', names=names, boxes=torch.from_numpy(data))
+
+
+def best_of(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--boxes', default='10,100,300,1000')
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    names = {i: f'class_{i}' for i in range(80)}
+    table = class_lookup(names)
+    rng = np.random.default_rng(0)
+
+    print(f"{'boxes':>6} {'per-box ms':>11} {'vectorized ms':>14} {'speedup':>8}")
+    for count in (int(v) for v in args.boxes.split(',')):
+        result = make_result(count, names, rng)
+        assert per_box_detections(result, names) == result_to_detections(result, table)
+        old = best_of(lambda: per_box_detections(result, names), args.repeats)
+        new = best_of(lambda: result_to_detections(result, table), args.repeats)
+        print(f"{count:>6} {old * 1000:>11.2f} {new * 1000:>14.3f} {old / new:>7.0f}x")
+
+
+if __name__ == '__main__':
+    main()
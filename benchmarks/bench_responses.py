@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Bytes on the wire and encode time of /upload responses.
+
+Builds /upload responses from a real camera JPEG (extract_metadata output,
+float32 detections as YOLO returns them, a typical analysis text) in three
+shapes: the legacy one with the base64 image echoed, the default one that
+references /images/<id>, and ?compact=1. Each is serialized with Flask's
+standard-library provider and with the app's orjson provider, then sent
+uncompressed, gzipped and brotli-compressed as ResponseCompressor does.
+
+The mobile columns add the transfer time on typical cellular downlinks to
+the server-side serialize + compress time.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('DETECTION_BACKEND', 'none')
+os.environ.setdefault('MODEL_LOAD_MODE', 'lazy')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+import numpy as np
+from flask.json.provider import DefaultJSONProvider
+
+import app
+from benchmarks.bench_metadata import make_photo
+from medibot.compression import ENCODINGS, ResponseCompressor
+from medibot.image import DecodedImage
+
+# Downlink throughput in bits per second
+NETWORKS = {'3G': 1.6e6, '4G': 12e6}
+
+ANALYSIS = '\n\n'.join(
+    f"{section}:\n" + '\n'.join(f"• Observation {i} for {section.lower()}, described in a full sentence." for i in range(6))
+    for section in ('IMAGING MODALITY', 'ANATOMICAL REGION', 'KEY FINDINGS', 'CLINICAL CORRELATION',
+                    'RECOMMENDATIONS', 'MEDICAL DISCLAIMER')
+)
+
+
+def detections(count):
+    rng = np.random.default_rng(0)
+    xy = rng.random((count, 2), dtype=np.float32) * 3000
+    rows = np.hstack([xy, xy + 200, rng.random((count, 1), dtype=np.float32)]).tolist()
+    return [{'class': 'person', 'confidence': row[4], 'bbox': row[:4]} for row in rows]
+
+
+def responses(photo, count):
+    image = DecodedImage(photo)
+    full = {
+        'success': True,
+        'image_id': 'a' * 32,
+        'image_url': '/images/' + 'a' * 32,
+        'session_id': 'b' * 32,
+        'detections': detections(count),
+        'metadata': app.extract_metadata(image),
+        'ai_analysis': ANALYSIS
+    }
+    return {
+        'legacy (image_data)': {**full, 'image_data': image.base64},
+        'default': full,
+        'compact': app.compact_result(full)
+    }
+
+
+def best_ms(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return result, min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', default='4000x3000', help='camera JPEG dimensions')
+    parser.add_argument('--detections', type=int, default=30)
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.split('x'))
+    photo = make_photo(width, height)
+    standard = DefaultJSONProvider(app.app)
+    compressor = ResponseCompressor()
+    encoders = {
+        'json': lambda obj: standard.dumps(obj, separators=(',', ':')).encode(),
+        'fast': app.app.json.encode
+    }
+
+    print(f"{'response':<20} {'encoder':<5} {'encoding':<8} {'bytes':>10} {'serialize ms':>13} "
+          f"{'compress ms':>12} " + ' '.join(f"{name + ' ms':>8}" for name in NETWORKS))
+    for label, response in responses(photo, args.detections).items():
+        for encoder, encode in encoders.items():
+            body, serialize_ms = best_ms(lambda: encode(response), args.repeats)
+            for encoding in ('identity',) + ENCODINGS:
+                if encoding == 'identity':
+                    sent, compress_ms = body, 0.0
+                else:
+                    sent, compress_ms = best_ms(lambda: compressor.compress(body, encoding), args.repeats)
+                mobile = ' '.join(f"{serialize_ms + compress_ms + len(sent) * 8 / bps * 1000:>8.0f}"
+                                  for bps in NETWORKS.values())
+                print(f"{label:<20} {encoder:<5} {encoding:<8} {len(sent):>10} {serialize_ms:>13.2f} "
+                      f"{compress_ms:>12.2f} {mobile}")
+
+
+if __name__ == '__main__':
+    main()
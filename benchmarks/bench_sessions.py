@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Upstream payload and latency per follow-up question: stateless vs sessions.
+
+Uploads one image, then asks --turns follow-up questions about it two ways:
+
+- stateless: every question passes image_id, so the image goes upstream
+  again on every turn and the model never sees the earlier answers
+- session: questions pass the session_id from /upload, so only the new
+  question plus the trimmed history goes upstream
+
+Request sizes are read from the fake OpenRouter server. With sessions they
+should stay flat as the conversation grows, within SESSION_HISTORY_TOKENS.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import requests
+
+from benchmarks.fake_openrouter import start_fake_server
+from benchmarks.load_test import SERVERS, launch
+from benchmarks.suite import synthetic_image, wait_until_ready
+
+# A long-ish answer, so history growth would show if it weren't trimmed
+REPLY = ' '.join(['The finding is consistent with a simulated observation.'] * 40)
+
+
+def ask(base_url, fake, payload):
+    sent = len(fake.request_bytes)
+    started = time.perf_counter()
+    response = requests.post(f"{base_url}/query", json=payload, timeout=60)
+    elapsed = (time.perf_counter() - started) * 1000
+    response.raise_for_status()
+    upstream = fake.request_bytes[sent:]
+    return response.json(), sum(upstream), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server', choices=sorted(SERVERS), default='gunicorn')
+    parser.add_argument('--url', help='benchmark an already running server (must use the fake upstream below)')
+    parser.add_argument('--turns', type=int, default=20)
+    parser.add_argument('--llm-latency', type=float, default=0.2)
+    parser.add_argument('--port', type=int, default=5058)
+    args = parser.parse_args()
+
+    fake = start_fake_server(latency=args.llm_latency, reply=REPLY)
+    env = dict(os.environ, OPENROUTER_BASE_URL=fake.base_url, LOG_LEVEL='WARNING')
+    process = None
+    if args.url:
+        base_url = args.url.rstrip('/')
+    else:
+        process, base_url = launch(args.server, args.port, env)
+
+    try:
+        wait_until_ready(base_url)
+        image = synthetic_image((1920, 1080), 'JPEG', seed=int(time.time()))
+        upload = requests.post(f"{base_url}/upload", files={'file': ('scan.jpg', image, 'image/jpeg')},
+                               timeout=120).json()
+        image_id, session_id = upload['image_id'], upload['session_id']
+
+        print(f"{'turn':>4} {'stateless KB':>13} {'ms':>7} {'session KB':>11} {'ms':>7}")
+        for turn in range(1, args.turns + 1):
+            # Unique questions, so neither path is answered from the query cache
+            question = f'Follow-up question {turn} ({time.time()}): what should be checked next?'
+            _, stateless_bytes, stateless_ms = ask(base_url, fake, {'query': question, 'image_id': image_id})
+            _, session_bytes, session_ms = ask(base_url, fake, {'query': question, 'session_id': session_id})
+            print(f"{turn:>4} {stateless_bytes / 1024:>13.1f} {stateless_ms:>7.0f} "
+                  f"{session_bytes / 1024:>11.1f} {session_ms:>7.0f}")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Detections and latency of full-image vs tiled detection on large images.
+
+Runs the configured YOLO backend over each image twice: the usual single
+pass at model resolution, and TiledDetection (the full pass plus overlapping
+tiles, with empty tiles skipped and the boxes merged by NMS). Both go through
+a BatchScheduler as in the app. Reports detections found, tiles run/skipped
+and milliseconds per image.
+
+Uses --images DIR (your own high-resolution scans) or synthetic X-ray-like
+images with small copies of a street photo pasted in, whose people the full
+pass misses once the image is downscaled to 640px.
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+from PIL import Image
+
+from benchmarks.suite import synthetic_image
+from medibot.batching import BatchScheduler
+from medibot.detection import load_detector, result_to_detections
+from medibot.tiling import TiledDetection
+
+
+def synthetic_scans(sizes, findings, finding_edge):
+    """Synthetic scans with ``findings`` small copies of ultralytics' bus.jpg
+    (people and a bus, which the COCO weights know) pasted in"""
+    from ultralytics.utils import ASSETS
+
+    sample = Image.open(ASSETS / 'bus.jpg').convert('RGB')
+    scale = finding_edge / max(sample.size)
+    sample = sample.resize((round(sample.width * scale), round(sample.height * scale)), Image.LANCZOS)
+    rng = np.random.default_rng(0)
+    for seed, (width, height) in enumerate(sizes):
+        image = Image.open(io.BytesIO(synthetic_image((width, height), 'PNG', seed))).convert('RGB')
+        for _ in range(findings):
+            x = int(rng.integers(0, width - sample.width))
+            y = int(rng.integers(0, height - sample.height))
+            image.paste(sample, (x, y))
+        yield f'synthetic {width}x{height}', image
+
+
+def directory_images(directory):
+    for filename in sorted(os.listdir(directory)):
+        try:
+            yield filename, Image.open(os.path.join(directory, filename)).convert('RGB')
+        except OSError:
+            continue
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', help='directory of images (default: synthetic scans)')
+    parser.add_argument('--sizes', default='2048x2048,4000x3000,6000x4000')
+    parser.add_argument('--findings', type=int, default=8)
+    parser.add_argument('--finding-edge', type=int, default=240, help='long edge of each pasted photo, px')
+    parser.add_argument('--backend', default=os.environ.get('DETECTION_BACKEND', 'torch'))
+    parser.add_argument('--weights', default=os.path.join(ROOT, 'yolov8n.pt'))
+    parser.add_argument('--max-tiles', type=int, default=12)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    detector = load_detector(args.weights, args.backend)
+    # As in the app: one forward pass fits the full image and all its tiles
+    scheduler = BatchScheduler(detector.predict, window_ms=10, max_batch=args.max_tiles + 1)
+    tiling = TiledDetection(max_tiles=args.max_tiles)
+    detector.predict([np.zeros((640, 640, 3), dtype=np.uint8)])
+
+    if args.images:
+        images = directory_images(args.images)
+    else:
+        sizes = [tuple(int(v) for v in size.split('x')) for size in args.sizes.split(',')]
+        images = synthetic_scans(sizes, args.findings, args.finding_edge)
+
+    print(f"{'image':<26} {'full dets':>9} {'ms':>7} {'tiled dets':>10} {'tiles':>6} {'skipped':>7} {'ms':>7}")
+    for label, image in images:
+        timings = {'full': [], 'tiled': []}
+        for _ in range(args.repeats):
+            started = time.perf_counter()
+            full = result_to_detections(scheduler(image), detector.names)
+            timings['full'].append(time.perf_counter() - started)
+
+            before = tiling.stats()
+            started = time.perf_counter()
+            tiled = tiling.detect(image, scheduler.submit, detector.names)
+            timings['tiled'].append(time.perf_counter() - started)
+            after = tiling.stats()
+        tiles = after['tiles'] - before['tiles']
+        skipped = after['skipped_tiles'] - before['skipped_tiles']
+        print(f"{label:<26} {len(full):>9} {min(timings['full']) * 1000:>7.0f} {len(tiled):>10} "
+              f"{tiles:>6} {skipped:>7} {min(timings['tiled']) * 1000:>7.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""Check that every detection backend returns the same detection dicts as torch.
+
+Runs the sample images shipped with ultralytics (or --images) through each
+backend and matches detections by class and IoU. Needs ultralytics plus the
+optional onnxruntime / openvino packages for the backends being checked.
+"""
+
+import argparse
+import glob
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+from PIL import Image
+
+from medibot.detection import load_detector, result_to_detections
+
+# INT8 weights move scores and boxes a little more than a float export
+TOLERANCES = {
+    'onnx': {'iou': 0.95, 'confidence': 0.02},
+    'onnx-int8': {'iou': 0.85, 'confidence': 0.1},
+    'openvino': {'iou': 0.95, 'confidence': 0.02},
+}
+
+
+def iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union else 0.0
+
+
+def compare(reference, candidate, tolerance):
+    """Return a list of mismatch descriptions (empty when the outputs agree)"""
+    problems = []
+    unmatched = list(candidate)
+    for ref in reference:
+        match = max((d for d in unmatched if d['class'] == ref['class']),
+                    key=lambda d: iou(d['bbox'], ref['bbox']), default=None)
+        if match is None or iou(match['bbox'], ref['bbox']) < tolerance['iou']:
+            # Borderline scores may legitimately fall on either side of the threshold
+            if ref['confidence'] > 0.5 + tolerance['confidence']:
+                problems.append(f"missing {ref['class']} ({ref['confidence']:.2f})")
+            continue
+        unmatched.remove(match)
+        if abs(match['confidence'] - ref['confidence']) > tolerance['confidence']:
+            problems.append(f"{ref['class']} confidence {ref['confidence']:.3f} vs {match['confidence']:.3f}")
+    for extra in unmatched:
+        if extra['confidence'] > 0.5 + tolerance['confidence']:
+            problems.append(f"extra {extra['class']} ({extra['confidence']:.2f})")
+    return problems
+
+
+def default_images():
+    try:
+        import ultralytics
+        return sorted(glob.glob(os.path.join(os.path.dirname(ultralytics.__file__), 'assets', '*.jpg')))
+    except ImportError:
+        return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--weights', default=os.path.join(ROOT, 'yolov8n.pt'))
+    parser.add_argument('--backends', default='onnx,onnx-int8,openvino')
+    parser.add_argument('--images', nargs='*')
+    args = parser.parse_args()
+
+    paths = args.images or default_images()
+    if not paths:
+        print('❌ No images to check (pass --images)')
+        return False
+    images = [np.ascontiguousarray(np.asarray(Image.open(p).convert('RGB'))[:, :, ::-1]) for p in paths]
+
+    reference = load_detector(args.weights, 'torch')
+    expected = [result_to_detections(r, reference.names) for r in reference.predict(images)]
+
+    ok = True
+    for backend in args.backends.split(','):
+        try:
+            detector = load_detector(args.weights, backend)
+        except Exception as e:
+            print(f"⚠️  {backend}: skipped ({e})")
+            continue
+        results = detector.predict(images)
+        for path, ref, result in zip(paths, expected, results):
+            problems = compare(ref, result_to_detections(result, detector.names), TOLERANCES[backend])
+            label = f"{backend} {os.path.basename(path)}: {len(ref)} detections"
+            print(f"{'❌' if problems else '✅'} {label}" + (f" - {'; '.join(problems)}" if problems else ''))
+            ok = ok and not problems
+    return ok
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
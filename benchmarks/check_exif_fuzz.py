@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""Check the header/EXIF parser against PIL and fuzz it with malformed files.
+
+1. Parity: format, mode, size and the reported EXIF tags of generated JPEGs
+   and PNGs match what PIL reads.
+2. Fuzz: byte flips, truncations and corrupted IFD offsets/counts of a camera
+   JPEG, plus random EXIF blocks. read_header/read_exif must never raise,
+   values must have the documented types and be JSON-serializable, and
+   DecodedImage.header may only raise the OSError/ValueError that
+   extract_metadata handles.
+
+Exits non-zero on the first failure.
+"""
+
+import argparse
+import io
+import json
+import math
+import os
+import random
+import struct
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import Image
+
+from benchmarks.bench_metadata import camera_exif, make_photo
+from medibot.exif import EXIF_TAGS, GPS_TAGS, IFD0_TAGS, read_exif, read_header
+from medibot.image import DecodedImage
+
+KINDS = {name: kind for tags in (IFD0_TAGS, EXIF_TAGS, GPS_TAGS) for name, kind in tags.values()}
+
+
+def samples():
+    """(label, bytes) covering the JPEG/PNG variants the parser handles"""
+    rng = np.random.default_rng(1)
+    rgb = Image.fromarray(rng.integers(0, 255, (120, 160, 3), dtype=np.uint8))
+
+    def save(image, fmt, **options):
+        buffer = io.BytesIO()
+        image.save(buffer, fmt, **options)
+        return buffer.getvalue()
+
+    yield 'jpeg camera exif', make_photo(320, 240)
+    yield 'jpeg no exif', make_photo(320, 240, exif=False)
+    yield 'jpeg progressive', save(rgb, 'JPEG', progressive=True, exif=camera_exif())
+    yield 'jpeg grayscale', save(rgb.convert('L'), 'JPEG')
+    yield 'jpeg cmyk', save(rgb.convert('CMYK'), 'JPEG')
+    yield 'png rgb', save(rgb, 'PNG')
+    yield 'png rgba exif', save(rgb.convert('RGBA'), 'PNG', exif=camera_exif())
+    yield 'png palette', save(rgb.convert('P'), 'PNG')
+    yield 'png 1-bit', save(rgb.convert('1'), 'PNG')
+    yield 'png 16-bit gray', save(rgb.convert('I;16'), 'PNG')
+    yield 'png gray alpha', save(rgb.convert('LA'), 'PNG')
+
+
+def pil_exif(image):
+    """PIL's EXIF in the parser's representation, reported tags only"""
+    raw = image._getexif() or {}
+    names = {tag: name for tag, (name, _) in {**IFD0_TAGS, **EXIF_TAGS}.items()}
+    gps_names = {tag: name for tag, (name, _) in GPS_TAGS.items()}
+
+    def plain(value):
+        if isinstance(value, tuple):
+            return tuple(plain(v) for v in value)
+        if isinstance(value, bytes) and len(value) == 1:
+            return value[0]
+        return float(value) if hasattr(value, 'denominator') and not isinstance(value, int) else value
+
+    exif = {names[tag]: plain(value) for tag, value in raw.items() if tag in names}
+    gps = {gps_names[tag]: plain(value) for tag, value in raw.get(0x8825, {}).items() if tag in gps_names}
+    if gps:
+        exif['GPSInfo'] = gps
+    return exif
+
+
+def check_parity():
+    for label, data in samples():
+        header = read_header(data)
+        image = Image.open(io.BytesIO(data))
+        assert header is not None, f'{label}: parser fell back to PIL'
+        expected = (image.format, image.mode, image.size)
+        assert header[:3] == expected, f'{label}: {header[:3]} != {expected}'
+        reference = pil_exif(image)
+        assert (header.exif or {}) == reference, f'{label}: {header.exif} != {reference}'
+        print(f'parity ok  {label:<18} {header.format} {header.mode} {header.size[0]}x{header.size[1]} '
+              f'{len(header.exif or {})} tags')
+
+
+def check_types(exif):
+    if exif is None:
+        return
+    assert isinstance(exif, dict)
+    for name, value in exif.items():
+        if name == 'GPSInfo':
+            check_types(value)
+            continue
+        kind = KINDS[name]
+        if kind == 'text':
+            assert isinstance(value, str), (name, value)
+        elif kind == 'number':
+            assert isinstance(value, (int, float)) and math.isfinite(value), (name, value)
+        else:
+            assert isinstance(value, tuple) and len(value) == 3, (name, value)
+            assert all(isinstance(v, (int, float)) and math.isfinite(v) for v in value), (name, value)
+    json.dumps(exif, allow_nan=False)
+
+
+def mutate(data, rng):
+    data = bytearray(data)
+    # Most of the interesting structure (markers, EXIF IFDs) is near the start
+    hot = min(len(data), 4096)
+    choice = rng.randrange(5)
+    if choice == 0:
+        for _ in range(rng.randint(1, 16)):
+            data[rng.randrange(hot)] = rng.randrange(256)
+    elif choice == 1:
+        del data[rng.randrange(2, hot):]
+    elif choice == 2:
+        # Overwrite a 4-byte field with an extreme offset/count
+        position = rng.randrange(hot - 4)
+        data[position:position + 4] = struct.pack('<L', rng.choice([0, 1, 8, 0xFFFF, 0x7FFFFFFF, 0xFFFFFFFF]))
+    elif choice == 3:
+        # Segment length fields that are too short or run past the end
+        position = rng.randrange(2, hot - 2)
+        data[position:position + 2] = struct.pack('>H', rng.choice([0, 1, 2, 0xFFFF]))
+    else:
+        position = rng.randrange(hot)
+        data[position:position] = bytes(rng.randrange(256) for _ in range(rng.randint(1, 64)))
+    return bytes(data)
+
+
+def check_fuzz(iterations, seed):
+    rng = random.Random(seed)
+    originals = [data for _, data in samples()]
+    fallbacks = 0
+    for index in range(iterations):
+        data = mutate(rng.choice(originals), rng)
+        header = read_header(data)
+        if header is not None:
+            check_types(header.exif)
+            width, height = header.size
+            assert width > 0 and height > 0
+        else:
+            fallbacks += 1
+        try:
+            DecodedImage(data).header
+        except (OSError, ValueError):
+            pass
+        # Arbitrary EXIF blocks, with and without a valid TIFF preamble
+        block = bytes(rng.randrange(256) for _ in range(rng.randint(0, 512)))
+        check_types(read_exif(block))
+        check_types(read_exif(rng.choice([b'II*\x00', b'MM\x00*']) + block))
+        if (index + 1) % 1000 == 0:
+            print(f'fuzz ok    {index + 1} files ({fallbacks} fell back to PIL)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    check_parity()
+    check_fuzz(args.iterations, args.seed)
+    print('all checks passed')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Exercise the pooled OpenRouter client against the local fake server."""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from benchmarks.fake_openrouter import start_fake_server
+from medibot.openrouter import CircuitBreaker, CircuitOpenError, OpenRouterClient, iter_stream_deltas
+
+PAYLOAD = {'model': 'fake', 'messages': [{'role': 'user', 'content': 'hi'}]}
+
+
+def check(label, ok):
+    print(f"{'✅' if ok else '❌'} {label}")
+    return ok
+
+
+def main():
+    results = []
+
+    # Connection reuse: many calls, one TCP connection
+    server = start_fake_server()
+    client = OpenRouterClient(base_url=server.base_url, backoff=0.01)
+    for _ in range(20):
+        client.post('chat/completions', json=PAYLOAD).json()
+    stats = client.stats()
+    print(f"   {stats}")
+    results.append(check('20 calls share one keep-alive connection', server.connections == 1))
+
+    # Jittered retry on 429/5xx
+    server = start_fake_server(fail_status=503, fail_count=2)
+    client = OpenRouterClient(base_url=server.base_url, max_retries=2, backoff=0.01)
+    response = client.post('chat/completions', json=PAYLOAD)
+    results.append(check('retries 503 until success', response.status_code == 200 and client.stats()['retries'] == 2))
+
+    # Circuit breaker fails fast while the upstream is down
+    server = start_fake_server(fail_status=502, fail_count=-1)
+    client = OpenRouterClient(base_url=server.base_url, max_retries=0, backoff=0.01,
+                              breaker=CircuitBreaker(failure_threshold=3, reset_timeout=0.2))
+    for _ in range(3):
+        client.post('chat/completions', json=PAYLOAD)
+    seen = server.requests
+    started = time.perf_counter()
+    try:
+        client.post('chat/completions', json=PAYLOAD)
+        short_circuited = False
+    except CircuitOpenError:
+        short_circuited = True
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    results.append(check(f'open breaker fails fast ({elapsed_ms:.2f} ms, no upstream call)',
+                         short_circuited and server.requests == seen))
+
+    # Half-open probe closes the breaker once the upstream recovers
+    server.fail_count = 0
+    time.sleep(0.25)
+    response = client.post('chat/completions', json=PAYLOAD)
+    results.append(check('half-open probe recovers', response.status_code == 200 and client.breaker.state == 'closed'))
+
+    # A probe that fails with something other than a connection error
+    # (here a truncated chunked body) must still reopen the breaker, not wedge it
+    client = OpenRouterClient(base_url=server.base_url, max_retries=0, backoff=0.01,
+                              breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.05))
+    server.fail_count = -1
+    client.post('chat/completions', json=PAYLOAD)
+    time.sleep(0.1)
+    post = client.session.post
+
+    def truncated(*args, **kwargs):
+        raise requests.exceptions.ChunkedEncodingError('connection broken mid-body')
+    client.session.post = truncated
+    try:
+        client.post('chat/completions', json=PAYLOAD)
+    except requests.exceptions.ChunkedEncodingError:
+        pass
+    client.session.post = post
+    server.fail_count = 0
+    time.sleep(0.1)
+    response = client.post('chat/completions', json=PAYLOAD)
+    results.append(check('failed probe of any kind reopens the breaker, next probe recovers',
+                         response.status_code == 200 and client.breaker.state == 'closed'))
+
+    # Streamed responses hold their concurrency slot until closed
+    client = OpenRouterClient(base_url=server.base_url, max_concurrency=1)
+    streamed = client.post('chat/completions', json=dict(PAYLOAD, stream=True), stream=True)
+    waiter = threading.Thread(target=client.post, args=('chat/completions',), kwargs={'json': PAYLOAD})
+    waiter.start()
+    waiter.join(0.3)
+    blocked = waiter.is_alive()
+    list(iter_stream_deltas(streamed))
+    waiter.join(5)
+    results.append(check('stream holds its slot until the body is read', blocked and not waiter.is_alive()))
+
+    # Dead upstream: connection errors are retried then reported
+    client = OpenRouterClient(base_url='http://127.0.0.1:9/api/v1', max_retries=1, backoff=0.01)
+    try:
+        client.post('chat/completions', json=PAYLOAD)
+        refused = False
+    except requests.exceptions.ConnectionError:
+        refused = True
+    results.append(check('connection errors raise after retries', refused))
+
+    print(f"\n{sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
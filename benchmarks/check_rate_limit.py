@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Check per-client rate limits and admission control under a burst.
+
+Starts the backend (one worker, PROXY_FIX_HOPS=1 so X-Forwarded-For tells
+clients apart) against the fake OpenRouter server and runs two scenarios:
+
+- rate limit: one client sends --burst uploads and queries back to back; the
+  ones past its burst must get 429 with Retry-After, while a second client
+  and the first client's queries keep their own budgets
+- admission: --concurrency clients send one unique query each at once with
+  MAX_LLM_CALLS=--llm-slots; as many again may queue for a slot, the excess
+  must get 503 with Retry-After straight away, and the admitted ones must not
+  wait behind them
+
+Fails if any expectation is not met.
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import requests
+
+from benchmarks.fake_openrouter import start_fake_server
+from benchmarks.load_test import SERVERS, launch, percentile
+from benchmarks.suite import synthetic_image, wait_until_ready
+
+
+def as_client(client):
+    return {'X-Forwarded-For': f'203.0.113.{client}'}
+
+
+def upload(base_url, client, image):
+    return requests.post(f"{base_url}/upload", files={'file': ('scan.jpg', image, 'image/jpeg')},
+                         headers=as_client(client), timeout=120)
+
+
+def query(base_url, client, question):
+    started = time.perf_counter()
+    response = requests.post(f"{base_url}/query", json={'query': question}, headers=as_client(client), timeout=120)
+    return response, (time.perf_counter() - started) * 1000
+
+
+def check(failures, ok, message):
+    print(f"{'ok  ' if ok else 'FAIL'} {message}")
+    if not ok:
+        failures.append(message)
+
+
+def rate_limit_scenario(base_url, args, failures):
+    image = synthetic_image((640, 480), 'JPEG', seed=1)
+    statuses = [upload(base_url, 1, image) for _ in range(args.burst)]
+    limited = [r for r in statuses if r.status_code == 429]
+    check(failures, all(r.status_code == 200 for r in statuses[:args.upload_burst]),
+          f"first {args.upload_burst} uploads from client 1 accepted")
+    check(failures, len(limited) == args.burst - args.upload_burst,
+          f"{len(limited)}/{args.burst - args.upload_burst} uploads past the burst got 429")
+    check(failures, all(r.headers.get('Retry-After', '').isdigit() and int(r.headers['Retry-After']) >= 1
+                        for r in limited), "429 responses carry Retry-After")
+    check(failures, upload(base_url, 2, image).status_code == 200, "client 2 can still upload")
+    response, _ = query(base_url, 1, f'Is client 1 still allowed to ask ({time.time()})?')
+    check(failures, response.status_code == 200, "client 1 can still query")
+
+
+def admission_scenario(base_url, args, failures):
+    questions = [(100 + i, f'Concurrent question {i} ({time.time()})') for i in range(args.concurrency)]
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        results = list(pool.map(lambda item: query(base_url, *item), questions))
+    admitted = [ms for response, ms in results if response.status_code == 200]
+    shed = [(response, ms) for response, ms in results if response.status_code == 503]
+    print(f"     {len(admitted)} admitted (p95 {percentile(admitted, 95):.0f}ms), "
+          f"{len(shed)} shed (p95 {percentile([ms for _, ms in shed], 95):.0f}ms)")
+    check(failures, len(admitted) + len(shed) == len(results), "every query was answered or shed")
+    check(failures, len(admitted) >= args.llm_slots, f"at least {args.llm_slots} queries admitted")
+    check(failures, len(shed) >= args.concurrency - 2 * args.llm_slots, "the excess queries were shed")
+    check(failures, all(r.headers.get('Retry-After', '').isdigit() for r, _ in shed), "503 responses carry Retry-After")
+    check(failures, all(ms < args.llm_latency * 1000 for _, ms in shed), "shed queries were answered without waiting")
+    # The queued ones wait for one LLM call to finish before making their own
+    check(failures, not admitted or percentile(admitted, 95) < args.llm_latency * 1000 * 3,
+          "admitted queries did not queue behind the excess")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server', choices=sorted(SERVERS), default='gunicorn')
+    parser.add_argument('--burst', type=int, default=10, help='back-to-back uploads from one client')
+    parser.add_argument('--upload-burst', type=int, default=3)
+    parser.add_argument('--concurrency', type=int, default=24)
+    parser.add_argument('--llm-slots', type=int, default=4)
+    parser.add_argument('--llm-latency', type=float, default=1.0)
+    parser.add_argument('--backend', choices=('memory', 'sqlite'), default='memory')
+    parser.add_argument('--port', type=int, default=5059)
+    args = parser.parse_args()
+
+    fake = start_fake_server(latency=args.llm_latency, token_delay=0.0)
+    env = dict(os.environ, OPENROUTER_BASE_URL=fake.base_url, LOG_LEVEL='WARNING', WEB_CONCURRENCY='1',
+               GUNICORN_THREADS=str(args.concurrency + 4), PROXY_FIX_HOPS='1', RATE_LIMIT_BACKEND=args.backend,
+               RATE_LIMIT_UPLOADS_PER_MIN='1', RATE_LIMIT_UPLOAD_BURST=str(args.upload_burst),
+               RATE_LIMIT_QUERIES_PER_MIN='60', RATE_LIMIT_QUERY_BURST='10',
+               MAX_DETECTION_CALLS='8', MAX_LLM_CALLS=str(args.llm_slots))
+
+    failures = []
+    process, base_url = launch(args.server, args.port, env)
+    try:
+        wait_until_ready(base_url)
+        print(f"rate limit ({args.backend} buckets)")
+        rate_limit_scenario(base_url, args, failures)
+        print("admission")
+        admission_scenario(base_url, args, failures)
+        stats = requests.get(f"{base_url}/test", timeout=10).json()
+        print(f"\nrate_limits: {stats['rate_limits']}\nadmission: {stats['admission']}")
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    if failures:
+        sys.exit(f"FAIL: {len(failures)} checks failed")
+    print('\nall checks passed')
+
+
+if __name__ == '__main__':
+    main()
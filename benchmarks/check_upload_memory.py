@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Check that server RSS stays bounded under concurrent maximum-size uploads.
+
+Starts the backend once with the upload memory budget disabled and once with
+it enabled, fires --concurrency simultaneous /upload requests of a ~15MB
+JPEG (just under the 16MB cap) at each, and reports the peak RSS above idle.
+Each upload is made unique so the result cache doesn't short-circuit it.
+
+Fails unless, with the budget on, every upload succeeds and the peak growth
+stays within the budget plus --slack-mb (allocator and thread overhead).
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.bench_metadata import make_photo
+from benchmarks.fake_openrouter import start_fake_server
+from benchmarks.load_test import SERVERS, launch, run_requests
+from benchmarks.suite import RSSMonitor, process_tree_rss, wait_until_ready
+
+
+def upload_sender(data):
+    def send(session, base, index):
+        body = data + f'\0{time.time()}-{index}'.encode()
+        response = session.post(f"{base}/upload", files={'file': ('scan.jpg', body, 'image/jpeg')}, timeout=300)
+        return response.status_code == 200 and response.json().get('success', False)
+    return send
+
+
+def measure(server, port, env, data, concurrency):
+    process, base_url = launch(server, port, env)
+    try:
+        wait_until_ready(base_url)
+        # One upload first so lazily created pools and buffers count as idle
+        run_requests(base_url, upload_sender(data), 1, 1)
+        time.sleep(1)
+        idle = process_tree_rss(process.pid)
+        with RSSMonitor(process.pid, interval=0.05) as rss:
+            result = run_requests(base_url, upload_sender(data), concurrency, concurrency)
+        result['idle_mb'] = round(idle / 1024 / 1024, 1)
+        result['peak_mb'] = round(rss.peak / 1024 / 1024, 1)
+        result['growth_mb'] = round((rss.peak - idle) / 1024 / 1024, 1)
+        return result
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server', choices=sorted(SERVERS), default='gunicorn')
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--size', default='4600x3400', help='JPEG dimensions (noise, about 15MB at 4600x3400)')
+    parser.add_argument('--budget-mb', type=int, default=256)
+    parser.add_argument('--slack-mb', type=int, default=128)
+    parser.add_argument('--port', type=int, default=5057)
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.split('x'))
+    data = make_photo(width, height)
+    print(f"upload: {args.size} JPEG, {len(data) / 1024 / 1024:.1f}MB, {args.concurrency} at once")
+
+    fake = start_fake_server(latency=0.5, token_delay=0.01)
+    # One worker process, with enough threads to take every upload at once;
+    # the image store's in-memory tier is left out of the measurement. glibc
+    # otherwise keeps freed pixel buffers in per-thread arenas (see render.yaml).
+    env = dict(os.environ, OPENROUTER_BASE_URL=fake.base_url, LOG_LEVEL='WARNING', WEB_CONCURRENCY='1',
+               MALLOC_ARENA_MAX=os.environ.get('MALLOC_ARENA_MAX', '2'),
+               GUNICORN_THREADS=str(max(16, args.concurrency + 4)), UPLOAD_QUEUE_TIMEOUT='300',
+               IMAGE_STORE_MEMORY_MB='0')
+
+    results = {}
+    for label, budget in (('no budget', 0), (f'budget {args.budget_mb}MB', args.budget_mb)):
+        results[label] = measure(args.server, args.port, dict(env, UPLOAD_MEMORY_BUDGET_MB=str(budget)),
+                                 data, args.concurrency)
+    print(f"\n{'':<14} {'idle MB':>8} {'peak MB':>8} {'growth MB':>10} {'p95 ms':>8} {'errors':>6}")
+    for label, result in results.items():
+        print(f"{label:<14} {result['idle_mb']:>8} {result['peak_mb']:>8} {result['growth_mb']:>10} "
+              f"{result['p95_ms']:>8} {result['errors']:>6}")
+
+    bounded = results[f'budget {args.budget_mb}MB']
+    if bounded['errors']:
+        sys.exit(f"FAIL: {bounded['errors']} uploads failed with the budget on")
+    if bounded['growth_mb'] > args.budget_mb + args.slack_mb:
+        sys.exit(f"FAIL: RSS grew {bounded['growth_mb']}MB, over {args.budget_mb}MB budget + {args.slack_mb}MB slack")
+    print('\nRSS stayed within the budget')
+
+
+if __name__ == '__main__':
+    main()
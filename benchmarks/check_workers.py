@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Check that uploads can be used from every gunicorn worker process.
+
+Starts the backend with --workers worker processes against the fake
+OpenRouter server, uploads --images unique images, then refers to each one
+--tries times over fresh connections, so the requests land on different
+workers:
+
+- GET /images/<image_id> must return the image bytes
+- /query with the upload's image_id must be answered, not 404
+- /query with the upload's session_id must be answered, not 404
+
+Fails if any of them is answered by a worker that can't see the upload.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import requests
+
+from benchmarks.fake_openrouter import start_fake_server
+from benchmarks.load_test import launch
+from benchmarks.suite import synthetic_image, wait_until_ready
+
+
+def check(failures, ok, message):
+    print(f"{'ok  ' if ok else 'FAIL'} {message}")
+    if not ok:
+        failures.append(message)
+
+
+def ask(base_url, **fields):
+    # Unique questions so the query cache doesn't answer for the worker
+    question = f'What is shown here ({time.time()})?'
+    return requests.post(f"{base_url}/query", json={'query': question, **fields}, timeout=120)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--images', type=int, default=4)
+    parser.add_argument('--tries', type=int, default=12)
+    parser.add_argument('--port', type=int, default=5061)
+    args = parser.parse_args()
+
+    fake = start_fake_server(latency=0.05, token_delay=0.0)
+    # No in-memory tier, so every read must come from the shared store
+    env = dict(os.environ, OPENROUTER_BASE_URL=fake.base_url, LOG_LEVEL='WARNING',
+               WEB_CONCURRENCY=str(args.workers), IMAGE_STORE_MEMORY_MB='0')
+
+    failures = []
+    process, base_url = launch('gunicorn', args.port, env)
+    try:
+        wait_until_ready(base_url)
+        uploads = []
+        for index in range(args.images):
+            image = synthetic_image((640, 480), 'JPEG', seed=100 + index)
+            response = requests.post(f"{base_url}/upload", files={'file': ('scan.jpg', image, 'image/jpeg')},
+                                     timeout=120).json()
+            uploads.append((image, response['image_id'], response['session_id']))
+
+        total = args.images * args.tries
+        images = sum(requests.get(f"{base_url}/images/{image_id}", timeout=30).content == image
+                     for image, image_id, _ in uploads for _ in range(args.tries))
+        check(failures, images == total, f"{images}/{total} image fetches returned the upload")
+        by_id = sum(ask(base_url, image_id=image_id).status_code == 200
+                    for _, image_id, _ in uploads for _ in range(args.tries))
+        check(failures, by_id == total, f"{by_id}/{total} queries by image_id answered")
+        by_session = sum(ask(base_url, session_id=session_id).status_code == 200
+                         for _, _, session_id in uploads for _ in range(args.tries))
+        check(failures, by_session == total, f"{by_session}/{total} queries by session_id answered")
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    if failures:
+        sys.exit(f"FAIL: {len(failures)} checks failed")
+    print('\nall checks passed')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""Local stand-in for the OpenRouter chat-completions API.
+
+Point the backend at it with OPENROUTER_BASE_URL=http://127.0.0.1:<port>/api/v1
+"""
+
+import argparse
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = ("IMAGING MODALITY:\n• Simulated response from the fake OpenRouter server\n\n"
+                 "MEDICAL DISCLAIMER:\n• This is an AI-assisted analysis for educational purposes")
+
+
+class FakeOpenRouter(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, token_delay=0.0, reply=DEFAULT_REPLY, fail_status=None, fail_count=0):
+        super().__init__(address, FakeOpenRouterHandler)
+        self.latency = latency
+        self.token_delay = token_delay
+        self.reply = reply
+        self.fail_status = fail_status
+        self.fail_count = fail_count
+        self.requests = 0
+        self.connections = 0
+        self.request_bytes = []
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/api/v1"
+
+    def next_failure(self):
+        """Return a status code to fail with, or None to answer normally"""
+        with self.lock:
+            self.requests += 1
+            if self.fail_status and (self.fail_count < 0 or self.fail_count > 0):
+                if self.fail_count > 0:
+                    self.fail_count -= 1
+                return self.fail_status
+        return None
+
+
+class FakeOpenRouterHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out in separate writes; don't let Nagle delay the body
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_stream(self, request):
+        """Send the reply word by word as OpenRouter-style SSE chunks"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        self._write_chunk(b": OPENROUTER PROCESSING\n\n")
+        words = self.server.reply.split(' ')
+        for i, word in enumerate(words):
+            if self.server.token_delay:
+                time.sleep(self.server.token_delay)
+            text = word if i == len(words) - 1 else word + ' '
+            chunk = {'model': request.get('model', 'fake'), 'choices': [{'index': 0, 'delta': {'content': text}}]}
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        with self.server.lock:
+            self.server.request_bytes.append(length)
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        status = self.server.next_failure()
+        if status:
+            self._send_json(status, {'error': {'message': f'Simulated upstream error {status}'}})
+            return
+
+        if request.get('stream'):
+            self._send_stream(request)
+            return
+
+        self._send_json(200, {
+            'id': 'fake-completion',
+            'model': request.get('model', 'fake'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': self.server.reply}}]
+        })
+
+
+def start_fake_server(port=0, **options):
+    """Start the fake server on a background thread and return it"""
+    server = FakeOpenRouter(('127.0.0.1', port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.5, help='seconds before each reply')
+    parser.add_argument('--token-delay', type=float, default=0.02, help='seconds between streamed tokens')
+    parser.add_argument('--fail-status', type=int, help='answer with this HTTP status instead')
+    parser.add_argument('--fail-count', type=int, default=-1, help='how many requests fail (-1 = all)')
+    args = parser.parse_args()
+
+    server = FakeOpenRouter(('127.0.0.1', args.port), latency=args.latency, token_delay=args.token_delay,
+                            fail_status=args.fail_status, fail_count=args.fail_count)
+    print(f"Fake OpenRouter listening on {server.base_url}")
+    server.serve_forever()
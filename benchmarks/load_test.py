@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""Throughput of the Flask dev server (python app.py) vs gunicorn.
+
+Starts each server in turn against the local fake OpenRouter server and fires
+concurrent /query (or /test, /upload) requests at it. Use --url to load-test a
+server that is already running instead.
+"""
+
+import argparse
+import io
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import requests
+
+from benchmarks.fake_openrouter import start_fake_server
+
+SERVERS = {
+    'dev': [sys.executable, 'app.py'],
+    'gunicorn': [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+}
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def sample_upload():
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (1024, 768), (90, 90, 90)).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+def make_request(endpoint, upload_bytes):
+    if endpoint == 'query':
+        return lambda session, base: session.post(f"{base}/query", json={'query': 'What does a fracture look like?'})
+    if endpoint == 'upload':
+        return lambda session, base: session.post(f"{base}/upload",
+                                                  files={'file': ('scan.jpg', upload_bytes, 'image/jpeg')})
+    return lambda session, base: session.get(f"{base}/test")
+
+
+def run_load(base_url, endpoint, concurrency, total, upload_bytes=None):
+    send = make_request(endpoint, upload_bytes)
+    return run_requests(base_url, lambda session, base, index: send(session, base).status_code == 200,
+                        concurrency, total)
+
+
+def run_requests(base_url, send, concurrency, total):
+    """Call ``send(session, base_url, index) -> ok`` ``total`` times from ``concurrency`` threads"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    issued = [0]
+
+    def worker():
+        session = requests.Session()
+        while True:
+            with lock:
+                if issued[0] >= total:
+                    return
+                index = issued[0]
+                issued[0] += 1
+            started = time.perf_counter()
+            try:
+                ok = send(session, base_url, index)
+            except requests.exceptions.RequestException:
+                ok = False
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors[0] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'throughput_rps': round(len(latencies) / wall, 1),
+        'p50_ms': round(percentile(latencies, 50), 1),
+        'p95_ms': round(percentile(latencies, 95), 1),
+        'p99_ms': round(percentile(latencies, 99), 1),
+        'mean_ms': round(statistics.mean(latencies), 1) if latencies else 0.0
+    }
+
+
+def wait_until_up(base_url, process, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'server exited with code {process.returncode}')
+        try:
+            if requests.get(f"{base_url}/test", timeout=1).status_code == 200:
+                return
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError('server did not come up in time')
+
+
+# Benchmarks send everything from one client as fast as the server allows,
+# so rate limits and admission control are off unless the env sets them
+UNLIMITED = {'RATE_LIMIT_UPLOADS_PER_MIN': '0', 'RATE_LIMIT_QUERIES_PER_MIN': '0',
+             'MAX_DETECTION_CALLS': '0', 'MAX_LLM_CALLS': '0'}
+
+
+def launch(kind, port, env):
+    process = subprocess.Popen(SERVERS[kind], cwd=ROOT, env={**UNLIMITED, **env, 'PORT': str(port)},
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_up(base_url, process)
+    except Exception:
+        process.kill()
+        raise
+    return process, base_url
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--servers', default='dev,gunicorn')
+    parser.add_argument('--url', help='load-test an already running server instead')
+    parser.add_argument('--endpoint', choices=['query', 'test', 'upload'], default='query')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=256)
+    parser.add_argument('--llm-latency', type=float, default=0.5, help='fake upstream latency in seconds')
+    parser.add_argument('--port', type=int, default=5055)
+    args = parser.parse_args()
+
+    upload_bytes = sample_upload() if args.endpoint == 'upload' else None
+
+    if args.url:
+        print(run_load(args.url.rstrip('/'), args.endpoint, args.concurrency, args.requests, upload_bytes))
+        return
+
+    fake = start_fake_server(latency=args.llm_latency)
+    env = dict(os.environ, OPENROUTER_BASE_URL=fake.base_url)
+    for kind in args.servers.split(','):
+        try:
+            process, base_url = launch(kind, args.port, env)
+        except Exception as e:
+            print(f"{kind:>10}: could not start ({e})")
+            continue
+        try:
+            result = run_load(base_url, args.endpoint, args.concurrency, args.requests, upload_bytes)
+            print(f"{kind:>10}: {result}")
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""Reproducible offline benchmark of /query and /upload.
+
+Starts the backend (gunicorn or the dev server) against the fake OpenRouter
+server, replays a corpus of images of different sizes and formats through
+/upload and text questions through /query at several concurrency levels, and
+reports p50/p95/p99 latency, throughput and server RSS per scenario.
+
+Results are written as JSON tagged with the git commit so runs can be
+compared across commits:
+
+    python benchmarks/suite.py --output before.json
+    ... change something ...
+    python benchmarks/suite.py --output after.json --compare before.json
+
+The synthetic corpus is generated from a fixed seed; pass --corpus DIR to
+replay real images instead. Requests are made unique (a nonce after the image
+data / in the question) so the result caches don't hide the work; use
+--cached to measure cache hits instead.
+"""
+
+import argparse
+import datetime
+import io
+import itertools
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import requests
+
+from benchmarks.fake_openrouter import start_fake_server
+from benchmarks.load_test import SERVERS, launch, run_requests
+
+# name: ((width, height), format)
+CORPUS = {
+    'small-jpeg': ((640, 480), 'JPEG'),
+    'medium-jpeg': ((1920, 1080), 'JPEG'),
+    'medium-png': ((1920, 1080), 'PNG'),
+    'medium-bmp': ((1920, 1080), 'BMP'),
+    'large-jpeg': ((4000, 3000), 'JPEG'),
+}
+MIME_TYPES = {'.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.png': 'image/png',
+              '.webp': 'image/webp', '.bmp': 'image/bmp', '.gif': 'image/gif'}
+QUESTIONS = [
+    'What does a distal radius fracture look like on an X-ray?',
+    'How is pneumonia identified on a chest radiograph?',
+    'What are normal findings in a knee MRI?',
+    'What is the difference between CT and MRI?',
+]
+
+# Nonces are unique across scenarios and runs, so no request hits a cache
+RUN_ID = f'{os.getpid()}-{int(time.time())}'
+_nonces = itertools.count()
+
+
+def synthetic_image(size, fmt, seed):
+    """A deterministic X-ray-like image: radial falloff plus film grain"""
+    import numpy as np
+    from PIL import Image
+
+    width, height = size
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    distance = np.hypot((x - width / 2) / width, (y - height / 2) / height)
+    pixels = np.clip(220 - distance * 260 + rng.normal(0, 12, (height, width)), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels, 'L').convert('RGB').save(buffer, fmt, **({'quality': 90} if fmt == 'JPEG' else {}))
+    return buffer.getvalue()
+
+
+def load_corpus(directory=None, names=None):
+    """{name: (bytes, filename, mime_type)} from a directory or the synthetic set"""
+    corpus = {}
+    if directory:
+        for filename in sorted(os.listdir(directory)):
+            extension = os.path.splitext(filename)[1].lower()
+            if extension in MIME_TYPES:
+                with open(os.path.join(directory, filename), 'rb') as f:
+                    corpus[filename] = (f.read(), filename, MIME_TYPES[extension])
+        return corpus
+    for seed, (name, (size, fmt)) in enumerate(CORPUS.items()):
+        if names and name not in names:
+            continue
+        extension = {'JPEG': '.jpg', 'PNG': '.png', 'BMP': '.bmp'}[fmt]
+        corpus[name] = (synthetic_image(size, fmt, seed), f'{name}{extension}', MIME_TYPES[extension])
+    return corpus
+
+
+def process_tree_rss(pid):
+    """Resident memory in bytes of ``pid`` and its children (Linux /proc)"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                parent = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent, []).append(int(entry))
+
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        pending.extend(children.get(current, []))
+        try:
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            pass
+    return total
+
+
+class RSSMonitor:
+    """Samples a process tree's RSS on a background thread"""
+
+    def __init__(self, pid, interval=0.2):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self.last = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.peak = self.last = process_tree_rss(self.pid)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.last = process_tree_rss(self.pid)
+            self.peak = max(self.peak, self.last)
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.last = process_tree_rss(self.pid)
+        self.peak = max(self.peak, self.last)
+
+
+def query_sender(unique, stream):
+    def send(session, base, index):
+        question = QUESTIONS[index % len(QUESTIONS)]
+        if unique:
+            question += f' (request {RUN_ID}-{next(_nonces)})'
+        response = session.post(f"{base}/query" + ('?stream=1' if stream else ''),
+                                json={'query': question}, stream=stream)
+        if stream:
+            for _ in response.iter_content(chunk_size=None):
+                pass
+        return response.status_code == 200
+    return send
+
+
+def upload_sender(item, unique):
+    data, filename, mime_type = item
+
+    def send(session, base, index):
+        # Decoders ignore bytes after the image; the nonce only changes the hash
+        body = data + f'\0{RUN_ID}-{next(_nonces)}'.encode() if unique else data
+        response = session.post(f"{base}/upload", files={'file': (filename, body, mime_type)})
+        return response.status_code == 200 and response.json().get('success', False)
+    return send
+
+
+def wait_until_ready(base_url, timeout=300):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{base_url}/ready", timeout=2).status_code == 200:
+                return
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError('model did not become ready in time')
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'diff', '--quiet', 'HEAD', '--', '*.py'], cwd=ROOT).returncode != 0
+        return commit + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(baseline, results):
+    print(f"\nCompared with {baseline.get('commit')} ({baseline.get('timestamp')}):")
+    print(f"{'scenario':<28} {'p50 ms':>16} {'p95 ms':>16} {'rps':>14} {'rss MB':>14}")
+    for name, result in results.items():
+        old = baseline.get('results', {}).get(name)
+        if old is None:
+            continue
+        cells = []
+        for key in ('p50_ms', 'p95_ms', 'throughput_rps', 'rss_peak_mb'):
+            before, after = old.get(key), result.get(key)
+            change = f"{(after - before) / before * 100:+.0f}%" if before else 'n/a'
+            cells.append(f"{after:>8} ({change:>5})")
+        print(f"{name:<28} " + ' '.join(f"{cell:>16}" for cell in cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server', choices=sorted(SERVERS), default='gunicorn')
+    parser.add_argument('--url', help='benchmark an already running server (RSS is not reported)')
+    parser.add_argument('--scenarios', default='query,query-stream,upload',
+                        help='comma-separated: query, query-stream, upload')
+    parser.add_argument('--concurrency', default='1,8,32')
+    parser.add_argument('--upload-concurrency', default='1,8')
+    parser.add_argument('--requests', type=int, default=64, help='requests per /query scenario')
+    parser.add_argument('--upload-requests', type=int, default=16, help='requests per /upload scenario')
+    parser.add_argument('--corpus', help='directory of images to replay instead of the synthetic set')
+    parser.add_argument('--images', help=f"subset of the synthetic corpus ({', '.join(CORPUS)})")
+    parser.add_argument('--cached', action='store_true', help='repeat identical requests (measures cache hits)')
+    parser.add_argument('--llm-latency', type=float, default=0.5, help='fake upstream latency in seconds')
+    parser.add_argument('--token-delay', type=float, default=0.01, help='fake delay between streamed tokens')
+    parser.add_argument('--port', type=int, default=5056)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--compare', help='JSON from an earlier run to compare against')
+    args = parser.parse_args()
+
+    scenarios = args.scenarios.split(',')
+    corpus = load_corpus(args.corpus, args.images.split(',') if args.images else None) if 'upload' in scenarios else {}
+
+    fake = start_fake_server(latency=args.llm_latency, token_delay=args.token_delay)
+    env = dict(os.environ, OPENROUTER_BASE_URL=fake.base_url, LOG_LEVEL=os.environ.get('LOG_LEVEL', 'WARNING'))
+
+    process = None
+    if args.url:
+        base_url = args.url.rstrip('/')
+    else:
+        process, base_url = launch(args.server, args.port, env)
+
+    plan = []
+    for concurrency in (int(v) for v in args.concurrency.split(',')):
+        if 'query' in scenarios:
+            plan.append((f'query@c{concurrency}', query_sender(not args.cached, False), concurrency, args.requests))
+        if 'query-stream' in scenarios:
+            plan.append((f'query-stream@c{concurrency}', query_sender(not args.cached, True),
+                         concurrency, args.requests))
+    for concurrency in (int(v) for v in args.upload_concurrency.split(',')):
+        for name, item in corpus.items():
+            plan.append((f'upload:{name}@c{concurrency}', upload_sender(item, not args.cached),
+                         concurrency, args.upload_requests))
+
+    results = {}
+    try:
+        if corpus:
+            wait_until_ready(base_url)
+        print(f"{'scenario':<28} {'rps':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6} {'rss MB':>7}")
+        for name, send, concurrency, total in plan:
+            if process is not None:
+                with RSSMonitor(process.pid) as rss:
+                    result = run_requests(base_url, send, concurrency, total)
+                result['rss_peak_mb'] = round(rss.peak / 1024 / 1024, 1)
+                result['rss_end_mb'] = round(rss.last / 1024 / 1024, 1)
+            else:
+                result = run_requests(base_url, send, concurrency, total)
+            results[name] = result
+            print(f"{name:<28} {result['throughput_rps']:>7} {result['p50_ms']:>8} {result['p95_ms']:>8} "
+                  f"{result['p99_ms']:>8} {result['errors']:>6} {result.get('rss_peak_mb', '-'):>7}")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    report = {
+        'commit': git_revision(),
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'config': {
+            'server': 'external' if args.url else args.server,
+            'llm_latency': args.llm_latency,
+            'token_delay': args.token_delay,
+            'cached': args.cached,
+            'corpus': args.corpus or 'synthetic',
+            'cpus': os.cpu_count(),
+            'python': sys.version.split()[0]
+        },
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == '__main__':
+    main()
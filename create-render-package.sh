@@ -7,6 +7,10 @@ mkdir -p render-deploy
 
 # Copy essential files for Render
 cp app.py render-deploy/
+cp -r medibot render-deploy/
+mkdir -p render-deploy/templates
+cp -r templates/prompts render-deploy/templates/
+cp gunicorn.conf.py render-deploy/
 cp requirements.txt render-deploy/
 cp Procfile render-deploy/
 cp render.yaml render-deploy/
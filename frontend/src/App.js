@@ -12,7 +12,9 @@ import './App.css';
 
 function App() {
   const [currentView, setCurrentView] = useState('hero');
-  const [imageData, setImageData] = useState(null);
+  const [imageSrc, setImageSrc] = useState(null);
+  const [imageId, setImageId] = useState(null);
+  const [sessionId, setSessionId] = useState(null);
   const [detections, setDetections] = useState([]);
   const [isLoading, setIsLoading] = useState(false);
   const [showHackerWorkspace, setShowHackerWorkspace] = useState(false);
@@ -66,7 +68,10 @@ function App() {
       const data = await response.json();
       
       if (data.success) {
-        setImageData(data.image_data);
+        // Preview the local file; the server keeps the upload and returns an ID
+        setImageSrc(URL.createObjectURL(file));
+        setImageId(data.image_id);
+        setSessionId(data.session_id || null);
         setDetections(data.detections);
         
         // Store metadata for the Chat component
@@ -96,13 +101,16 @@ function App() {
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({
-          query: query,
-          image_data: imageData
-        })
+        // Follow-ups continue the upload's session, so the image isn't resent
+        body: JSON.stringify(sessionId
+          ? { query: query, session_id: sessionId }
+          : { query: query, image_id: imageId, new_session: true })
       });
       
       const data = await response.json();
+      if (data.session_id) {
+        setSessionId(data.session_id);
+      }
       return data.response || 'No response received';
     } catch (error) {
       console.error('Query error:', error);
@@ -122,7 +130,7 @@ function App() {
             transition={{ duration: 2.5, ease: 'easeInOut' }}
           >
             <Chat 
-              imageData={imageData}
+              imageSrc={imageSrc}
               detections={detections}
               onChatQuery={handleChatQuery}
               onImageUpload={handleImageUpload}
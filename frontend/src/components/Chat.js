@@ -4,7 +4,7 @@ import MedicalSuggestions from './MedicalSuggestions';
 import { useTheme } from '../contexts/ThemeContext';
 import ThemeToggle from './ThemeToggle';
 
-const Chat = ({ imageData, detections, onChatQuery, onImageUpload, isLoading: uploadLoading, onBack }) => {
+const Chat = ({ imageSrc, detections, onChatQuery, onImageUpload, isLoading: uploadLoading, onBack }) => {
   const { colors } = useTheme();
   const [messages, setMessages] = useState([
     {
@@ -125,7 +125,7 @@ MEDICAL DISCLAIMER:
   }, [uploadLoading]);
 
   useEffect(() => {
-    if (imageData && !uploadLoading && window.lastAnalysis) {
+    if (imageSrc && !uploadLoading && window.lastAnalysis) {
       const analysisMessage = {
         id: Date.now(),
         type: 'bot',
@@ -145,7 +145,7 @@ MEDICAL DISCLAIMER:
         return prev;
       });
     }
-  }, [imageData, uploadLoading]);
+  }, [imageSrc, uploadLoading]);
 
   const handleSendMessage = async () => {
     if (!inputValue.trim() || isTyping) return;
@@ -364,10 +364,10 @@ MEDICAL DISCLAIMER:
                   margin: 0
                 }}>{Math.round(analysisProgress)}% complete</p>
               </div>
-            ) : imageData ? (
+            ) : imageSrc ? (
               <div style={{ position: 'relative' }}>
                 <img
-                  src={`data:image/jpeg;base64,${imageData}`}
+                  src={imageSrc}
                   alt="Medical scan"
                   style={{
                     width: '100%',
@@ -484,7 +484,7 @@ MEDICAL DISCLAIMER:
                   justifyContent: 'center',
                   height: '100%'
                 }}>
-                  {imageData ? 'No anatomical structures detected' : 'Upload medical image to see analysis'}
+                  {imageSrc ? 'No anatomical structures detected' : 'Upload medical image to see analysis'}
                 </div>
               ) : (
                 detections.map((detection, index) => (
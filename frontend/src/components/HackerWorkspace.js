@@ -4,7 +4,7 @@ import { motion, AnimatePresence } from 'framer-motion';
 const HackerWorkspace = ({ isVisible, onClose }) => {
   const [showIntro, setShowIntro] = useState(true);
   const [terminalText, setTerminalText] = useState('');
-  const [imageData, setImageData] = useState(null);
+  const [imageSrc, setImageSrc] = useState(null);
   const [metadata, setMetadata] = useState(null);
   const [isAnalyzing, setIsAnalyzing] = useState(false);
 
@@ -68,7 +68,7 @@ const HackerWorkspace = ({ isVisible, onClose }) => {
       const data = await response.json();
       
       if (data.success) {
-        setImageData(data.image_data);
+        setImageSrc(URL.createObjectURL(file));
         setMetadata(data.metadata);
       }
     } catch (error) {
@@ -245,7 +245,7 @@ const HackerWorkspace = ({ isVisible, onClose }) => {
                 {'>>>'} {'>>> TARGET_IMAGE.UPLOAD'}
               </h3>
               
-              {!imageData ? (
+              {!imageSrc ? (
                 <div 
                   style={{
                     border: '2px dashed #00ff00',
@@ -275,7 +275,7 @@ const HackerWorkspace = ({ isVisible, onClose }) => {
                   background: 'rgba(0, 255, 0, 0.05)'
                 }}>
                   <img 
-                    src={`data:image/jpeg;base64,${imageData}`}
+                    src={imageSrc}
                     alt="Target"
                     style={{
                       width: '100%',
@@ -0,0 +1,62 @@
+"""Production server settings: gunicorn -c gunicorn.conf.py app:app
+
+With preload (the default) the master imports app.py and loads YOLO once;
+workers are forked from it and share the weights copy-on-write. Each worker
+then warms the model up itself, since torch's thread pool isn't fork-safe.
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5001)}"
+
+cpus = multiprocessing.cpu_count()
+workers = int(os.environ.get('WEB_CONCURRENCY', max(2, min(cpus, 4))))
+# The app splits instance-wide budgets (UPLOAD_MEMORY_BUDGET_MB) between workers
+os.environ['WEB_CONCURRENCY'] = str(workers)
+# gthread keeps a worker responsive while its other threads wait on the
+# network-bound LLM calls. GUNICORN_WORKER_CLASS=gevent also works if installed.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 16))
+# ...and sizes its stage pools to the request threads
+os.environ['GUNICORN_THREADS'] = str(threads)
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = '-' if os.environ.get('GUNICORN_ACCESS_LOG') == '1' else None
+errorlog = '-'
+
+if preload_app:
+    # Load the model in the master before forking; warm-up happens per worker
+    os.environ.setdefault('MODEL_LOAD_MODE', 'eager')
+    os.environ.setdefault('MODEL_WARMUP', '0')
+
+
+def post_fork(server, worker):
+    import sys
+
+    app_module = sys.modules.get('app')
+    if app_module is None or not hasattr(app_module, 'warm_up_model'):
+        return
+
+    # Split the CPU between workers instead of every worker using all cores
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        torch.set_num_threads(int(os.environ.get('TORCH_THREADS', max(1, cpus // workers))))
+
+    if app_module.model_loader.ready and os.environ.get('WORKER_WARMUP', '1') == '1':
+        app_module.warm_up_model()
+
+
+def post_worker_init(worker):
+    import sys
+
+    # Job workers are threads, so each worker starts its own once the app is
+    # loaded (with or without preload); this also re-queues jobs left over
+    # from before a restart
+    app_module = sys.modules.get('app')
+    if app_module is not None and hasattr(app_module, 'job_queue'):
+        app_module.job_queue.start()
@@ -0,0 +1 @@
+"""Shared backend helpers for MediBot AI"""
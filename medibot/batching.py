@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+from queue import Queue, Empty
+
+
+class BatchScheduler:
+    """Collect pending inputs for a short window and run them as one batch.
+
+    ``run_batch`` receives a list of inputs and must return one result per
+    input, in the same order. Each caller gets its own result through the
+    future returned by ``submit``.
+    """
+
+    def __init__(self, run_batch, window_ms=10, max_batch=8):
+        self.run_batch = run_batch
+        self.window = window_ms / 1000.0
+        self.max_batch = max(1, int(max_batch))
+        self._queue = Queue()
+        self._lock = threading.Lock()
+        self._stats = {
+            'requests': 0,
+            'batches': 0,
+            'batched_items': 0,
+            'max_batch_size': 0,
+            'max_queue_depth': 0,
+            'total_wait_ms': 0.0,
+            'max_wait_ms': 0.0,
+            'total_run_ms': 0.0,
+            'errors': 0
+        }
+        self._worker = None
+        self._pid = None
+
+    def _ensure_worker(self):
+        # Started on first use, and again in forked children (gunicorn
+        # --preload), where threads from the parent don't exist
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._queue = Queue()
+                    self._worker = threading.Thread(target=self._loop, args=(self._queue,),
+                                                    name='batch-scheduler', daemon=True)
+                    self._worker.start()
+                    self._pid = os.getpid()
+
+    def submit(self, item):
+        """Queue an input and return a Future for its result"""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        with self._lock:
+            self._stats['requests'] += 1
+            self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], self._queue.qsize())
+        return future
+
+    def __call__(self, item):
+        return self.submit(item).result()
+
+    def _collect(self, queue):
+        batch = [queue.get()]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(queue.get(timeout=remaining))
+            except Empty:
+                break
+        return batch
+
+    def _loop(self, queue):
+        while True:
+            batch = self._collect(queue)
+            started = time.perf_counter()
+            waits = [(started - queued) * 1000 for _, _, queued in batch]
+            try:
+                results = self.run_batch([item for item, _, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f'Batch returned {len(results)} results for {len(batch)} inputs')
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+                failed = False
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                failed = True
+            run_ms = (time.perf_counter() - started) * 1000
+
+            with self._lock:
+                self._stats['batches'] += 1
+                self._stats['batched_items'] += len(batch)
+                self._stats['max_batch_size'] = max(self._stats['max_batch_size'], len(batch))
+                self._stats['total_wait_ms'] += sum(waits)
+                self._stats['max_wait_ms'] = max(self._stats['max_wait_ms'], max(waits))
+                self._stats['total_run_ms'] += run_ms
+                if failed:
+                    self._stats['errors'] += 1
+
+    def stats(self):
+        """Snapshot of queue depth, batch size and wait-time counters"""
+        with self._lock:
+            stats = dict(self._stats)
+        batches = stats['batches'] or 1
+        processed = stats['batched_items']
+        stats['queue_depth'] = self._queue.qsize()
+        stats['avg_batch_size'] = round(processed / batches, 2)
+        stats['avg_wait_ms'] = round(stats['total_wait_ms'] / processed, 2) if processed else 0
+        stats['avg_run_ms'] = round(stats['total_run_ms'] / batches, 2)
+        stats['window_ms'] = self.window * 1000
+        stats['max_batch'] = self.max_batch
+        return stats
@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import deque
+
+
+class BudgetExceededError(Exception):
+    """Raised by MemoryBudget.reserve when the bytes don't fit within the timeout"""
+
+
+class Reservation:
+    """Bytes held in a MemoryBudget until ``release`` (or the end of a ``with`` block)"""
+
+    def __init__(self, budget, nbytes):
+        self.budget = budget
+        self.nbytes = nbytes
+        self._released = False
+        self._handed_off = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.budget._release(self.nbytes)
+
+    def hold_until_done(self, events):
+        """Keep the bytes reserved until the generator ``events`` is exhausted
+        or closed, past the end of the ``with`` block (streamed responses)"""
+        self._handed_off = True
+
+        def generate():
+            try:
+                yield from events
+            finally:
+                self.release()
+        return generate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if not self._handed_off:
+            self.release()
+
+    def __del__(self):
+        # A streamed response the client abandoned must not leak its bytes
+        self.release()
+
+
+class MemoryBudget:
+    """Caps the estimated memory of the uploads being processed at once.
+
+    ``reserve(nbytes)`` waits in FIFO order until the bytes fit, so a burst of
+    large uploads is processed a few at a time instead of all decoding at
+    once. A single reservation larger than the whole budget is admitted when
+    nothing else holds any. ``max_bytes=0`` disables the limit.
+    """
+
+    def __init__(self, max_bytes, timeout=30.0):
+        self.max_bytes = max(0, int(max_bytes))
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._waiters = deque()
+        self._in_use = 0
+        self._stats = {'admitted': 0, 'queued': 0, 'rejected': 0, 'peak_bytes': 0}
+
+    def _fits(self, nbytes):
+        return not self.max_bytes or not self._in_use or self._in_use + nbytes <= self.max_bytes
+
+    def reserve(self, nbytes, timeout=-1):
+        """Hold ``nbytes``; ``timeout`` defaults to the budget's (None waits forever).
+
+        Returns a Reservation; raises BudgetExceededError on timeout.
+        """
+        timeout = self.timeout if timeout == -1 else timeout
+        nbytes = max(0, int(nbytes))
+        with self._cond:
+            ticket = object()
+            self._waiters.append(ticket)
+            try:
+                if self._waiters[0] is not ticket or not self._fits(nbytes):
+                    self._stats['queued'] += 1
+                    deadline = None if timeout is None else time.monotonic() + timeout
+                    while self._waiters[0] is not ticket or not self._fits(nbytes):
+                        remaining = None if deadline is None else deadline - time.monotonic()
+                        if remaining is not None and remaining <= 0:
+                            self._stats['rejected'] += 1
+                            raise BudgetExceededError(
+                                f'{self._in_use // (1024 * 1024)}MB of {self.max_bytes // (1024 * 1024)}MB '
+                                'upload memory in use'
+                            )
+                        self._cond.wait(remaining)
+                self._in_use += nbytes
+                self._stats['admitted'] += 1
+                self._stats['peak_bytes'] = max(self._stats['peak_bytes'], self._in_use)
+            finally:
+                self._waiters.remove(ticket)
+                # The next waiter may fit now that this one has left the line
+                self._cond.notify_all()
+        return Reservation(self, nbytes)
+
+    def _release(self, nbytes):
+        with self._cond:
+            self._in_use -= nbytes
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats['in_use_bytes'] = self._in_use
+            stats['waiting'] = len(self._waiters)
+        stats['max_bytes'] = self.max_bytes
+        return stats
@@ -0,0 +1,97 @@
+import gzip
+import threading
+
+try:
+    import brotli
+except ImportError:  # optional; responses fall back to gzip
+    brotli = None
+
+# Preferred first when the client accepts several equally
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+COMPRESSIBLE_TYPES = ('application/json', 'application/javascript', 'image/svg+xml', 'text/')
+
+
+def accepted_encodings(header):
+    """{coding: q} from an Accept-Encoding header"""
+    accepted = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def choose_encoding(header, encodings=ENCODINGS):
+    """The best of ``encodings`` the client accepts, or None for identity"""
+    accepted = accepted_encodings(header or '')
+    best, best_q = None, 0.0
+    for coding in encodings:
+        q = accepted.get(coding, accepted.get('*', 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class ResponseCompressor:
+    """Compresses response bodies with the best encoding the client accepts.
+
+    Call it from an ``after_request`` hook. Streamed responses (SSE, files
+    sent with passthrough), bodies under ``min_size`` and types that don't
+    compress (images) are left alone. brotli is used when the ``brotli``
+    package is installed, gzip otherwise. Levels favour speed: the bodies are
+    dynamic and compressed on every request.
+    """
+
+    def __init__(self, min_size=1024, gzip_level=6, brotli_quality=5):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self._lock = threading.Lock()
+        self._stats = {'compressed': 0, 'bytes_in': 0, 'bytes_out': 0, 'br': 0, 'gzip': 0}
+
+    def compress(self, data, encoding):
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.brotli_quality)
+        return gzip.compress(data, compresslevel=self.gzip_level, mtime=0)
+
+    def __call__(self, response, accept_encoding):
+        if (response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers
+                or not (response.mimetype or '').startswith(COMPRESSIBLE_TYPES)):
+            return response
+        response.vary.add('Accept-Encoding')
+        if not 200 <= response.status_code < 300 or response.status_code == 204:
+            return response
+        encoding = choose_encoding(accept_encoding)
+        data = response.get_data()
+        if encoding is None or len(data) < self.min_size:
+            return response
+
+        compressed = self.compress(data, encoding)
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        if response.get_etag()[0] is not None:
+            # A strong ETag names the exact bytes, which just changed
+            response.set_etag(response.get_etag()[0], weak=True)
+        with self._lock:
+            self._stats['compressed'] += 1
+            self._stats['bytes_in'] += len(data)
+            self._stats['bytes_out'] += len(compressed)
+            self._stats[encoding] += 1
+        return response
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['ratio'] = round(stats['bytes_out'] / stats['bytes_in'], 3) if stats['bytes_in'] else None
+        stats['encodings'] = list(ENCODINGS)
+        return stats
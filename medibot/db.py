@@ -0,0 +1,32 @@
+import os
+import sqlite3
+
+
+class ProcessConnection:
+    """One sqlite connection per process, opened on first use in each.
+
+    sqlite connections must not cross fork() (gunicorn --preload), so a
+    process that inherited one opens its own. Every new connection uses WAL,
+    so workers can read while one writes, and runs the ``schema`` statements
+    (CREATE ... IF NOT EXISTS). Callers serialize access with their own lock;
+    ``options`` go to sqlite3.connect.
+    """
+
+    def __init__(self, path, schema=(), **options):
+        self.path = path
+        self.schema = tuple(schema)
+        self.options = options
+        self._conn = None
+        self._pid = None
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    def get(self):
+        if self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False, **self.options)
+            conn.execute('PRAGMA journal_mode=WAL')
+            for statement in self.schema:
+                conn.execute(statement)
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
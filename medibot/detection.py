@@ -0,0 +1,120 @@
+import os
+
+# torch: ultralytics PyTorch eager inference (the original behaviour)
+# onnx / onnx-int8: exported ONNX model on ONNX Runtime, optionally with
+#   dynamically quantized INT8 weights
+# openvino: exported OpenVINO IR on the OpenVINO CPU runtime
+# none: no object detection; torch and ultralytics are never imported
+BACKENDS = ('torch', 'onnx', 'onnx-int8', 'openvino', 'none')
+
+
+class Detector:
+    """A YOLO model on one of the CPU backends.
+
+    Every backend is loaded through ultralytics, so results (and the detection
+    dicts built from them) have the same shape whichever backend runs.
+    """
+
+    def __init__(self, model, backend, batched=True):
+        self.model = model
+        self.backend = backend
+        self.batched = batched
+        self.names = class_lookup(model.names)
+
+    def predict(self, images):
+        """One ultralytics Results per input image"""
+        if self.batched:
+            return self.model(images, verbose=False)
+        # Static-shape exports only take one image per forward pass
+        return [self.model(image, verbose=False)[0] for image in images]
+
+
+class NullDetector:
+    """Detection turned off: every image has no detections.
+
+    Lets deployments without torch (backend-deploy/) run the same app and
+    upload pipeline, with only metadata and the LLM analysis.
+    """
+
+    backend = 'none'
+    batched = True
+    names = []
+
+    def predict(self, images):
+        return [None] * len(images)
+
+
+def class_lookup(names):
+    """Class names as a list indexed by class id (ultralytics gives a dict)"""
+    if isinstance(names, dict):
+        table = [str(i) for i in range(max(names, default=-1) + 1)]
+        for index, name in names.items():
+            table[index] = name
+        return table
+    return list(names)
+
+
+def result_rows(result, threshold=0.5):
+    """One YOLO result as a numpy array of x1, y1, x2, y2, conf, cls rows"""
+    # One device transfer for the whole result: rows are x1, y1, x2, y2, (track id,) conf, cls
+    data = result.boxes.data.cpu().numpy()
+    data = data[data[:, -2] > threshold]  # Filter low confidence detections
+    return data[:, [0, 1, 2, 3, -2, -1]]
+
+
+def rows_to_detections(rows, names):
+    """Detection dicts from result_rows-shaped rows"""
+    return [{
+        'class': names[int(row[5])],
+        'confidence': row[4],
+        'bbox': row[:4]
+    } for row in rows.tolist()]
+
+
+def result_to_detections(result, names, threshold=0.5):
+    """Convert one YOLO result into detection dicts"""
+    boxes = result.boxes if result is not None else None
+    if boxes is None or not len(boxes):
+        return []
+    return rows_to_detections(result_rows(result, threshold), names)
+
+
+def export_weights(weights, backend):
+    """Path to ``weights`` exported for ``backend``, exporting on first use"""
+    from ultralytics import YOLO
+
+    stem = os.path.splitext(weights)[0]
+    if backend == 'onnx':
+        path = stem + '.onnx'
+        if not os.path.exists(path):
+            path = YOLO(weights).export(format='onnx', dynamic=True, simplify=True)
+        return path
+    if backend == 'onnx-int8':
+        path = stem + '.int8.onnx'
+        if not os.path.exists(path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            quantize_dynamic(export_weights(weights, 'onnx'), path, weight_type=QuantType.QUInt8)
+        return path
+    if backend == 'openvino':
+        path = stem + '_openvino_model'
+        if not os.path.exists(path):
+            path = YOLO(weights).export(format='openvino')
+        return path
+    raise ValueError(f"Unknown detection backend '{backend}', expected one of {', '.join(BACKENDS)}")
+
+
+def load_detector(weights, backend='torch'):
+    """Load ``weights`` on the configured backend"""
+    if backend == 'none':
+        return NullDetector()
+
+    import torch
+    from ultralytics import YOLO
+
+    # The weights are a pickled ultralytics model; allow its class when loading
+    torch.serialization.add_safe_globals(['ultralytics.nn.tasks.DetectionModel'])
+    if backend == 'torch':
+        return Detector(YOLO(weights), backend)
+    model = YOLO(export_weights(weights, backend), task='detect')
+    return Detector(model, backend, batched=backend != 'openvino')
@@ -0,0 +1,237 @@
+import struct
+from collections import namedtuple
+
+ImageHeader = namedtuple('ImageHeader', 'format mode size exif')
+
+# Only the tags extract_metadata reports. Values are checked against the
+# expected kind so malformed files drop a field instead of raising later:
+# 'text' -> str, 'number' -> int/float, 'triple' -> three numbers.
+IFD0_TAGS = {
+    0x0103: ('Compression', 'number'),
+    0x010F: ('Make', 'text'),
+    0x0110: ('Model', 'text'),
+    0x0112: ('Orientation', 'number'),
+    0x011A: ('XResolution', 'number'),
+    0x011B: ('YResolution', 'number'),
+    0x0128: ('ResolutionUnit', 'number'),
+    0x0131: ('Software', 'text'),
+    0x0132: ('DateTime', 'text'),
+}
+EXIF_TAGS = {
+    0x829A: ('ExposureTime', 'number'),
+    0x829D: ('FNumber', 'number'),
+    0x8822: ('ExposureProgram', 'number'),
+    0x8827: ('ISOSpeedRatings', 'number'),
+    0x9003: ('DateTimeOriginal', 'text'),
+    0x9004: ('DateTimeDigitized', 'text'),
+    0x9207: ('MeteringMode', 'number'),
+    0x9209: ('Flash', 'number'),
+    0x920A: ('FocalLength', 'number'),
+    0xA001: ('ColorSpace', 'number'),
+    0xA301: ('SceneType', 'number'),
+    0xA402: ('ExposureMode', 'number'),
+    0xA403: ('WhiteBalance', 'number'),
+    0xA404: ('DigitalZoomRatio', 'number'),
+    0xA405: ('FocalLengthIn35mmFilm', 'number'),
+    0xA406: ('SceneCaptureType', 'number'),
+    0xA408: ('Contrast', 'number'),
+    0xA409: ('Saturation', 'number'),
+    0xA40A: ('Sharpness', 'number'),
+    0xA433: ('LensMake', 'text'),
+    0xA434: ('LensModel', 'text'),
+}
+GPS_TAGS = {
+    0x01: ('GPSLatitudeRef', 'text'),
+    0x02: ('GPSLatitude', 'triple'),
+    0x03: ('GPSLongitudeRef', 'text'),
+    0x04: ('GPSLongitude', 'triple'),
+    0x06: ('GPSAltitude', 'number'),
+    0x07: ('GPSTimeStamp', 'triple'),
+    0x1D: ('GPSDateStamp', 'text'),
+}
+EXIF_IFD_POINTER = 0x8769
+GPS_IFD_POINTER = 0x8825
+
+# TIFF field type: (struct code, size of one value)
+FIELD_TYPES = {
+    1: ('B', 1),   # BYTE
+    2: ('s', 1),   # ASCII
+    3: ('H', 2),   # SHORT
+    4: ('L', 4),   # LONG
+    5: ('L', 8),   # RATIONAL (two LONGs)
+    6: ('b', 1),   # SBYTE
+    7: ('B', 1),   # UNDEFINED (the one-byte tags we report are enums)
+    8: ('h', 2),   # SSHORT
+    9: ('l', 4),   # SLONG
+    10: ('l', 8),  # SRATIONAL (two SLONGs)
+    13: ('L', 4),  # IFD
+}
+# FLOAT/DOUBLE aren't used by the reported tags and are skipped, so every
+# number is a bounded int or ratio (no NaN/inf reaching the JSON response)
+
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+JPEG_MODES = {1: 'L', 3: 'RGB', 4: 'CMYK'}
+# (bit depth, color type) -> mode, as PIL reports them
+PNG_MODES = {
+    (1, 0): '1', (2, 0): 'L', (4, 0): 'L', (8, 0): 'L', (16, 0): 'I;16',
+    (8, 2): 'RGB', (16, 2): 'RGB',
+    (1, 3): 'P', (2, 3): 'P', (4, 3): 'P', (8, 3): 'P',
+    (8, 4): 'LA', (16, 4): 'RGBA',
+    (8, 6): 'RGBA', (16, 6): 'RGBA',
+}
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+EXIF_PREFIX = b'Exif\x00\x00'
+
+
+def _read_value(view, order, field_type, count, offset):
+    code, size = FIELD_TYPES[field_type]
+    if field_type == 2:
+        text = bytes(view[offset:offset + count]).split(b'\x00', 1)[0]
+        return text.decode('latin-1')
+    if field_type in (5, 10):
+        numbers = struct.unpack_from(f'{order}{count * 2}{code}', view, offset)
+        # A zero denominator makes the value meaningless; drop it
+        if not all(numbers[1::2]):
+            return None
+        values = tuple(numbers[index] / numbers[index + 1] for index in range(0, len(numbers), 2))
+    else:
+        values = struct.unpack_from(f'{order}{count}{code}', view, offset)
+    return values[0] if count == 1 else values
+
+
+def _matches(kind, value):
+    if kind == 'text':
+        return isinstance(value, str)
+    if kind == 'number':
+        return isinstance(value, (int, float))
+    return isinstance(value, tuple) and len(value) == 3
+
+
+def _read_ifd(view, order, offset, tags, pointers=()):
+    """Wanted tags of one IFD as {name: value}, plus {pointer tag: offset}"""
+    found = {}
+    links = {}
+    if offset < 8 or offset + 2 > len(view):
+        return found, links
+    count = struct.unpack_from(order + 'H', view, offset)[0]
+    # Truncated directories keep the entries that are actually there
+    count = min(count, (len(view) - offset - 2) // 12)
+    for entry in range(offset + 2, offset + 2 + count * 12, 12):
+        tag, field_type, value_count, value_offset = struct.unpack_from(order + 'HHLL', view, entry)
+        if tag in pointers:
+            links[tag] = value_offset
+            continue
+        if tag not in tags or field_type not in FIELD_TYPES or value_count == 0:
+            continue
+        size = FIELD_TYPES[field_type][1] * value_count
+        start = entry + 8 if size <= 4 else value_offset
+        if start + size > len(view):
+            continue
+        value = _read_value(view, order, field_type, value_count, start)
+        name, kind = tags[tag]
+        if value is not None and _matches(kind, value):
+            found[name] = value
+    return found, links
+
+
+def read_exif(data):
+    """The reported EXIF and GPS tags of a TIFF-structured EXIF block.
+
+    ``data`` is the APP1/eXIf payload, with or without the ``Exif\\0\\0``
+    prefix, or a whole TIFF file. Returns ``{name: value}`` with GPS tags
+    nested under ``'GPSInfo'``, or None when there is no usable EXIF. Values
+    are plain str/int/float (rationals become floats) or tuples of those.
+    Malformed blocks yield whatever entries could be read; this never raises.
+    """
+    view = memoryview(data)
+    if view[:6] == EXIF_PREFIX:
+        view = view[6:]
+    if len(view) < 8:
+        return None
+    if view[:4] == b'II*\x00':
+        order = '<'
+    elif view[:4] == b'MM\x00*':
+        order = '>'
+    else:
+        return None
+
+    ifd0 = struct.unpack_from(order + 'L', view, 4)[0]
+    exif, links = _read_ifd(view, order, ifd0, IFD0_TAGS, (EXIF_IFD_POINTER, GPS_IFD_POINTER))
+    if EXIF_IFD_POINTER in links:
+        exif.update(_read_ifd(view, order, links[EXIF_IFD_POINTER], EXIF_TAGS, (GPS_IFD_POINTER,))[0])
+    if GPS_IFD_POINTER in links:
+        gps = _read_ifd(view, order, links[GPS_IFD_POINTER], GPS_TAGS)[0]
+        if gps:
+            exif['GPSInfo'] = gps
+    return exif if links or exif else None
+
+
+def _read_jpeg(view):
+    size = mode = exif = None
+    position = 2
+    while position + 4 <= len(view):
+        if view[position] != 0xFF:
+            return None
+        marker = view[position + 1]
+        if marker == 0xFF:  # fill byte
+            position += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:  # no length field
+            position += 2
+            continue
+        if marker in (0xD9, 0xDA):  # end of image / start of scan data
+            break
+        length = struct.unpack_from('>H', view, position + 2)[0]
+        if length < 2:
+            return None
+        segment = view[position + 4:position + 2 + length]
+        if marker == 0xE1 and exif is None and segment[:6] == EXIF_PREFIX:
+            exif = read_exif(segment)
+        elif marker == 0xE2 and segment[:4] == b'MPF\x00':
+            return None  # PIL reports multi-picture files as MPO
+        elif marker in JPEG_SOF_MARKERS and size is None and len(segment) >= 6:
+            _, height, width, components = struct.unpack_from('>BHHB', segment)
+            size = (width, height)
+            mode = JPEG_MODES.get(components)
+        position += 2 + length
+    if size is None or mode is None or not all(size):
+        return None
+    return ImageHeader('JPEG', mode, size, exif)
+
+
+def _read_png(view):
+    if len(view) < 33 or view[12:16] != b'IHDR':
+        return None
+    width, height, depth, color_type = struct.unpack_from('>LLBB', view, 16)
+    mode = PNG_MODES.get((depth, color_type))
+    if mode is None or not width or not height:
+        return None
+    exif = None
+    position = 8
+    # eXIf must come before the image data
+    while position + 8 <= len(view):
+        length = struct.unpack_from('>L', view, position)[0]
+        chunk = view[position + 4:position + 8]
+        if chunk == b'IDAT' or chunk == b'IEND':
+            break
+        if chunk == b'eXIf':
+            exif = read_exif(view[position + 8:position + 8 + length])
+            break
+        position += 12 + length
+    return ImageHeader('PNG', mode, (width, height), exif)
+
+
+def read_header(data):
+    """Format, mode, size and EXIF of a JPEG or PNG from its header bytes.
+
+    Scans markers/chunks up to the image data without decoding pixels or
+    building PIL objects. Returns an ImageHeader, or None for other formats
+    and for files this parser doesn't understand; callers fall back to PIL
+    for those.
+    """
+    view = memoryview(data)
+    if view[:3] == b'\xff\xd8\xff':
+        return _read_jpeg(view)
+    if view[:8] == PNG_SIGNATURE:
+        return _read_png(view)
+    return None
@@ -0,0 +1,43 @@
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional; the standard library encoder is used instead
+    orjson = None
+
+
+def dumps(data):
+    """Compact JSON text, encoded with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(data, separators=(',', ':'))
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, with responses encoded by orjson when available.
+
+    The output is what the default provider sends outside debug mode (compact,
+    sorted keys), except that non-ASCII text is UTF-8 rather than ``\\u``
+    escapes. Debug mode's indented output and ``dumps`` calls with
+    ``json.dumps`` arguments still go through the standard library.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return self.encode(obj).decode()
+
+    def encode(self, obj):
+        """Compact UTF-8 JSON bytes"""
+        if orjson is None:
+            return DefaultJSONProvider.dumps(self, obj, separators=(',', ':')).encode()
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if self.sort_keys else 0)
+        return orjson.dumps(obj, default=self.default, option=option)
+
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.encode(obj) + b'\n', mimetype=self.mimetype)
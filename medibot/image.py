@@ -0,0 +1,234 @@
+import base64
+import io
+import mmap
+import threading
+import time
+
+from PIL import Image
+
+from medibot.exif import ImageHeader, read_exif, read_header
+
+# Formats the vision model accepts as-is in a data: URL
+VISION_FORMATS = {'JPEG', 'PNG', 'WEBP', 'GIF'}
+# Bytes per pixel of decoded PIL images; multi-band modes use 4 (RGB is stored as RGBX)
+PIXEL_BYTES = {'1': 1, 'L': 1, 'P': 1, 'I;16': 2, 'I': 4, 'F': 4, 'RGB': 4}
+# EXIF Orientation -> the transpose that makes the pixels upright
+ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+
+def is_high_depth(mode):
+    """16/32-bit integer and float modes (e.g. 16-bit grayscale PNG exports)"""
+    return mode.startswith('I') or mode == 'F'
+
+
+def to_8bit(image):
+    """Grayscale with the image's value range stretched over 0-255.
+
+    PIL's plain ``convert`` clips high-depth values at 255, which turns a
+    16-bit scan nearly white.
+    """
+    if image.mode not in ('I', 'F'):
+        image = image.convert('I')
+    low, high = image.getextrema()
+    scale = 255.0 / (high - low) if high > low else 0.0
+    return image.point(lambda value: value * scale - low * scale).convert('L')
+
+
+class DecodedImage:
+    """One upload's bytes, parsed and decoded at most once and shared by every stage.
+
+    The header (format, mode, size) and EXIF are read straight from the bytes
+    for JPEG and PNG (see medibot.exif), and through PIL's header reader for
+    other formats, without touching pixel data. Pixels are decoded on first
+    access to ``rgb`` and reused after that, until ``release`` (or the end of
+    a ``with`` block) drops them. Safe to share between the concurrent upload
+    stages.
+    """
+
+    def __init__(self, data):
+        # bytes, or an mmap of an upload spooled to disk (see map_upload)
+        self.data = data
+        self._lock = threading.Lock()
+        self._header = None
+        self._image = None
+        self._rgb = None
+        self._base64 = None
+        self._llm_images = {}
+
+    @classmethod
+    def wrap(cls, image):
+        """Accept raw bytes or an existing DecodedImage"""
+        return image if isinstance(image, cls) else cls(image)
+
+    @property
+    def nbytes(self):
+        return len(self.data)
+
+    def _open(self):
+        with self._lock:
+            if self._image is None:
+                # BytesIO shares an exact bytes object's buffer instead of copying
+                # it; an mmap is already file-like and is read in place
+                source = self.data if isinstance(self.data, mmap.mmap) else io.BytesIO(self.data)
+                self._image = Image.open(source)
+        return self._image
+
+    @property
+    def header(self):
+        """ImageHeader (format, mode, size, exif), parsed once"""
+        if self._header is None:
+            header = read_header(self.data)
+            if header is None:
+                image = self._open()
+                if image.format == 'TIFF':
+                    exif = read_exif(self.data)
+                else:
+                    exif = read_exif(image.info['exif']) if image.info.get('exif') else None
+                header = ImageHeader(image.format, image.mode, image.size, exif)
+            self._header = header
+        return self._header
+
+    @property
+    def format(self):
+        return self.header.format
+
+    @property
+    def mode(self):
+        return self.header.mode
+
+    @property
+    def size(self):
+        return self.header.size
+
+    @property
+    def mime_type(self):
+        return Image.MIME.get(self.format, 'application/octet-stream')
+
+    @property
+    def exif(self):
+        """Reported EXIF tags by name (GPS under 'GPSInfo'), or None"""
+        return self.header.exif
+
+    def footprint(self, llm_max_edge=1536):
+        """Estimated peak memory while processing: the encoded bytes and the
+        image store's copy of them, the decoded pixels and, for other modes,
+        the RGB copy YOLO gets (plus the 32-bit and 8-bit steps of rescaling
+        high-depth modes), and the copies made for the vision model by
+        ``llm_image(llm_max_edge)``"""
+        width, height = self.size
+        pixels = width * height
+        decoded = pixels * PIXEL_BYTES.get(self.mode, 4)
+        if self.mode != 'RGB':
+            decoded += pixels * PIXEL_BYTES['RGB']
+        if is_high_depth(self.mode):
+            decoded += pixels * (PIXEL_BYTES['I'] + PIXEL_BYTES['L'])
+        return 2 * self.nbytes + decoded + self._llm_footprint(llm_max_edge)
+
+    def _llm_footprint(self, max_edge):
+        width, height = self.size
+        if not max_edge or (self.format == 'JPEG' and max(width, height) <= max_edge):
+            resized, encoded = 0, self.nbytes
+        else:
+            scale = min(1.0, max_edge / max(width, height))
+            resized = round(width * scale) * round(height * scale) * PIXEL_BYTES['RGB']
+            if ORIENTATION_TRANSPOSE.get((self.exif or {}).get('Orientation')) is not None:
+                resized *= 2
+            # Re-encoding gives up and sends the original when it isn't smaller
+            encoded = min(self.nbytes, resized)
+        # The encoded copy, its base64 and the JSON request body (str and bytes)
+        return resized + encoded + 3 * (encoded * 4 // 3)
+
+    @property
+    def rgb(self):
+        """Decoded RGB pixels as a PIL image (decoded once)"""
+        image = self._open()
+        with self._lock:
+            if self._rgb is None:
+                image.load()
+                if image.mode == 'RGB':
+                    self._rgb = image
+                elif is_high_depth(image.mode):
+                    self._rgb = to_8bit(image).convert('RGB')
+                else:
+                    self._rgb = image.convert('RGB')
+        return self._rgb
+
+    def release(self):
+        """Drop the decoded pixels so their memory is freed before the upload's
+        budget reservation is; they are decoded again if used after this"""
+        with self._lock:
+            self._image = None
+            self._rgb = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    @property
+    def base64(self):
+        """Base64 of the original bytes, encoded once"""
+        if self._base64 is None:
+            self._base64 = base64.b64encode(self.data).decode()
+        return self._base64
+
+    def llm_image(self, max_edge=1536, quality=85, format='JPEG'):
+        """Downscaled, re-encoded copy for the vision model.
+
+        Returns ``(base64, mime_type, info)``. Reuses the pixels decoded for
+        YOLO (high-depth images rescaled to 8-bit), rotated upright as the
+        EXIF Orientation says since the re-encoded copy carries no EXIF. A
+        JPEG that already fits within ``max_edge`` is sent unchanged, and
+        ``max_edge=0`` disables preprocessing. The result is cached per
+        settings.
+        """
+        settings = (max_edge, quality, format)
+        if settings in self._llm_images:
+            return self._llm_images[settings]
+        started = time.perf_counter()
+        width, height = self.size
+        if not max_edge or (self.format == 'JPEG' and max(width, height) <= max_edge):
+            payload = self.base64
+            mime_type = Image.MIME.get(self.format, 'image/jpeg')
+            sent_size = (width, height)
+        else:
+            image = self.rgb
+            scale = min(1.0, max_edge / max(width, height))
+            if scale < 1.0:
+                image = image.resize((max(1, round(width * scale)), max(1, round(height * scale))),
+                                     Image.LANCZOS, reducing_gap=3.0)
+            # Transposing the downscaled copy gives the same pixels for less work
+            transpose = ORIENTATION_TRANSPOSE.get((self.exif or {}).get('Orientation'))
+            if transpose is not None:
+                image = image.transpose(transpose)
+            buffer = io.BytesIO()
+            image.save(buffer, format, quality=quality)
+            if buffer.tell() >= self.nbytes and self.format in VISION_FORMATS:
+                # Re-encoding didn't help (e.g. flat PNG scans); keep the original
+                payload = self.base64
+                mime_type = Image.MIME[self.format]
+                sent_size = (width, height)
+            else:
+                payload = base64.b64encode(buffer.getvalue()).decode()
+                mime_type = Image.MIME.get(format.upper(), 'image/jpeg')
+                sent_size = image.size
+
+        info = {
+            'original_bytes': self.nbytes,
+            'sent_bytes': len(payload) * 3 // 4,
+            'sent_size': f"{sent_size[0]} x {sent_size[1]}",
+            'mime_type': mime_type,
+            'encode_ms': round((time.perf_counter() - started) * 1000, 2)
+        }
+        info['saved_bytes'] = max(0, self.nbytes - info['sent_bytes'])
+        self._llm_images[settings] = (payload, mime_type, info)
+        return payload, mime_type, info
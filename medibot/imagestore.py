@@ -0,0 +1,148 @@
+import hashlib
+import mimetypes
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class ImageStore:
+    """Uploaded images addressed by a short content ID.
+
+    Every image is written to ``directory``, which all worker processes
+    share, so any of them can serve an ID another one stored. Recent images
+    are also kept in a per-process memory LRU bounded by total bytes, used
+    only as a read cache. Both tiers expire entries after ``ttl`` seconds.
+    """
+
+    def __init__(self, directory, max_memory_bytes=64 * 1024 * 1024, ttl=6 * 3600):
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._stats = {'puts': 0, 'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'written': 0}
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def image_id(data):
+        return hashlib.sha256(data).hexdigest()[:32]
+
+    def _path(self, image_id, mime_type):
+        extension = mimetypes.guess_extension(mime_type) or '.bin'
+        return os.path.join(self.directory, image_id + extension)
+
+    def _find_on_disk(self, image_id):
+        prefix = image_id + '.'
+        for name in os.listdir(self.directory):
+            if name.startswith(prefix):
+                return os.path.join(self.directory, name)
+        return None
+
+    def put(self, data, mime_type='image/jpeg'):
+        """Store image bytes and return their ID (identical uploads share one ID)"""
+        image_id = self.image_id(data)
+        # Written before the ID is handed out, outside the lock so lookups
+        # aren't blocked on I/O
+        self._write(image_id, data, mime_type)
+        with self._lock:
+            self._stats['puts'] += 1
+            self._puts += 1
+            sweep = self._puts % 50 == 0
+        self._cache(image_id, data, mime_type, time.time())
+        if sweep:
+            self.sweep()
+        return image_id
+
+    def _write(self, image_id, data, mime_type):
+        path = self._path(image_id, mime_type)
+        try:
+            # Another upload (or worker) already wrote it; restart its TTL
+            os.utime(path)
+            return
+        except FileNotFoundError:
+            pass
+        # Hidden from _find_on_disk until complete, and unique per process
+        # and thread so concurrent writers of one ID don't clobber each other
+        tmp = os.path.join(self.directory, f'.{image_id}.{os.getpid()}.{threading.get_ident()}.tmp')
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self._count('written')
+
+    def _cache(self, image_id, data, mime_type, stored):
+        """Keep a copy in the memory LRU if it fits the budget"""
+        if len(data) > self.max_memory_bytes:
+            return
+        # Our own copy of a memory-mapped upload (no-op for bytes)
+        data = bytes(data)
+        with self._lock:
+            existing = self._memory.pop(image_id, None)
+            if existing is not None:
+                self._memory_bytes -= len(existing[0])
+            self._memory[image_id] = (data, mime_type, stored)
+            self._memory_bytes += len(data)
+            # Everything is on disk, so evicted entries are simply dropped
+            while self._memory_bytes > self.max_memory_bytes:
+                _, (old_data, _, _) = self._memory.popitem(last=False)
+                self._memory_bytes -= len(old_data)
+
+    def get(self, image_id):
+        """Return ``(data, mime_type)`` or None if unknown or expired"""
+        with self._lock:
+            entry = self._memory.get(image_id)
+            if entry is not None:
+                data, mime_type, stored = entry
+                if time.time() - stored < self.ttl:
+                    self._memory.move_to_end(image_id)
+                    self._stats['memory_hits'] += 1
+                    return data, mime_type
+                del self._memory[image_id]
+                self._memory_bytes -= len(data)
+
+        # IDs are hex digests; reject anything else before touching the filesystem
+        if len(image_id) != 32 or any(c not in '0123456789abcdef' for c in image_id):
+            self._count('misses')
+            return None
+        path = self._find_on_disk(image_id)
+        data = None
+        if path is not None:
+            try:
+                stored = os.path.getmtime(path)
+                if time.time() - stored < self.ttl:
+                    with open(path, 'rb') as f:
+                        data = f.read()
+            except FileNotFoundError:
+                # Swept by another worker since the listing
+                pass
+        if data is None:
+            self._count('misses')
+            return None
+        self._count('disk_hits')
+        mime_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self._cache(image_id, data, mime_type, stored)
+        return data, mime_type
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def sweep(self):
+        """Delete stored images older than the TTL"""
+        cutoff = time.time() - self.ttl
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_images'] = len(self._memory)
+            stats['memory_bytes'] = self._memory_bytes
+        return stats
@@ -0,0 +1,213 @@
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+from queue import PriorityQueue
+
+from medibot.db import ProcessConnection
+
+# Lower value runs first; bulk jobs only run when no interactive job is waiting
+PRIORITIES = {'interactive': 0, 'bulk': 1}
+
+
+class QueueFullError(Exception):
+    """Raised by JobQueue.submit when max_pending jobs are already waiting"""
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """Background jobs persisted in sqlite and run by a bounded worker pool.
+
+    ``process(payload, options)`` does the work and returns a JSON-serializable
+    result; ``notify(callback_url, job)`` (optional) is called once a job
+    submitted with a ``callback_url`` option has finished.
+    Queued and interrupted jobs are picked up again by ``start`` after a
+    restart. Several processes may share one database: a job runs in whichever
+    process claims it first.
+    """
+
+    def __init__(self, process, path, workers=2, max_pending=64, ttl=24 * 3600, notify=None):
+        self.process = process
+        self.path = path
+        self.workers = max(1, int(workers))
+        self.max_pending = max(1, int(max_pending))
+        self.ttl = ttl
+        self.notify = notify
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db = ProcessConnection(path, (
+            'CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, status TEXT, priority INTEGER, '
+            'payload BLOB, options TEXT, result TEXT, error TEXT, owner INTEGER, created REAL, updated REAL)',
+            'CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, priority, created)'
+        ))
+        self._pid = None
+        self._queue = None
+        self._seq = itertools.count()
+        self._stats = {
+            'submitted': 0,
+            'rejected': 0,
+            'recovered': 0,
+            'completed': 0,
+            'failed': 0,
+            'running': 0,
+            'callback_errors': 0
+        }
+
+    @property
+    def _conn(self):
+        return self._db.get()
+
+    def _execute(self, sql, params=()):
+        with self._db_lock:
+            cursor = self._conn.execute(sql, params)
+            self._conn.commit()
+            return cursor
+
+    def _fetch(self, sql, params=()):
+        with self._db_lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def start(self):
+        """Start this process's workers and re-queue unfinished jobs (idempotent)"""
+        # Threads don't survive fork (gunicorn --preload), so each process
+        # starts its own pool on first use
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = PriorityQueue()
+            for index in range(self.workers):
+                threading.Thread(target=self._loop, args=(self._queue,),
+                                 name=f'job-worker-{index}', daemon=True).start()
+            self._pid = os.getpid()
+        self._recover()
+
+    def _recover(self):
+        # Jobs whose process died mid-run go back to the queue
+        for job_id, owner in self._fetch("SELECT id, owner FROM jobs WHERE status = 'running'"):
+            if owner is None or not _process_alive(owner):
+                self._execute("UPDATE jobs SET status = 'queued', owner = NULL WHERE id = ? AND status = 'running'",
+                              (job_id,))
+        rows = self._fetch("SELECT id, priority FROM jobs WHERE status = 'queued' ORDER BY priority, created")
+        for job_id, priority in rows:
+            self._queue.put((priority, next(self._seq), job_id))
+        with self._lock:
+            self._stats['recovered'] += len(rows)
+
+    def pending(self):
+        """Jobs waiting to run, across every process sharing the database"""
+        return self._fetch("SELECT COUNT(*) FROM jobs WHERE status = 'queued'")[0][0]
+
+    def submit(self, payload, priority='interactive', options=None):
+        """Persist and queue a job; raises QueueFullError when the queue is full"""
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority '{priority}', expected one of {', '.join(PRIORITIES)}")
+        self.start()
+        if self.pending() >= self.max_pending:
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise QueueFullError(f'{self.max_pending} jobs already queued')
+
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        rank = PRIORITIES[priority]
+        self._execute(
+            'INSERT INTO jobs (id, status, priority, payload, options, created, updated) '
+            "VALUES (?, 'queued', ?, ?, ?, ?, ?)",
+            (job_id, rank, payload, json.dumps(options or {}), now, now)
+        )
+        self._execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated < ?", (now - self.ttl,))
+        self._queue.put((rank, next(self._seq), job_id))
+        with self._lock:
+            self._stats['submitted'] += 1
+        return self.get(job_id)
+
+    def get(self, job_id):
+        """Public view of a job, or None if unknown or expired"""
+        rows = self._fetch(
+            'SELECT id, status, priority, result, error, created, updated FROM jobs WHERE id = ?',
+            (job_id,)
+        )
+        if not rows:
+            return None
+        job_id, status, priority, result, error, created, updated = rows[0]
+        job = {
+            'job_id': job_id,
+            'status': status,
+            'priority': next(name for name, rank in PRIORITIES.items() if rank == priority),
+            'created_at': created,
+            'updated_at': updated
+        }
+        if status == 'queued':
+            job['queue_position'] = self._fetch(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND (priority < ? OR (priority = ? AND created < ?))",
+                (priority, priority, created)
+            )[0][0] + 1
+        if result is not None:
+            job['result'] = json.loads(result)
+        if error is not None:
+            job['error'] = error
+        return job
+
+    def _claim(self, job_id):
+        claimed = self._execute(
+            "UPDATE jobs SET status = 'running', owner = ?, updated = ? WHERE id = ? AND status = 'queued'",
+            (os.getpid(), time.time(), job_id)
+        ).rowcount
+        if not claimed:
+            return None
+        rows = self._fetch('SELECT payload, options FROM jobs WHERE id = ?', (job_id,))
+        return (rows[0][0], json.loads(rows[0][1])) if rows else None
+
+    def _loop(self, queue):
+        while True:
+            _, _, job_id = queue.get()
+            claimed = self._claim(job_id)
+            if claimed is None:
+                continue  # Already taken by another process
+            payload, options = claimed
+            with self._lock:
+                self._stats['running'] += 1
+            try:
+                result = self.process(payload, options)
+                self._execute(
+                    "UPDATE jobs SET status = 'done', result = ?, payload = NULL, updated = ? WHERE id = ?",
+                    (json.dumps(result), time.time(), job_id)
+                )
+                outcome = 'completed'
+            except Exception as e:
+                self._execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, payload = NULL, updated = ? WHERE id = ?",
+                    (str(e), time.time(), job_id)
+                )
+                outcome = 'failed'
+            with self._lock:
+                self._stats['running'] -= 1
+                self._stats[outcome] += 1
+
+            if self.notify is not None and options.get('callback_url'):
+                try:
+                    self.notify(options['callback_url'], self.get(job_id))
+                except Exception:
+                    with self._lock:
+                        self._stats['callback_errors'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['workers'] = self.workers
+        stats['max_pending'] = self.max_pending
+        stats['queue_depth'] = self.pending()
+        return stats
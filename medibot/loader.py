@@ -0,0 +1,61 @@
+import threading
+import time
+
+
+class BackgroundLoader:
+    """Load something expensive once: eagerly, on a background thread, or on first use.
+
+    ``get()`` blocks until the value is available and re-raises a load failure.
+    """
+
+    def __init__(self, load, name='loader'):
+        self.load = load
+        self.name = name
+        self.value = None
+        self.error = None
+        self.load_seconds = None
+        self._started = False
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    def _run(self):
+        started = time.perf_counter()
+        try:
+            self.value = self.load()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.load_seconds = round(time.perf_counter() - started, 3)
+            self._done.set()
+
+    def start(self, background=True):
+        """Begin loading if nobody has yet"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        if background:
+            threading.Thread(target=self._run, name=self.name, daemon=True).start()
+        else:
+            self._run()
+
+    def get(self, timeout=None):
+        # Lazy mode: the first caller loads inline; otherwise wait for the thread
+        self.start(background=False)
+        if not self._done.wait(timeout):
+            raise TimeoutError(f'{self.name} is still loading')
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+    @property
+    def ready(self):
+        return self._done.is_set() and self.error is None
+
+    def stats(self):
+        return {
+            'started': self._started,
+            'ready': self.ready,
+            'load_seconds': self.load_seconds,
+            'error': str(self.error) if self.error else None
+        }
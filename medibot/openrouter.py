@@ -0,0 +1,219 @@
+import json
+import os
+import random
+import threading
+import time
+import weakref
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised without touching the network while the upstream is marked down"""
+
+
+class StreamError(Exception):
+    """An error event sent by the upstream partway through a streamed completion"""
+
+
+class CircuitBreaker:
+    """Open after N consecutive failures, allow one probe after a cool-down"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.times_opened += 1
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+
+class OpenRouterClient:
+    """Shared keep-alive session for OpenRouter with retries and a circuit breaker"""
+
+    def __init__(self, base_url=None, max_concurrency=8, max_retries=2, backoff=0.5,
+                 connect_timeout=5, read_timeout=30, breaker=None):
+        self.base_url = (base_url or os.environ.get('OPENROUTER_BASE_URL', 'https://openrouter.ai/api/v1')).rstrip('/')
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session = requests.Session()
+        self.session.mount('https://', self._adapter)
+        self.session.mount('http://', self._adapter)
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'attempts': 0, 'retries': 0, 'failures': 0, 'short_circuited': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _sleep_before_retry(self, attempt, response=None):
+        delay = self.backoff * (2 ** attempt)
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        time.sleep(random.uniform(0, delay))
+
+    def post(self, path, json=None, headers=None, stream=False):
+        """POST to the upstream, retrying 429/5xx and connection errors with jitter.
+
+        With ``stream=True`` the concurrency slot is held until the response
+        is closed, since its body is read after this returns.
+        """
+        self._count('requests')
+        if not self.breaker.allow():
+            self._count('short_circuited')
+            raise CircuitOpenError('OpenRouter is unavailable (circuit open), failing fast')
+
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        self._slots.acquire()
+        try:
+            response = self._send(url, json, headers, stream)
+        except BaseException:
+            self._slots.release()
+            raise
+        if stream:
+            self._release_on_close(response)
+        else:
+            self._slots.release()
+        return response
+
+    def _send(self, url, json, headers, stream):
+        for attempt in range(self.max_retries + 1):
+            self._count('attempts')
+            try:
+                response = self.session.post(url, json=json, headers=headers,
+                                             timeout=self.timeout, stream=stream)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt < self.max_retries:
+                    self._count('retries')
+                    self._sleep_before_retry(attempt)
+                    continue
+                self._count('failures')
+                self.breaker.record_failure()
+                raise
+            except BaseException:
+                # Anything else (e.g. ChunkedEncodingError) still ends a
+                # half-open probe, or the breaker would never admit another
+                self._count('failures')
+                self.breaker.record_failure()
+                raise
+
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                response.close()
+                self._count('retries')
+                self._sleep_before_retry(attempt, response)
+                continue
+
+            if response.status_code >= 500:
+                self._count('failures')
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            return response
+
+    def _release_on_close(self, response):
+        """Give the slot back when the response is closed, or collected unclosed"""
+        release = weakref.finalize(response, self._slots.release)
+        close = response.close
+
+        def close_and_release():
+            try:
+                close()
+            finally:
+                release()
+        response.close = close_and_release
+
+    def stats(self):
+        """Request/retry counters, connection reuse and breaker state"""
+        with self._lock:
+            stats = dict(self._stats)
+        opened = 0
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                opened += pool.num_connections
+        stats['connections_opened'] = opened
+        stats['connections_reused'] = max(0, stats['attempts'] - opened)
+        stats['breaker_state'] = self.breaker.state
+        stats['breaker_failures'] = self.breaker.failures
+        stats['breaker_times_opened'] = self.breaker.times_opened
+        return stats
+
+
+def client_from_env():
+    """Build the shared client from OPENROUTER_* environment variables"""
+    return OpenRouterClient(
+        max_concurrency=int(os.environ.get('OPENROUTER_MAX_CONCURRENCY', 16)),
+        max_retries=int(os.environ.get('OPENROUTER_MAX_RETRIES', 2)),
+        read_timeout=float(os.environ.get('OPENROUTER_TIMEOUT', 30)),
+        breaker=CircuitBreaker(
+            failure_threshold=int(os.environ.get('OPENROUTER_BREAKER_THRESHOLD', 5)),
+            reset_timeout=float(os.environ.get('OPENROUTER_BREAKER_RESET', 30))
+        )
+    )
+
+
+def iter_stream_deltas(response):
+    """Yield content deltas from an OpenRouter ``stream: true`` response.
+
+    An error event from the upstream raises StreamError.
+    """
+    try:
+        for line in response.iter_lines(decode_unicode=True):
+            # Blank keep-alives and ": OPENROUTER PROCESSING" comments carry no data
+            if not line or not line.startswith('data:'):
+                continue
+            payload = line[5:].strip()
+            if payload == '[DONE]':
+                # Keep reading to the end of the body so the connection returns to the pool
+                continue
+            chunk = json.loads(payload)
+            if 'error' in chunk:
+                raise StreamError(chunk['error'].get('message', 'Unknown error'))
+            choices = chunk.get('choices') or []
+            if choices:
+                delta = choices[0].get('delta', {}).get('content')
+                if delta:
+                    yield delta
+    finally:
+        response.close()
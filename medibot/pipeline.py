@@ -0,0 +1,71 @@
+import contextvars
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+
+def _timed(fn, args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, round((time.perf_counter() - started) * 1000, 2)
+
+
+def run_stages(executor, stages, parallel=True):
+    """Run named ``(fn, *args)`` stages and return ``(results, timings_ms)``.
+
+    With ``parallel`` the first stage runs on the calling thread, which would
+    otherwise only wait, while the others overlap with it on ``executor``; the
+    wall time is that of the slowest stage. Otherwise they run one after
+    another in order. The first stage exception is re-raised after all stages
+    have finished.
+    """
+    started = time.perf_counter()
+    if parallel:
+        (first, stage), *others = stages.items()
+        # Each stage sees the caller's context variables, as if run inline
+        futures = {name: executor.submit(contextvars.copy_context().run, _timed, other[0], other[1:])
+                   for name, other in others}
+        outcomes = {}
+        error = None
+        try:
+            outcomes[first] = _timed(stage[0], stage[1:])
+        except Exception as e:
+            error = e
+        for name, future in futures.items():
+            try:
+                outcomes[name] = future.result()
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+    else:
+        outcomes = {name: _timed(stage[0], stage[1:]) for name, stage in stages.items()}
+
+    results = {name: outcome[0] for name, outcome in outcomes.items()}
+    timings = {name: outcome[1] for name, outcome in outcomes.items()}
+    timings['sum_of_stages'] = round(sum(timings.values()), 2)
+    timings['wall'] = round((time.perf_counter() - started) * 1000, 2)
+    return results, timings
+
+
+def iter_completed(executor, fn, items, max_in_flight):
+    """Yield ``(item, future)`` as ``fn(item)`` calls finish, fastest first.
+
+    Items are pulled lazily and at most ``max_in_flight`` run at once, so a
+    long (e.g. disk-backed) iterator is never materialized in full.
+    """
+    items = iter(items)
+    pending = {}
+    exhausted = False
+    while True:
+        while not exhausted and len(pending) < max_in_flight:
+            try:
+                item = next(items)
+            except StopIteration:
+                exhausted = True
+                break
+            pending[executor.submit(fn, item)] = item
+        if not pending:
+            return
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield pending.pop(future), future
@@ -0,0 +1,94 @@
+import os
+import string
+import threading
+import time
+
+# templates/prompts/ at the repository root
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates', 'prompts')
+
+
+class Prompt:
+    """A prompt template split once into literal text and ``{field}`` slots.
+
+    Rendering joins the precomputed pieces, so static prefixes (the system
+    prompt, instruction text) come out byte-identical on every request.
+    """
+
+    def __init__(self, name, text):
+        self.name = name
+        self.text = text
+        # parts[i] is the literal text before fields[i]; parts[-1] follows the last field
+        self.parts = ['']
+        self.fields = []
+        for literal, field, _, _ in string.Formatter().parse(text):
+            self.parts[-1] += literal
+            if field is not None:
+                self.fields.append(field)
+                self.parts.append('')
+        self.static = not self.fields
+
+    def render(self, **values):
+        if self.static:
+            return self.parts[0]
+        pieces = [self.parts[0]]
+        for field, literal in zip(self.fields, self.parts[1:]):
+            pieces.append(str(values[field]))
+            pieces.append(literal)
+        return ''.join(pieces)
+
+
+class PromptRegistry:
+    """Prompt templates (``<name>.txt``) loaded from a directory once.
+
+    Files are re-checked at most every ``reload_interval`` seconds and
+    reloaded when their mtime changes; ``reload_interval=0`` never reloads.
+    """
+
+    def __init__(self, directory=PROMPTS_DIR, reload_interval=2.0):
+        self.directory = directory
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._prompts = {}
+        self._mtimes = {}
+        self._checked = 0.0
+        self.reloads = 0
+        self._scan()
+
+    def _scan(self):
+        mtimes = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith('.txt'):
+                    mtimes[entry.name[:-4]] = entry.stat().st_mtime_ns
+        prompts = dict(self._prompts)
+        for name, mtime in mtimes.items():
+            if self._mtimes.get(name) != mtime:
+                with open(os.path.join(self.directory, name + '.txt'), encoding='utf-8') as f:
+                    text = f.read()
+                # Editors add a final newline; it isn't part of the prompt
+                prompts[name] = Prompt(name, text[:-1] if text.endswith('\n') else text)
+        for name in set(prompts) - set(mtimes):
+            del prompts[name]
+        if self._mtimes and mtimes != self._mtimes:
+            self.reloads += 1
+        self._prompts = prompts
+        self._mtimes = mtimes
+        self._checked = time.monotonic()
+
+    def get(self, name):
+        if self.reload_interval and time.monotonic() - self._checked > self.reload_interval:
+            with self._lock:
+                if time.monotonic() - self._checked > self.reload_interval:
+                    try:
+                        self._scan()
+                    except OSError:
+                        # Keep serving the loaded prompts (e.g. file mid-save)
+                        self._checked = time.monotonic()
+        return self._prompts[name]
+
+    def text(self, name):
+        """A prompt without fields, as sent upstream"""
+        return self.get(name).render()
+
+    def render(self, name, /, **values):
+        return self.get(name).render(**values)
@@ -0,0 +1,235 @@
+import threading
+import time
+from collections import OrderedDict
+
+from medibot.db import ProcessConnection
+
+
+def refill(tokens, updated, now, rate, burst, cost):
+    """Token bucket step: (tokens left, seconds to wait; 0 means allowed)"""
+    tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+    if tokens >= cost:
+        return tokens - cost, 0.0
+    return tokens, (cost - tokens) / rate
+
+
+class MemoryBuckets:
+    """Token buckets in this process's memory (the default).
+
+    Under gunicorn each worker keeps its own buckets, so a client gets up to
+    the limit per worker. Only the ``max_keys`` most recently seen clients
+    are tracked; a forgotten client starts again with a full bucket, as it
+    would have after being idle.
+    """
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def take(self, key, rate, burst, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            tokens, wait = refill(tokens, updated, now, rate, burst, cost)
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class SQLiteBuckets:
+    """Token buckets in a sqlite file, shared by every worker process on the host"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._takes = 0
+        # Autocommit, so take() can open its own BEGIN IMMEDIATE transaction
+        self._db = ProcessConnection(path, (
+            'CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)',
+        ), isolation_level=None)
+
+    @property
+    def _conn(self):
+        return self._db.get()
+
+    def take(self, key, rate, burst, cost=1):
+        now = time.time()
+        with self._lock:
+            conn = self._conn
+            # BEGIN IMMEDIATE takes the write lock up front, so the read and
+            # the update are one step for every process
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+                tokens, updated = row if row is not None else (burst, now)
+                tokens, wait = refill(tokens, updated, now, rate, burst, cost)
+                conn.execute('INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                             (key, tokens, now))
+                self._takes += 1
+                if self._takes % 1000 == 0:
+                    # Buckets idle this long are full again; dropping them changes nothing
+                    conn.execute('DELETE FROM buckets WHERE updated < ?', (now - burst / rate,))
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        return wait
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM buckets').fetchone()[0]
+
+
+class RateLimiter:
+    """Per-client token buckets, one set per named limit.
+
+    ``limits`` maps a name ('upload', 'query', ...) to ``(per_minute, burst)``:
+    a client may make ``burst`` calls at once and ``per_minute`` calls a
+    minute after that. A limit with ``per_minute <= 0`` is off. Buckets live
+    in ``store`` (MemoryBuckets, SQLiteBuckets or anything with the same
+    ``take``).
+    """
+
+    def __init__(self, limits, store=None):
+        self.limits = {name: (per_minute / 60.0, max(1, burst)) for name, (per_minute, burst) in limits.items()
+                       if per_minute > 0}
+        self.store = store if store is not None else MemoryBuckets()
+        self._lock = threading.Lock()
+        self._stats = {f'{name}_{outcome}': 0 for name in self.limits for outcome in ('allowed', 'limited')}
+
+    def check(self, name, client, cost=1):
+        """Take ``cost`` tokens from ``client``'s ``name`` bucket.
+
+        Returns 0 if allowed, otherwise the seconds until the call would be.
+        """
+        if name not in self.limits:
+            return 0.0
+        rate, burst = self.limits[name]
+        wait = self.store.take(f'{name}:{client}', rate, burst, cost)
+        with self._lock:
+            self._stats[f"{name}_{'limited' if wait else 'allowed'}"] += 1
+        return wait
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['clients'] = len(self.store)
+        stats['backend'] = type(self.store).__name__
+        return stats
+
+
+class OverloadedError(Exception):
+    """Raised by ConcurrencyLimiter.acquire when a kind of work can't take more"""
+
+    def __init__(self, kind):
+        super().__init__(f'Too much {kind} work in progress, please retry later')
+        self.kind = kind
+
+
+class Slot:
+    """A slot taken from a ConcurrencyLimiter, returned by ``release`` (once)
+    or at the end of a ``with`` block"""
+
+    def __init__(self, limiter, kind):
+        self.limiter = limiter
+        self.kind = kind
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.limiter._release(self.kind)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def __del__(self):
+        self.release()
+
+
+class ConcurrencyLimiter:
+    """Caps the calls of each kind of work running at once, and the queue for them.
+
+    ``limits`` maps a kind ('detection', 'llm') to how many calls may run at
+    once in this process; 0 means unlimited. ``acquire`` is taken around one
+    call, so each kind's budget only covers the time actually spent on it.
+    When all slots are busy up to as many callers again may wait, for at most
+    ``timeout`` seconds; past that, or with the queue full, OverloadedError is
+    raised instead of piling up more work behind a saturated CPU or upstream.
+    ``saturated`` lets request handlers shed that work before reading the body.
+    """
+
+    def __init__(self, limits, timeout=30.0):
+        self.limits = dict(limits)
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._in_use = {kind: 0 for kind in self.limits}
+        self._waiting = {kind: 0 for kind in self.limits}
+        self._stats = {f'{kind}_{name}': 0 for kind in self.limits
+                       for name in ('calls', 'queued', 'shed', 'timeouts', 'peak')}
+
+    def _busy(self, kind):
+        return self.limits[kind] and self._in_use[kind] >= self.limits[kind]
+
+    def _queue_full(self, kind):
+        return self._busy(kind) and self._waiting[kind] >= self.limits[kind]
+
+    def saturated(self, kinds):
+        """The first of ``kinds`` whose slots and queue are all taken, or None"""
+        with self._cond:
+            for kind in kinds:
+                if self._queue_full(kind):
+                    self._stats[f'{kind}_shed'] += 1
+                    return kind
+        return None
+
+    def acquire(self, kind, wait=False):
+        """A Slot for one ``kind`` call; raises OverloadedError when saturated.
+
+        ``wait=True`` (background work that must not be shed) waits for a
+        slot however long it takes, regardless of the queue length.
+        """
+        with self._cond:
+            if self._busy(kind):
+                if not wait and self._queue_full(kind):
+                    self._stats[f'{kind}_shed'] += 1
+                    raise OverloadedError(kind)
+                self._stats[f'{kind}_queued'] += 1
+                self._waiting[kind] += 1
+                try:
+                    deadline = None if wait else time.monotonic() + self.timeout
+                    while self._busy(kind):
+                        remaining = None if deadline is None else deadline - time.monotonic()
+                        if remaining is not None and remaining <= 0:
+                            self._stats[f'{kind}_timeouts'] += 1
+                            raise OverloadedError(kind)
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting[kind] -= 1
+            self._in_use[kind] += 1
+            self._stats[f'{kind}_calls'] += 1
+            self._stats[f'{kind}_peak'] = max(self._stats[f'{kind}_peak'], self._in_use[kind])
+        return Slot(self, kind)
+
+    def _release(self, kind):
+        with self._cond:
+            self._in_use[kind] -= 1
+            # Waiters of every kind share the condition
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            for kind in self.limits:
+                stats[f'{kind}_in_use'] = self._in_use[kind]
+                stats[f'{kind}_waiting'] = self._waiting[kind]
+                stats[f'{kind}_limit'] = self.limits[kind]
+        return stats
@@ -0,0 +1,87 @@
+import threading
+import time
+import uuid
+
+
+def estimate_tokens(text):
+    """Rough token count: about four characters per token for English text"""
+    return len(text) // 4 + 1
+
+
+def truncate_tokens(text, tokens):
+    limit = max(1, tokens) * 4
+    return text if len(text) <= limit else text[:limit].rstrip() + '…'
+
+
+class SessionStore:
+    """Conversation state for follow-up /query calls, kept server-side.
+
+    A session references the uploaded image (``image_id``), the upload's
+    analysis (``context``) and the recent question/answer turns. Turns are
+    trimmed to ``history_tokens`` when saved: the oldest turns are dropped and
+    only their questions are kept, shortened, so the history sent upstream
+    stays about the same size however long a conversation runs.
+
+    Sessions are JSON values in ``store`` (anything with get/set/delete, such
+    as SQLiteStore), which bounds and expires them; a sqlite file lets every
+    worker process continue the same conversation.
+    """
+
+    def __init__(self, store, history_tokens=1500, max_earlier=10):
+        self.store = store
+        self.history_tokens = history_tokens
+        self.max_earlier = max_earlier
+        self._lock = threading.Lock()
+        self._stats = {'created': 0, 'resumed': 0, 'misses': 0, 'turns': 0, 'trimmed_turns': 0}
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def create(self, image_id=None, context=None):
+        """Start a session; ``context`` is truncated to half the history budget"""
+        now = time.time()
+        session = {
+            'session_id': uuid.uuid4().hex,
+            'image_id': image_id,
+            'context': truncate_tokens(context, self.history_tokens // 2) if context else None,
+            'turns': [],
+            'earlier': [],
+            'created_at': now,
+            'updated_at': now
+        }
+        self.store.set(session['session_id'], session)
+        self._count('created')
+        return session
+
+    def get(self, session_id):
+        session = self.store.get(session_id)
+        self._count('misses' if session is None else 'resumed')
+        return session
+
+    def add_turn(self, session, question, answer):
+        """Append a turn, trim the history to the budget and save the session"""
+        session['turns'].append([question, answer])
+        budget = self.history_tokens - (estimate_tokens(session['context']) if session['context'] else 0)
+        turns = session['turns']
+        trimmed = 0
+        while len(turns) > 1 and sum(estimate_tokens(q) + estimate_tokens(a) for q, a in turns) > budget:
+            dropped_question, _ = turns.pop(0)
+            session['earlier'].append(truncate_tokens(dropped_question, 40))
+            trimmed += 1
+        if turns and estimate_tokens(turns[0][0]) + estimate_tokens(turns[0][1]) > budget:
+            # A single long answer still has to fit
+            question, answer = turns[0]
+            turns[0] = [truncate_tokens(question, budget // 4), truncate_tokens(answer, budget * 3 // 4)]
+        session['earlier'] = session['earlier'][-self.max_earlier:]
+        session['updated_at'] = time.time()
+        self.store.set(session['session_id'], session)
+        self._count('turns')
+        if trimmed:
+            self._count('trimmed_turns', trimmed)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['history_tokens'] = self.history_tokens
+        return stats
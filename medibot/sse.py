@@ -0,0 +1,24 @@
+from flask import Response, request, stream_with_context
+
+from medibot.fastjson import dumps
+
+
+def wants_stream():
+    """Clients opt into Server-Sent Events with ?stream=1 or Accept: text/event-stream"""
+    if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return 'text/event-stream' in request.headers.get('Accept', '')
+
+
+def sse_event(event, data):
+    """Format one SSE frame with a JSON payload"""
+    return f"event: {event}\ndata: {dumps(data)}\n\n"
+
+
+def sse_response(events):
+    """Stream a generator of SSE frames without proxy buffering"""
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
@@ -0,0 +1,165 @@
+import math
+import threading
+
+import numpy as np
+from PIL import Image
+
+from medibot.detection import result_rows, rows_to_detections
+
+
+def detection_rows(result, threshold):
+    """result_rows, or no rows for a result without boxes"""
+    if result is None or result.boxes is None:
+        return np.zeros((0, 6), dtype=np.float32)
+    return result_rows(result, threshold)
+
+
+def tile_grid(width, height, tile, overlap):
+    """(left, top, right, bottom) boxes of at most ``tile`` px covering the
+    image, with neighbours overlapping by at least ``overlap`` px"""
+    def starts(length):
+        if length <= tile:
+            return [0]
+        count = math.ceil((length - overlap) / (tile - overlap))
+        step = (length - tile) / (count - 1)
+        return [round(i * step) for i in range(count)]
+
+    return [(left, top, min(left + tile, width), min(top + tile, height))
+            for top in starts(height) for left in starts(width)]
+
+
+def nms(rows, threshold=0.5, metric='iou'):
+    """Indices of ``rows`` (x1, y1, x2, y2, conf, cls) kept by class-aware
+    greedy NMS, best first.
+
+    ``metric='ios'`` compares intersection over the smaller box instead of
+    IoU, so a fragment of an object cut off at a tile edge is suppressed by
+    the whole object found in a neighbouring tile or the full-image pass.
+    """
+    if not len(rows):
+        return np.zeros(0, dtype=np.intp)
+    boxes = rows[:, :4].astype(np.float64)
+    # Shift each class into its own coordinate range so boxes of different
+    # classes never overlap, and one pass handles every class
+    boxes += rows[:, 5:6] * (boxes.max() + 1)
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    order = np.argsort(-rows[:, 4], kind='stable')
+    keep = []
+    while order.size:
+        best, rest = order[0], order[1:]
+        keep.append(best)
+        width = (np.minimum(x2[best], x2[rest]) - np.maximum(x1[best], x1[rest])).clip(0)
+        height = (np.minimum(y2[best], y2[rest]) - np.maximum(y1[best], y1[rest])).clip(0)
+        intersection = width * height
+        if metric == 'ios':
+            overlap = intersection / np.maximum(np.minimum(areas[best], areas[rest]), 1e-9)
+        else:
+            overlap = intersection / np.maximum(areas[best] + areas[rest] - intersection, 1e-9)
+        order = rest[overlap <= threshold]
+    return np.array(keep, dtype=np.intp)
+
+
+class TiledDetection:
+    """Detection on overlapping tiles for images much larger than the model input.
+
+    The model sees every image at ``input_size`` (640 for YOLOv8), so small
+    findings in a large scan shrink to a few pixels. Here the full image still
+    gets its usual low-resolution pass, for large objects, and the image is
+    also cut into overlapping tiles that are each resized to ``input_size``.
+    Detections from all passes are merged with NMS.
+
+    Tiles grow past ``input_size`` (and are downscaled) when more than
+    ``max_tiles`` would be needed, which keeps latency bounded. Tiles that are
+    nearly uniform in a grayscale thumbnail (background, borders) are skipped.
+    Images with a long edge under ``min_edge`` use the full-image pass only.
+    """
+
+    def __init__(self, input_size=640, overlap=0.2, max_tiles=12, min_edge=1280, min_std=4.0,
+                 iou_threshold=0.5, thumbnail_edge=256):
+        self.input_size = input_size
+        self.overlap = overlap
+        self.max_tiles = max(1, max_tiles)
+        self.min_edge = min_edge
+        self.min_std = min_std
+        self.iou_threshold = iou_threshold
+        self.thumbnail_edge = thumbnail_edge
+        self._lock = threading.Lock()
+        self._stats = {'images': 0, 'tiled_images': 0, 'tiles': 0, 'skipped_tiles': 0, 'merged_boxes': 0}
+
+    @property
+    def settings(self):
+        """Everything that changes the detections, for result cache keys"""
+        return (self.input_size, self.overlap, self.max_tiles, self.min_edge, self.min_std, self.iou_threshold)
+
+    def _count(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                self._stats[name] += amount
+
+    def applies(self, size):
+        return max(size) >= self.min_edge
+
+    def grid(self, width, height):
+        """Tile boxes: ``input_size`` tiles, enlarged until at most ``max_tiles`` cover the image"""
+        tile = self.input_size
+        while True:
+            boxes = tile_grid(width, height, tile, round(tile * self.overlap))
+            if len(boxes) <= self.max_tiles:
+                return boxes
+            tile = math.ceil(tile * 1.25)
+
+    def plan(self, image):
+        """(tile boxes to run, number skipped as empty) for an RGB PIL image"""
+        width, height = image.size
+        boxes = self.grid(width, height)
+        # Cheap low-resolution look at the content: a box-filtered thumbnail
+        factor = max(1, max(width, height) // self.thumbnail_edge)
+        thumbnail = np.asarray(image.reduce(factor).convert('L'), dtype=np.float32)
+        keep = []
+        for box in boxes:
+            left, top, right, bottom = (round(v / factor) for v in box)
+            patch = thumbnail[top:max(bottom, top + 1), left:max(right, left + 1)]
+            if patch.size and patch.std() >= self.min_std:
+                keep.append(box)
+        return keep, len(boxes) - len(keep)
+
+    def detect(self, image, submit, names, threshold=0.5):
+        """Detection dicts for an RGB PIL image.
+
+        ``submit`` queues one image for the model and returns a Future of its
+        result (BatchScheduler.submit), so the tiles share batched forward
+        passes with each other and with concurrent uploads.
+        """
+        if not self.applies(image.size):
+            self._count(images=1)
+            return rows_to_detections(detection_rows(submit(image).result(), threshold), names)
+
+        boxes, skipped = self.plan(image)
+        tiles = []
+        for left, top, right, bottom in boxes:
+            scale = min(1.0, self.input_size / max(right - left, bottom - top))
+            size = (max(1, round((right - left) * scale)), max(1, round((bottom - top) * scale)))
+            # Crop and downscale in one step, without a full-resolution copy
+            tiles.append(image.resize(size, Image.BILINEAR, box=(left, top, right, bottom), reducing_gap=2.0))
+        futures = [submit(image)] + [submit(tile) for tile in tiles]
+
+        parts = [detection_rows(futures[0].result(), threshold)]
+        for (left, top, right, bottom), tile, future in zip(boxes, tiles, futures[1:]):
+            rows = detection_rows(future.result(), threshold).astype(np.float64)
+            rows[:, [0, 2]] = rows[:, [0, 2]] * ((right - left) / tile.width) + left
+            rows[:, [1, 3]] = rows[:, [1, 3]] * ((bottom - top) / tile.height) + top
+            parts.append(rows)
+        rows = np.concatenate(parts)
+        kept = rows[nms(rows, self.iou_threshold, metric='ios')]
+
+        self._count(images=1, tiled_images=1, tiles=len(tiles), skipped_tiles=skipped,
+                    merged_boxes=len(rows) - len(kept))
+        return rows_to_detections(kept, names)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['max_tiles'] = self.max_tiles
+        stats['min_edge'] = self.min_edge
+        return stats
@@ -0,0 +1,99 @@
+import io
+import mmap
+import os
+import tempfile
+import zipfile
+
+# Leading bytes of each image format, as PIL names them
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'JPEG'),
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (b'GIF87a', 'GIF'),
+    (b'GIF89a', 'GIF'),
+    (b'BM', 'BMP'),
+    (b'II*\x00', 'TIFF'),
+    (b'MM\x00*', 'TIFF'),
+)
+
+
+def sniff_image_type(data):
+    """Image format from the magic bytes at the start of ``data``, or None"""
+    head = bytes(data[:12])
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'WEBP'
+    for signature, image_type in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return image_type
+    return None
+
+
+def spool_stream(total_content_length, threshold):
+    """Werkzeug file stream: memory for small request bodies, a temp file otherwise"""
+    if total_content_length is not None and total_content_length <= threshold:
+        return io.BytesIO()
+    return tempfile.TemporaryFile('wb+')
+
+
+def map_upload(storage):
+    """The uploaded file's contents without copying a spooled file into memory.
+
+    Files spooled to disk are memory-mapped read-only; the mapping stays valid
+    after the request closes the file. Small in-memory uploads are returned as
+    bytes.
+    """
+    stream = storage.stream
+    if isinstance(stream, io.BytesIO):
+        return stream.getvalue()
+    try:
+        fileno = stream.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return stream.read()
+    if os.fstat(fileno).st_size == 0:
+        return b''
+    return mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+
+
+def is_archive(filename):
+    return (filename or '').lower().endswith('.zip')
+
+
+def _iter_archive(stream, max_bytes):
+    with zipfile.ZipFile(stream) as archive:
+        for info in archive.infolist():
+            name = info.filename
+            base = os.path.basename(name)
+            # Skip folders and macOS/hidden metadata entries
+            if info.is_dir() or not base or base.startswith('.') or name.startswith('__MACOSX/'):
+                continue
+            if info.file_size > max_bytes:
+                yield base, None, f'larger than {max_bytes // (1024 * 1024)}MB'
+                continue
+            with archive.open(info) as member:
+                # Don't trust the header size; stop reading past the limit
+                data = member.read(max_bytes + 1)
+            if len(data) > max_bytes:
+                yield base, None, f'larger than {max_bytes // (1024 * 1024)}MB'
+                continue
+            yield base, data, None
+
+
+def iter_uploaded_files(files, max_bytes):
+    """Yield ``(filename, bytes, error)`` for uploaded files and zip members.
+
+    Files are read one at a time as the iterator is consumed. Large uploads
+    are spooled to temporary files and memory-mapped (see map_upload), so a
+    batch is streamed from disk rather than held in memory all at once. ``error`` is set (and ``bytes`` is None)
+    for entries that can't be used.
+    """
+    for storage in files:
+        if is_archive(storage.filename):
+            try:
+                yield from _iter_archive(storage.stream, max_bytes)
+            except zipfile.BadZipFile:
+                yield storage.filename, None, 'not a valid zip archive'
+            continue
+        data = map_upload(storage)
+        if len(data) > max_bytes:
+            yield storage.filename, None, f'larger than {max_bytes // (1024 * 1024)}MB'
+            continue
+        yield storage.filename, data, None
@@ -1,4 +1,5 @@
-let currentImageData = null;
+let currentImageId = null;
+let currentSessionId = null;
 
 document.addEventListener('DOMContentLoaded', function() {
     const imageInput = document.getElementById('imageInput');
@@ -31,7 +32,7 @@ document.addEventListener('DOMContentLoaded', function() {
     });
 
     messageInput.addEventListener('input', function() {
-        sendBtn.disabled = !messageInput.value.trim() || !currentImageData;
+        sendBtn.disabled = !messageInput.value.trim() || !currentImageId;
     });
 
     function showLoading() {
@@ -46,7 +47,8 @@ document.addEventListener('DOMContentLoaded', function() {
         heroSection.style.display = 'flex';
         uploadSection.style.display = 'none';
         chatSection.style.display = 'none';
-        currentImageData = null;
+        currentImageId = null;
+        currentSessionId = null;
         messages.innerHTML = '';
         detections.innerHTML = '';
         imageDisplay.style.display = 'none';
@@ -104,9 +106,10 @@ document.addEventListener('DOMContentLoaded', function() {
             hideLoading();
             
             if (data.success) {
-                currentImageData = data.image_data;
+                currentImageId = data.image_id;
+                currentSessionId = data.session_id || null;
                 switchToChat();
-                displayImage(data.image_data);
+                displayImage(URL.createObjectURL(file));
                 displayDetections(data.detections);
                 addBotMessage(`Analysis complete. I've detected ${data.detections.length} objects in your image. What would you like to know?`);
                 sendBtn.disabled = false;
@@ -121,8 +124,8 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
-    function displayImage(imageData) {
-        imageDisplay.src = `data:image/jpeg;base64,${imageData}`;
+    function displayImage(imageSrc) {
+        imageDisplay.src = imageSrc;
         imageDisplay.style.display = 'block';
     }
 
@@ -169,7 +172,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
     function sendMessage() {
         const message = messageInput.value.trim();
-        if (!message || !currentImageData) return;
+        if (!message || !currentImageId) return;
 
         addUserMessage(message);
         messageInput.value = '';
@@ -182,10 +185,10 @@ document.addEventListener('DOMContentLoaded', function() {
             headers: {
                 'Content-Type': 'application/json',
             },
-            body: JSON.stringify({
-                query: message,
-                image_data: currentImageData
-            })
+            // Follow-ups continue the upload's session, so the image isn't resent
+            body: JSON.stringify(currentSessionId
+                ? { query: message, session_id: currentSessionId }
+                : { query: message, image_id: currentImageId, new_session: true })
         })
         .then(response => {
             if (!response.ok) {
@@ -200,6 +203,7 @@ document.addEventListener('DOMContentLoaded', function() {
             if (data.error) {
                 addBotMessage(`Error: ${data.error}`);
             } else {
+                currentSessionId = data.session_id || currentSessionId;
                 addBotMessage(data.response || 'No response received');
             }
         })